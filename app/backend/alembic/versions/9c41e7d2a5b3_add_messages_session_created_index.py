@@ -0,0 +1,28 @@
+"""add (session_id, created_at, id) index to messages
+
+Revision ID: 9c41e7d2a5b3
+Revises: 4d0898ab4756
+Create Date: 2026-10-16 10:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c41e7d2a5b3'
+down_revision: Union[str, Sequence[str], None] = '4d0898ab4756'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_messages_session_created_id', 'messages', ['session_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_session_created_id', table_name='messages')
@@ -0,0 +1,37 @@
+"""add session_summaries
+
+Revision ID: b7e2f1c9d048
+Revises: 9c41e7d2a5b3
+Create Date: 2026-10-16 11:03:27.540917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2f1c9d048'
+down_revision: Union[str, Sequence[str], None] = '9c41e7d2a5b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('session_summaries',
+    sa.Column('session_id', sa.UUID(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('tokens', sa.Integer(), nullable=False),
+    sa.Column('through_created_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('through_message_id', sa.UUID(), nullable=False),
+    sa.Column('updated_at', postgresql.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['session_id'], ['sessions.id'], ),
+    sa.PrimaryKeyConstraint('session_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('session_summaries')
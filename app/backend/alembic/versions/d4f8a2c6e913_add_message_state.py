@@ -0,0 +1,31 @@
+"""add message state
+
+Revision ID: d4f8a2c6e913
+Revises: b7e2f1c9d048
+Create Date: 2026-10-16 14:21:08.113406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f8a2c6e913'
+down_revision: Union[str, Sequence[str], None] = 'b7e2f1c9d048'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+message_state = sa.Enum('complete', 'streaming', 'interrupted', name='message_state')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    message_state.create(op.get_bind(), checkfirst=True)
+    op.add_column('messages', sa.Column('state', message_state, server_default='complete', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('messages', 'state')
+    message_state.drop(op.get_bind(), checkfirst=True)
@@ -2,21 +2,43 @@
 
 POST `/chat` accepts `{session_id?, message}` and emits a server-sent events
 stream:
-- event: `open`  → initial flush
+- event: `open`  → `{ message_id }` initial flush
+- event: `queued` → `{ position: int }` while waiting for an LLM slot
 - event: `token` → `{ token: str }` partial tokens
-- event: `done`  → `{ citations, usage, session_id }`
+- event: `done`  → `{ citations, usage, session_id, message_id, state }`
 
-The endpoint resolves or creates a chat session for the current identity,
-persists the user message before streaming, and persists the assistant message
-after streaming completes.
+Every frame carries `id: <message_id>:<offset>` (characters of answer text
+sent so far). After a dropped connection, GET `/chat/stream/{message_id}`
+with that `Last-Event-ID` replays the rest and follows the generation if it
+is still running.
+
+The endpoint starts retrieval for the message right away, then resolves or
+creates a chat session for the current identity and persists the user
+message while retrieval runs, and creates the assistant
+message at stream start, flushing its text periodically while it streams
+(see services/live_answers.py). A closed tab is detected even while idle;
+once no reader is left for `STREAM_RESUME_GRACE_S` the upstream LLM stream
+is cancelled and the partial answer kept. It is fully async: the (sync) DB calls are short and
+run on the threadpool, and the event generator awaits the LLM stream, so an
+in-flight answer pins neither a worker thread nor a DB connection.
+
+POST `/chat/prefetch` accepts `{session_id?, draft}` while the user types and
+starts retrieval for the draft; the next `/chat` message reuses it if the
+sent text (nearly) matches.
+
+Generations go through LLM admission control: when the wait queue is full
+the endpoint answers 503 with `Retry-After`, and leaves no trace of the
+message in the session.
 """
 from __future__ import annotations
 
+import asyncio
 import uuid
-from typing import Optional
+from typing import Optional, Tuple
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
@@ -24,15 +46,28 @@ from sqlalchemy.orm import Session
 from ..deps import get_current_identity, Identity
 from ..db.base import get_db
 from ..db import crud
-from ..db.models import Role
+from ..db.models import MessageState, Role
 from ..services.chat_service import ChatService
-from .sse import sse_event
+from ..services.live_answers import LiveAnswer, get_live_answer, start_live_answer
+from ..services.prefetch import get_prefetch_cache, identity_key, owner_key
+from ..llm.admission import Overloaded, get_admission
+from ..utils import metrics
+from ..core.config import settings
+from .sse import coalesce, sse_event, stop_on_disconnect
 from ..utils.tokens import count_tokens
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 MAX_LEN = 2000  # simple guardrail
 
+# Important SSE headers: content type + keep-alive + disable proxy buffering
+# (X-Accel-Buffering helps with Nginx proxies)
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
 class ChatIn(BaseModel):
     session_id: Optional[UUID] = Field(default=None)
     message: str = Field(min_length=1, max_length=MAX_LEN)
@@ -60,8 +95,72 @@ def _resolve_session(db: Session, identity: Identity, session_id: Optional[UUID]
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Session not found")
     return sess.id
 
+def _overloaded(e: Overloaded) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+class PrefetchIn(BaseModel):
+    session_id: Optional[UUID] = Field(default=None)
+    draft: str = Field(min_length=1, max_length=MAX_LEN)
+
+def _store_question(db: Session, identity: Identity, body: ChatIn) -> Tuple[UUID, UUID]:
+    sid = _resolve_session(db, identity, body.session_id)
+    msg = crud.append_message(
+        db,
+        session_id=sid,
+        role=Role.user,
+        content=body.message,
+        tokens_in=count_tokens(body.message),
+    )
+    return sid, msg.id
+
+def _event_id(message_id: UUID, offset: int) -> str:
+    # Offset = characters of answer text delivered up to and including this frame
+    return f"{message_id}:{offset}"
+
+def _parse_offset(last_event_id: Optional[str], message_id: UUID) -> int:
+    if not last_event_id:
+        return 0
+    mid, _, offset = last_event_id.rpartition(":")
+    if mid != str(message_id) or not offset.isdigit():
+        return 0
+    return int(offset)
+
+async def _follow(live: LiveAnswer, offset: int, queued=None):
+    """SSE frames for `live` from character `offset` through `done`.
+
+    Counts as a reader of `live` while iterated; closing it early (client
+    gone) lets the answer be cancelled once no reader is left.
+    """
+    live.attach()
+    try:
+        if queued is not None:
+            async for position in queued:
+                yield sse_event("queued", {"position": position}, id=_event_id(live.message_id, offset))
+        sent = offset
+        # stream tokens, batched per the deployment's coalescing policy
+        async for tok in coalesce(
+            live.generation.subscribe(offset), settings.sse_coalesce_max_bytes, settings.sse_coalesce_ms / 1000.0
+        ):
+            sent += len(tok)
+            yield sse_event("token", {"token": tok}, id=_event_id(live.message_id, sent))
+        # the row is finalized (content, usage, state) before signaling done
+        await asyncio.shield(live.persisted)
+        yield sse_event("done", {
+            "citations": live.result.citations,
+            "usage": live.result.usage,
+            "session_id": str(live.session_id),
+            "message_id": str(live.message_id),
+            "state": live.state.value,
+        }, id=_event_id(live.message_id, sent))
+    finally:
+        live.detach()
+
 @router.post("", response_class=StreamingResponse)
-def chat_stream(body: ChatIn, request: Request, db: Session = Depends(get_db), identity: Identity = Depends(get_current_identity)):
+async def chat_stream(body: ChatIn, request: Request, db: Session = Depends(get_db), identity: Identity = Depends(get_current_identity)):
     """
     Streams SSE frames:
       - event: token { data: "<partial text>" }
@@ -70,55 +169,126 @@ def chat_stream(body: ChatIn, request: Request, db: Session = Depends(get_db), i
     if not identity:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
 
-    # Resolve/create session & persist user message up front
-    sid = _resolve_session(db, identity, body.session_id)
-    user_msg = crud.append_message(
-        db,
-        session_id=sid,
-        role=Role.user,
-        content=body.message,
-        tokens_in=count_tokens(body.message),
-    )
+    # Shed before touching the DB when the LLM queue is already full
+    admission = get_admission()
+    if admission is not None and admission.saturated():
+        metrics.incr("admission.shed")
+        raise _overloaded(Overloaded("LLM capacity busy; try again shortly"))
+
+    # Retrieval for the new message doesn't depend on the DB: start it now
+    # so it runs while the session is resolved and the history loaded
+    inflight = ChatService.start_retrieval(body.message, owner=owner_key(identity, body.session_id))
+    try:
+        # Resolve/create session & persist user message up front (one DB hop)
+        sid, question_id = await run_in_threadpool(_store_question, db, identity, body)
+    except BaseException:
+        inflight.task.cancel()
+        raise
 
     # Build RAG+LLM streamer
-    result = ChatService.stream_for_session(db, sid)
+    try:
+        result = await ChatService.stream_for_session(db, sid, inflight=inflight)
+    except Overloaded as e:
+        # Shed after the question was stored: drop it so the client's retry
+        # doesn't leave an unanswered duplicate in the history
+        await run_in_threadpool(crud.delete_message, db, question_id)
+        raise _overloaded(e)
+
+    # Create the assistant row now; it is filled in as the answer streams
+    live = await start_live_answer(sid, result, question_id)
 
-    # SSE generator (sync) and send an initial open frame to encourage flushing
-    def event_gen():
+    # SSE generator (async) and send an initial open frame to encourage flushing
+    async def event_gen():
         # headers: done below in StreamingResponse
         try:
             # initial open event to flush response headers early
-            yield sse_event("open", "ok")
-            # stream tokens
-            for tok in result:
-                # yield token events frequently
-                yield sse_event("token", {"token": tok})
-            # finalize & persist assistant message before signaling done
-            assistant_text = "".join(result.buffer).strip()
-            if assistant_text:
-                crud.append_message(
-                    db,
-                    session_id=sid,
-                    role=Role.assistant,
-                    content=assistant_text,
-                    tokens_in=result.usage.get("tokens_in", 0),
-                    tokens_out=result.usage.get("tokens_out", 0),
-                )
-            # send final 'done' with metadata
+            yield sse_event("open", {"message_id": str(live.message_id)}, id=_event_id(live.message_id, 0))
+            async for frame in _follow(live, 0, queued=result.queued):
+                yield frame
+        except Exception as e:
+            # minimal error channel
+            yield sse_event("error", {"message": str(e)})
+
+    return StreamingResponse(stop_on_disconnect(request, event_gen()), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.post("/prefetch", status_code=status.HTTP_202_ACCEPTED)
+async def prefetch(body: PrefetchIn, identity: Identity = Depends(get_current_identity)):
+    """Warm retrieval for a draft while the user types.
+
+    No DB access; results are scoped to the caller's identity and session and
+    only used by their next `/chat` message. Debounced and rate-limited per
+    identity (429 when over the per-minute cap).
+    """
+    if not identity:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    cache = get_prefetch_cache()
+    if cache is None:
+        return {"status": "disabled"}
+    outcome = cache.prefetch(owner_key(identity, body.session_id), body.draft, who=identity_key(identity))
+    if outcome == "limited":
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many prefetches",
+            headers={"Retry-After": "60"},
+        )
+    return {"status": outcome}
+
+
+@router.get("/stream/{message_id}", response_class=StreamingResponse)
+async def resume_stream(
+    message_id: UUID,
+    request: Request,
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID"),
+    db: Session = Depends(get_db),
+    identity: Identity = Depends(get_current_identity),
+):
+    """Resume an answer after a dropped connection.
+
+    Replays from the offset in `Last-Event-ID` (`<message_id>:<offset>`) and
+    follows the still-running generation if there is one; costs no new LLM
+    tokens either way.
+    """
+    if not identity:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    # Look for the running answer first: the row is only read when nothing is
+    # live, so an answer that finishes meanwhile is served complete
+    live = get_live_answer(message_id)
+    msg = None
+    if live is not None:
+        session_id = live.session_id
+    else:
+        msg = await run_in_threadpool(crud.get_message, db, message_id)
+        if msg is None or msg.role != Role.assistant:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found")
+        session_id = msg.session_id
+    # Raises 403 unless the message's session belongs to the caller
+    sid = await run_in_threadpool(_resolve_session, db, identity, session_id)
+    offset = _parse_offset(last_event_id, message_id)
+    metrics.incr("live_answers.resumed")
+
+    async def event_gen():
+        try:
+            yield sse_event("open", {"message_id": str(message_id)}, id=_event_id(message_id, offset))
+            if live is not None:
+                async for frame in _follow(live, offset):
+                    yield frame
+                return
+            # Finished (or owned by another worker): serve what was stored
+            rest = msg.content[offset:]
+            if rest:
+                yield sse_event("token", {"token": rest}, id=_event_id(message_id, len(msg.content)))
+            if msg.state == MessageState.streaming:
+                yield sse_event("error", {"message": "Answer is no longer streaming on this server"})
+                return
             yield sse_event("done", {
-                "citations": result.citations,
-                "usage": result.usage,
+                "citations": [],
+                "usage": {"tokens_in": msg.tokens_in, "tokens_out": msg.tokens_out},
                 "session_id": str(sid),
-            })
+                "message_id": str(message_id),
+                "state": msg.state.value,
+            }, id=_event_id(message_id, len(msg.content)))
         except Exception as e:
-            # minimal error channel
             yield sse_event("error", {"message": str(e)})
 
-    # Important SSE headers: content type + keep-alive + disable proxy buffering
-    # (X-Accel-Buffering helps with Nginx proxies)
-    headers = {
-        "Cache-Control": "no-cache",
-        "Connection": "keep-alive",
-        "X-Accel-Buffering": "no",
-    }
-    return StreamingResponse(event_gen(), media_type="text/event-stream", headers=headers)
+    return StreamingResponse(stop_on_disconnect(request, event_gen()), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 from ..core.config import settings
+from ..utils import metrics
 
 router = APIRouter()
 
@@ -9,4 +10,8 @@ def health():
         "ok": True,
         "env": settings.python_env,
         "db_url_driver": settings.postgres_url.split(":")[0],  # "postgresql+psycopg"
-    }
\ No newline at end of file
+    }
+
+@router.get("/metrics")
+def get_metrics():
+    return metrics.snapshot()
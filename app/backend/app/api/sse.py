@@ -1,10 +1,108 @@
-"""Small helper for formatting Server-Sent Events frames.
+"""Small helpers for formatting Server-Sent Events frames and pacing tokens.
 
-Each SSE block is `event: <name>\ndata: <json or text>\n\n`.
+Each SSE block is `[id: <id>\n]event: <name>\ndata: <json or text>\n\n`.
+
+`coalesce` sits between the token stream and `sse_event`: it passes the first
+token through immediately (time-to-first-token), then batches deltas into one
+frame until `max_bytes` is buffered or `max_delay_s` has passed since the
+oldest buffered delta, whichever comes first. The delay is enforced with a
+timer, so a slow upstream never holds text back longer than the budget.
+
+`stop_on_disconnect` wraps a frame generator and closes it as soon as the
+client is gone, even while it is waiting upstream with nothing to send.
 """
+import asyncio
 import json
+from typing import Any, AsyncIterable, AsyncIterator, List, Optional
+
+from ..utils import metrics
 
-def sse_event(event: str, data: dict | str) -> bytes:
+DISCONNECT_POLL_S = 1.0
+
+def sse_event(event: str, data: dict | str, id: Optional[str] = None) -> bytes:
     payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    head = f"id: {id}\n" if id is not None else ""
     # Each SSE message block ends with a blank line
-    return f"event: {event}\ndata: {payload}\n\n".encode("utf-8")
+    return f"{head}event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+async def coalesce(tokens: AsyncIterable[str], max_bytes: int, max_delay_s: float) -> AsyncIterator[str]:
+    """Yield batched chunks of `tokens`; `max_delay_s <= 0` disables batching."""
+    if max_delay_s <= 0:
+        async for tok in tokens:
+            yield tok
+        return
+
+    loop = asyncio.get_running_loop()
+    it = tokens.__aiter__()
+    buf: List[str] = []
+    size = 0
+    deadline: Optional[float] = None
+    first = True
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(it.__anext__())
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                # Delay budget spent while waiting upstream: flush what we have
+                yield "".join(buf)
+                buf, size, deadline = [], 0, None
+                continue
+            fut, pending = pending, None
+            try:
+                tok = fut.result()
+            except StopAsyncIteration:
+                break
+            if first:
+                first = False
+                yield tok
+                continue
+            buf.append(tok)
+            size += len(tok.encode("utf-8"))
+            if size >= max_bytes:
+                yield "".join(buf)
+                buf, size, deadline = [], 0, None
+            elif deadline is None:
+                deadline = loop.time() + max_delay_s
+        if buf:
+            yield "".join(buf)
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+
+
+async def stop_on_disconnect(
+    request: Any, frames: AsyncIterable[bytes], poll_s: float = DISCONNECT_POLL_S
+) -> AsyncIterator[bytes]:
+    """Yield `frames` until exhausted or `request.is_disconnected()`."""
+    it = frames.__aiter__()
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(it.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=poll_s)
+            if not done:
+                if await request.is_disconnected():
+                    metrics.incr("sse.disconnected")
+                    return
+                continue
+            fut, pending = pending, None
+            try:
+                frame = fut.result()
+            except StopAsyncIteration:
+                return
+            yield frame
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+        aclose = getattr(it, "aclose", None)
+        if aclose is not None:
+            await aclose()
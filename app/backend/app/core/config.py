@@ -18,12 +18,90 @@ class Settings(BaseSettings):
     pinecone_env: str | None = None
     pinecone_host: str | None = None
     embedding_model: str | None = None
+    # "pinecone" (Inference API) or "hashing" (deterministic offline stand-in)
+    embedding_backend: str = "pinecone"
+    # Vector store backend: "pinecone" (hosted), "local" (in-process NumPy)
+    # or "snapshot" (memory-mapped quantized file shared across workers)
+    vector_store: str = "pinecone"
+    local_index_path: str | None = None
+    snapshot_path: str | None = None
+    snapshot_rescore: bool = True
+    vector_query_concurrency: int = 8
+    faq_corpus_version: str = ""
+    # Retrieval: "hybrid" (dense + BM25 via RRF), "dense" or "lexical"
+    retrieval_mode: str = "hybrid"
+    lexical_index_path: str | None = None
+    rrf_k: int = 60
+    # Query filtered and unfiltered together; keep filtered if top score >= floor
+    speculative_filter: bool = True
+    filter_score_floor: float = 0.3
+    # Prompt context: token budget, per-doc cap, and the relative score drop
+    # (vs. the top doc) at which remaining docs are left out
+    context_token_budget: int = 1500
+    context_max_doc_tokens: int = 400
+    context_score_gap: float = 0.35
+    # Prompt tokens for recent conversation history (newest messages first)
+    history_token_budget: int = 1500
+    # Rolling summary of turns that no longer fit the history budget
+    summary_model: str | None = None
+    summary_max_tokens: int = 300
+    # Typing-time retrieval prefetch (/chat/prefetch): result lifetime (0
+    # disables), per-identity debounce and rate cap, and how similar the sent
+    # text must be to the draft (1.0 = normalized exact match only; a near
+    # match reuses the draft's docs but never the answer cache)
+    prefetch_ttl_s: float = 30.0
+    prefetch_debounce_ms: int = 300
+    prefetch_per_minute: int = 30
+    prefetch_match_ratio: float = 1.0
+    # Threads serving async retrievals (embed + vector round trips) per process
+    retrieval_workers: int = 32
+    # MMR trade-off: 1.0 = pure relevance, lower = more diverse context
+    mmr_lambda: float = 0.7
+    # Query-embedding cache (size 0 disables; path enables the SQLite tier)
+    embed_cache_size: int = 4096
+    embed_cache_ttl_s: float = 7 * 24 * 3600
+    embed_cache_path: str | None = None
     llm_model: str | None = None
+    # Latency-tiered routing: single-clause, confidently retrieved turns with
+    # short history and prompt go to LLM_FAST_MODEL (unset = always LLM_MODEL);
+    # per-route time to first chunk before escalating / failing
+    llm_fast_model: str | None = None
+    router_max_clauses: int = 1
+    router_min_score: float = 0.6
+    router_max_history: int = 6
+    router_max_prompt_tokens: int = 2500
+    llm_fast_timeout_s: float = 8.0
+    llm_strong_timeout_s: float = 30.0
+    # SSE token coalescing: flush after this many ms or bytes (0 ms = per delta)
+    sse_coalesce_ms: int = 30
+    sse_coalesce_max_bytes: int = 256
+    # Flush a streaming answer's text to its DB row at most this often
+    stream_persist_ms: int = 1000
+    # Keep generating this long after the last reader disconnects, for resumes
+    # (0 cancels the upstream stream as soon as the client is gone)
+    stream_resume_grace_s: float = 5.0
+    # Share one LLM stream between identical concurrent first questions
+    coalesce_generations: bool = True
+    # LLM admission control: concurrent generations (adapts between min and
+    # max; 0 disables), bounded wait queue and its deadline, and the
+    # time-to-first-token above which the limit is trimmed
+    llm_max_in_flight: int = 32
+    llm_min_in_flight: int = 4
+    llm_queue_size: int = 64
+    llm_queue_timeout_s: float = 10.0
+    llm_latency_target_s: float = 3.0
     llm_api_key: str | None = None
 
-    # Reranker (optional)
+    # Semantic answer cache (size 0 disables)
+    answer_cache_size: int = 512
+    answer_cache_threshold: float = 0.95
+    answer_cache_ttl_s: float = 24 * 3600
+
+    # Reranker (optional; "local" selects the CPU stand-in scorer)
     rerank_model: str | None = None
     rerank_api_key: str | None = None
+    rerank_top_n: int = 20
+    rerank_timeout_ms: int = 300
 
     model_config = SettingsConfigDict(
         env_file=".env",
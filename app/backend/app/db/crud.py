@@ -2,9 +2,9 @@ import uuid
 from datetime import datetime, timezone
 from typing import Optional
 from uuid import UUID
-from sqlalchemy import select, and_, desc
+from sqlalchemy import select, and_, desc, tuple_, update
 from sqlalchemy.orm import Session
-from .models import User, Session as ChatSession, Message, Role
+from .models import User, Session as ChatSession, Message, MessageState, Role, SessionSummary
 
 # Users
 def create_user(db: Session, email: str, hashed_password: str) -> User:
@@ -45,6 +45,7 @@ def append_message(
     content: str,
     tokens_in: int = 0,
     tokens_out: int = 0,
+    state: MessageState = MessageState.complete,
 ) -> Message:
     msg = Message(
         session_id=session_id,
@@ -52,12 +53,42 @@ def append_message(
         content=content,
         tokens_in=tokens_in,
         tokens_out=tokens_out,
+        state=state,
     )
     db.add(msg)
     db.commit()
     db.refresh(msg)
     return msg
 
+def get_message(db: Session, message_id: UUID) -> Message | None:
+    return db.get(Message, message_id)
+
+def update_message(
+    db: Session,
+    message_id: UUID,
+    *,
+    content: str,
+    tokens_in: Optional[int] = None,
+    tokens_out: Optional[int] = None,
+    state: Optional[MessageState] = None,
+) -> None:
+    """Overwrite a message's content (and optionally counts/state) in place."""
+    values: dict = {"content": content}
+    if tokens_in is not None:
+        values["tokens_in"] = tokens_in
+    if tokens_out is not None:
+        values["tokens_out"] = tokens_out
+    if state is not None:
+        values["state"] = state
+    db.execute(update(Message).where(Message.id == message_id).values(**values))
+    db.commit()
+
+def delete_message(db: Session, message_id: UUID) -> None:
+    msg = db.get(Message, message_id)
+    if msg is not None:
+        db.delete(msg)
+        db.commit()
+
 def list_messages(db: Session, session_id: uuid.UUID, limit: int = 100) -> list[Message]:
     stmt = (
         select(Message)
@@ -67,6 +98,78 @@ def list_messages(db: Session, session_id: uuid.UUID, limit: int = 100) -> list[
     )
     return list(db.scalars(stmt))
 
+def list_recent_messages(
+    db: Session,
+    *,
+    session_id: UUID,
+    limit: int,
+    before: Optional[tuple[datetime, UUID]] = None,
+    after: Optional[tuple[datetime, UUID]] = None,
+) -> list:
+    """Newest-first page of the columns prompt history needs.
+
+    Keyset-paginated on `(created_at, id)`: pass the last row's pair as
+    `before` to fetch the next (older) page; `after` excludes rows at or
+    below a cursor (e.g. those already summarized). Served by
+    `ix_messages_session_created_id`.
+    """
+    stmt = select(
+        Message.id,
+        Message.role,
+        Message.content,
+        Message.tokens_in,
+        Message.tokens_out,
+        Message.state,
+        Message.created_at,
+    ).where(Message.session_id == session_id)
+    if before is not None:
+        stmt = stmt.where(tuple_(Message.created_at, Message.id) < tuple_(*before))
+    if after is not None:
+        stmt = stmt.where(tuple_(Message.created_at, Message.id) > tuple_(*after))
+    stmt = stmt.order_by(desc(Message.created_at), desc(Message.id)).limit(limit)
+    return list(db.execute(stmt))
+
+def list_messages_range(
+    db: Session,
+    *,
+    session_id: UUID,
+    after: Optional[tuple[datetime, UUID]],
+    through: tuple[datetime, UUID],
+    limit: int,
+) -> list:
+    """Oldest-first messages in the keyset range `(after, through]`."""
+    key = tuple_(Message.created_at, Message.id)
+    stmt = select(Message.id, Message.role, Message.content, Message.state, Message.created_at).where(
+        Message.session_id == session_id, key <= tuple_(*through)
+    )
+    if after is not None:
+        stmt = stmt.where(key > tuple_(*after))
+    stmt = stmt.order_by(Message.created_at.asc(), Message.id.asc()).limit(limit)
+    return list(db.execute(stmt))
+
+# Summaries
+def get_session_summary(db: Session, session_id: UUID) -> SessionSummary | None:
+    return db.get(SessionSummary, session_id)
+
+def upsert_session_summary(
+    db: Session,
+    *,
+    session_id: UUID,
+    content: str,
+    tokens: int,
+    through: tuple[datetime, UUID],
+) -> SessionSummary:
+    summary = db.get(SessionSummary, session_id)
+    if summary is None:
+        summary = SessionSummary(session_id=session_id)
+    summary.content = content
+    summary.tokens = tokens
+    summary.through_created_at, summary.through_message_id = through
+    db.add(summary)
+    db.commit()
+    db.refresh(summary)
+    return summary
+
 def get_session(db: Session, session_id: UUID) -> ChatSession | None:
     return db.scalar(select(ChatSession).where(ChatSession.id == session_id))
 
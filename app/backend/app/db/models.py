@@ -3,7 +3,7 @@ import enum
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import Enum, ForeignKey, String, Text, Integer, func
+from sqlalchemy import Enum, ForeignKey, Index, String, Text, Integer, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID, TIMESTAMP
 from .base import Base
@@ -13,6 +13,11 @@ class Role(str, enum.Enum):
     assistant = "assistant"
     system = "system"
 
+class MessageState(str, enum.Enum):
+    complete = "complete"
+    streaming = "streaming"  # assistant answer still being generated
+    interrupted = "interrupted"  # generation stopped early; content is partial
+
 class User(Base):
     __tablename__ = "users"
 
@@ -44,6 +49,32 @@ class Message(Base):
     content: Mapped[str] = mapped_column(Text, nullable=False)
     tokens_in: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     tokens_out: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    state: Mapped[MessageState] = mapped_column(
+        Enum(MessageState, name="message_state"), default=MessageState.complete,
+        server_default=MessageState.complete.value, nullable=False,
+    )
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
 
     session: Mapped["Session"] = relationship(back_populates="messages")
+
+    __table_args__ = (
+        # Newest-first keyset scans of a session's history
+        Index("ix_messages_session_created_id", "session_id", "created_at", "id"),
+    )
+
+class SessionSummary(Base):
+    """Running summary of a session's older turns (see services/summaries.py).
+
+    Covers every message up to and including `(through_created_at,
+    through_message_id)`; newer messages are sent to the model verbatim.
+    """
+    __tablename__ = "session_summaries"
+
+    session_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("sessions.id"), primary_key=True)
+    content: Mapped[str] = mapped_column(Text, nullable=False)
+    tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    through_created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False)
+    through_message_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
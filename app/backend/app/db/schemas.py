@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import Optional
 from uuid import UUID
 from pydantic import BaseModel, ConfigDict
-from .models import Role
+from .models import MessageState, Role
 
 class ORMModel(BaseModel):
     model_config = ConfigDict(from_attributes=True)  # pydantic v2 replacement for orm_mode
@@ -44,4 +44,5 @@ class MessageOut(ORMModel):
     content: str
     tokens_in: int
     tokens_out: int
+    state: MessageState = MessageState.complete
     created_at: datetime
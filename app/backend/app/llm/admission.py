@@ -0,0 +1,210 @@
+"""Admission control for upstream LLM generations.
+
+Every streamed completion takes a slot from the process-wide
+`AdmissionController` before it opens the upstream request and gives it back
+when the stream ends. When all slots are busy, requests wait in a bounded
+FIFO queue (reporting their position) for at most `LLM_QUEUE_TIMEOUT_S`; if
+the queue itself is full, `reserve` raises `Overloaded` straight away so the
+API can answer 503 instead of piling more load on the provider.
+
+The slot limit adapts AIMD-style between `LLM_MIN_IN_FLIGHT` and
+`LLM_MAX_IN_FLIGHT`: a provider 429 halves it, a time-to-first-token above
+`LLM_LATENCY_TARGET_S` trims it by 10%, and each healthy completion adds
+1/limit (about +1 per limit's worth of completions).
+"""
+from __future__ import annotations
+
+from collections import deque
+from typing import Callable, Deque, Optional
+import asyncio
+import logging
+import math
+import threading
+
+from ..core.config import settings
+from ..utils import metrics
+
+
+logger = logging.getLogger("llm.admission")
+
+RATE_LIMIT_BACKOFF = 0.5
+LATENCY_BACKOFF = 0.9
+
+
+class Overloaded(Exception):
+    """No capacity for another generation; retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    return getattr(exc, "status_code", None) == 429
+
+
+class Ticket:
+    """A reserved place in line; `wait` until granted, then `release` once."""
+
+    def __init__(self, controller: "AdmissionController", granted: bool):
+        self._controller = controller
+        self._future: Optional[asyncio.Future] = None
+        self.granted = granted
+        self._released = False
+        if not granted:
+            self._future = asyncio.get_running_loop().create_future()
+
+    def position(self) -> int:
+        """1-based place in the queue (0 once granted)."""
+        if self.granted:
+            return 0
+        try:
+            return self._controller._queue.index(self) + 1
+        except ValueError:
+            return 0
+
+    def _grant(self) -> None:
+        self.granted = True
+        if self._future is not None and not self._future.done():
+            self._future.set_result(None)
+
+    async def wait(
+        self, on_position: Optional[Callable[[int], None]] = None, timeout_s: Optional[float] = None
+    ) -> None:
+        """Block until a slot is granted; raises `Overloaded` at the deadline."""
+        if self.granted:
+            return
+        assert self._future is not None
+        timeout_s = settings.llm_queue_timeout_s if timeout_s is None else timeout_s
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_s
+        last = -1
+        while not self.granted:
+            pos = self.position()
+            if on_position is not None and pos != last:
+                on_position(pos)
+                last = pos
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self._controller._abandon(self)
+                metrics.incr("admission.timeout")
+                raise Overloaded("LLM capacity busy; timed out in queue", retry_after=math.ceil(timeout_s))
+            # Wake periodically to refresh the reported position
+            await asyncio.wait({self._future}, timeout=min(remaining, 1.0))
+
+    def release(self, *, ttft_s: Optional[float] = None, rate_limited: bool = False) -> None:
+        if self._released:
+            return
+        self._released = True
+        if self.granted:
+            self._controller._finish(ttft_s=ttft_s, rate_limited=rate_limited)
+        else:
+            self._controller._abandon(self)
+
+
+class AdmissionController:
+    """Adaptive concurrency limit with a bounded FIFO wait queue."""
+
+    def __init__(
+        self,
+        limit: int,
+        *,
+        max_queue: int,
+        min_limit: int = 1,
+        max_limit: Optional[int] = None,
+        latency_target_s: float = 0.0,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit or limit)
+        self.limit = float(min(max(limit, self.min_limit), self.max_limit))
+        self.max_queue = max_queue
+        self.latency_target_s = latency_target_s
+        self.in_flight = 0
+        self._queue: Deque[Ticket] = deque()
+        self._lock = threading.Lock()
+
+    def saturated(self) -> bool:
+        """True when a new request would be shed."""
+        with self._lock:
+            return self.in_flight >= int(self.limit) and len(self._queue) >= self.max_queue
+
+    def reserve(self) -> Ticket:
+        """Take a slot or a place in line; raises `Overloaded` if the queue is full."""
+        with self._lock:
+            if self.in_flight < int(self.limit) and not self._queue:
+                self.in_flight += 1
+                return Ticket(self, granted=True)
+            if len(self._queue) >= self.max_queue:
+                metrics.incr("admission.shed")
+                raise Overloaded("LLM capacity busy; try again shortly")
+            ticket = Ticket(self, granted=False)
+            self._queue.append(ticket)
+        metrics.incr("admission.queued")
+        return ticket
+
+    def _admit_waiting(self) -> None:
+        # Called with the lock held
+        while self._queue and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self._queue.popleft()._grant()
+
+    def _abandon(self, ticket: Ticket) -> None:
+        with self._lock:
+            if ticket.granted:
+                # Granted while giving up: hand the slot on
+                self.in_flight -= 1
+            else:
+                try:
+                    self._queue.remove(ticket)
+                except ValueError:
+                    pass
+            self._admit_waiting()
+
+    def _finish(self, *, ttft_s: Optional[float], rate_limited: bool) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            before = self.limit
+            if rate_limited:
+                self.limit = max(self.min_limit, self.limit * RATE_LIMIT_BACKOFF)
+                metrics.incr("admission.rate_limited")
+            elif ttft_s is not None and self.latency_target_s > 0 and ttft_s > self.latency_target_s:
+                self.limit = max(self.min_limit, self.limit * LATENCY_BACKOFF)
+            elif ttft_s is not None:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            if int(self.limit) != int(before):
+                logger.info("admission: limit %d -> %d (in_flight=%d queued=%d)",
+                            int(before), int(self.limit), self.in_flight, len(self._queue))
+            self._admit_waiting()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"limit": int(self.limit), "in_flight": self.in_flight, "queued": len(self._queue)}
+
+
+_controller: AdmissionController | None = None
+_controller_lock = threading.Lock()
+
+
+def get_admission() -> AdmissionController | None:
+    """Process-wide controller, or None when `LLM_MAX_IN_FLIGHT` is 0."""
+    global _controller
+    if settings.llm_max_in_flight <= 0:
+        return None
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    settings.llm_max_in_flight,
+                    max_queue=settings.llm_queue_size,
+                    min_limit=settings.llm_min_in_flight,
+                    max_limit=settings.llm_max_in_flight,
+                    latency_target_s=settings.llm_latency_target_s,
+                )
+                metrics.register_gauge("admission", _controller.stats)
+    return _controller
+
+
+def set_admission(controller: AdmissionController | None) -> None:
+    global _controller
+    with _controller_lock:
+        _controller = controller
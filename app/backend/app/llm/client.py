@@ -1,16 +1,21 @@
 from __future__ import annotations
-"""OpenAI client factory with tuned HTTP timeouts for streaming.
+"""OpenAI client factories with tuned HTTP timeouts for streaming.
 
-This module exposes a singleton OpenAI client configured with slightly
-longer read timeouts to better accommodate server-sent events (SSE)
-token streams without premature read timeouts.
+This module exposes singleton sync and async OpenAI clients configured with
+slightly longer read timeouts to better accommodate server-sent events (SSE)
+token streams without premature read timeouts. The chat endpoint uses the
+async client so an idle-waiting stream holds no worker thread.
 """
 
 import httpx
-from openai import OpenAI, DefaultHttpxClient
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, OpenAI, DefaultHttpxClient
 from ..core.config import settings
 
+# connect/read/write in seconds
+_TIMEOUT = httpx.Timeout(60.0, read=180.0, write=10.0, connect=5.0)
+
 _client: OpenAI | None = None
+_async_client: AsyncOpenAI | None = None
 
 def get_openai() -> OpenAI:
     """Return a process-wide OpenAI client instance.
@@ -26,9 +31,24 @@ def get_openai() -> OpenAI:
         raise RuntimeError("LLM_API_KEY not configured")
     _client = OpenAI(
         api_key=settings.llm_api_key,
-        http_client=DefaultHttpxClient(
-            # connect/read/write in seconds
-            timeout=httpx.Timeout(60.0, read=180.0, write=10.0, connect=5.0)
-        ),
+        http_client=DefaultHttpxClient(timeout=_TIMEOUT),
     )
     return _client
+
+
+def get_async_openai() -> AsyncOpenAI:
+    """Return a process-wide AsyncOpenAI client with the same timeouts.
+
+    Must be used from the event loop that serves requests; the underlying
+    connection pool is bound to it.
+    """
+    global _async_client
+    if _async_client:
+        return _async_client
+    if not settings.llm_api_key:
+        raise RuntimeError("LLM_API_KEY not configured")
+    _async_client = AsyncOpenAI(
+        api_key=settings.llm_api_key,
+        http_client=DefaultAsyncHttpxClient(timeout=_TIMEOUT),
+    )
+    return _async_client
@@ -0,0 +1,76 @@
+"""Latency-tiered model routing.
+
+`choose_route` sends a turn to the fast model when every signal says it is
+simple: a single clause from query decomposition, a confident top
+retrieval score, a short history and a small prompt. Everything else goes
+to the strong model (`LLM_MODEL`). Without `LLM_FAST_MODEL` configured every
+turn takes the strong route.
+
+Each route has its own time-to-first-chunk budget. `escalation` lists the
+routes to try in order: a fast-route failure or timeout before any output
+falls through to the strong route instead of failing the turn.
+
+The score threshold is on the retriever's scale: cosine for dense search,
+fused scores normalized so rank 1 in every list is 1.0 for hybrid, or the
+reranker's score when reranking is on.
+"""
+from __future__ import annotations
+
+from typing import List, NamedTuple, Tuple
+
+from ..core.config import settings
+from ..utils import metrics
+
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+
+class Route(NamedTuple):
+    name: str  # "fast" or "strong"
+    model: str
+    timeout_s: float  # budget for the request to produce its first chunk
+
+
+class RouteSignals(NamedTuple):
+    clauses: int
+    top_score: float
+    history_messages: int
+    prompt_tokens: int
+
+
+def strong_route() -> Route:
+    return Route("strong", settings.llm_model or DEFAULT_MODEL, settings.llm_strong_timeout_s)
+
+
+def fast_route() -> Route | None:
+    if not settings.llm_fast_model:
+        return None
+    return Route("fast", settings.llm_fast_model, settings.llm_fast_timeout_s)
+
+
+def choose_route(signals: RouteSignals) -> Tuple[Route, str]:
+    """Pick a route for the turn; the second value says why (for logs/metrics)."""
+    fast = fast_route()
+    if fast is None:
+        reason = "no_fast_model"
+    elif signals.clauses > settings.router_max_clauses:
+        reason = "multi_clause"
+    elif signals.top_score < settings.router_min_score:
+        reason = "low_score"
+    elif signals.history_messages > settings.router_max_history:
+        reason = "long_history"
+    elif signals.prompt_tokens > settings.router_max_prompt_tokens:
+        reason = "large_prompt"
+    else:
+        metrics.incr("router.fast")
+        return fast, "simple"
+    metrics.incr("router.strong")
+    metrics.incr(f"router.reason.{reason}")
+    return strong_route(), reason
+
+
+def escalation(route: Route) -> List[Route]:
+    """Routes to try, in order, starting from `route`."""
+    if route.name == "strong":
+        return [route]
+    return [route, strong_route()]
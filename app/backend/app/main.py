@@ -17,7 +17,12 @@ def _configure_logging() -> None:
     fmt = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
     handler = logging.StreamHandler()
     handler.setFormatter(fmt)
-    for name in ("rag.embedder", "rag.retriever", "services.chat", "utils.tokens"):
+    for name in (
+        "rag.embedder", "rag.retriever", "rag.vector_store", "rag.embed_cache", "rag.lexical",
+        "rag.reranker", "rag.ingest", "rag.snapshot", "llm.admission",
+        "services.chat", "services.answer_cache", "services.summaries", "services.generation_hub",
+        "services.live_answers", "services.prefetch", "utils.tokens",
+    ):
         lg = logging.getLogger(name)
         lg.setLevel(logging.DEBUG)
         lg.propagate = False 
@@ -0,0 +1,183 @@
+"""Offline retrieval benchmark: quality (recall@k, MRR) and per-stage latency.
+
+Runs a labelled query set through `retrieve` against deterministic local
+stand-ins: the hashing embedder, the in-process NumPy vector store and the
+BM25 index, all built from a FAQ source file. No network access is needed, so
+results are reproducible and can gate regressions in CI.
+
+Usage (from `app/backend`):
+
+    python -m app.rag.bench --out bench_results.json
+    python -m app.rag.bench --mode dense --min-recall 0.8 --max-p95-ms 5
+
+Query files are JSONL rows `{"query": str, "relevant": [doc ids]}`. The
+process exits non-zero when a `--min-*`/`--max-*` gate fails.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from ..core.config import settings
+from . import embedder
+from .ingest import iter_chunks, iter_source
+from .lexical import BM25Index, set_lexical_index
+from .retriever import retrieve
+from .vector_store import LocalVectorStore, set_vector_store
+
+
+BENCH_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "bench")
+STAGES = ("decompose", "embed", "query", "rerank", "select")
+
+
+@dataclass
+class QueryResult:
+    query: str
+    relevant: List[str]
+    retrieved: List[str]
+    recall: float
+    reciprocal_rank: float
+    timings: List[Dict[str, float]] = field(default_factory=list, repr=False)
+
+
+def build_local_corpus(source: str) -> None:
+    """Index `source` with the hashing embedder into the process-wide stores."""
+    chunks = list(iter_chunks(iter_source(source)))
+    vectors = embedder.hash_embed([c.text for c in chunks])
+    records = [
+        {"id": c.id, "text": c.text, "category": c.category, "values": v}
+        for c, v in zip(chunks, vectors)
+    ]
+    set_vector_store(LocalVectorStore.from_records(records))
+    set_lexical_index(BM25Index.from_records(records))
+
+
+def _percentiles(samples: Sequence[float]) -> Dict[str, float]:
+    arr = np.asarray(samples, dtype=np.float64)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 4),
+        "p95": round(float(p95), 4),
+        "p99": round(float(p99), 4),
+        "mean": round(float(arr.mean()), 4),
+    }
+
+
+def run(queries: Sequence[dict], k: int = 4, repeats: int = 20) -> dict:
+    """Run every query `repeats` times (after one warm-up) and aggregate."""
+    results: List[QueryResult] = []
+    for row in queries:
+        relevant = [str(r) for r in row["relevant"]]
+        retrieve(row["query"], final_k=k)  # warm-up
+        timings: List[Dict[str, float]] = []
+        retrieved: List[str] = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            r = retrieve(row["query"], final_k=k)
+            stage = dict(r.timings)
+            stage["total"] = (time.perf_counter() - t0) * 1000.0
+            timings.append(stage)
+            retrieved = [d.id for d in r.docs]
+        hits = [i for i, doc_id in enumerate(retrieved) if doc_id in relevant]
+        results.append(QueryResult(
+            query=row["query"],
+            relevant=relevant,
+            retrieved=retrieved,
+            recall=len(set(retrieved) & set(relevant)) / len(relevant),
+            reciprocal_rank=1.0 / (hits[0] + 1) if hits else 0.0,
+            timings=timings,
+        ))
+
+    multi = [r for r in results if len(r.relevant) > 1]
+    latency = {
+        stage: _percentiles([t.get(stage, 0.0) for r in results for t in r.timings])
+        for stage in STAGES + ("total",)
+    }
+    return {
+        "config": {
+            "k": k,
+            "repeats": repeats,
+            "queries": len(results),
+            "mode": settings.retrieval_mode,
+            "rerank_model": settings.rerank_model,
+        },
+        "quality": {
+            f"recall@{k}": round(float(np.mean([r.recall for r in results])), 4),
+            "mrr": round(float(np.mean([r.reciprocal_rank for r in results])), 4),
+            f"multi_intent_recall@{k}": round(float(np.mean([r.recall for r in multi])), 4) if multi else None,
+        },
+        "latency_ms": latency,
+        "queries": [
+            {
+                "query": r.query,
+                "relevant": r.relevant,
+                "retrieved": r.retrieved,
+                "recall": r.recall,
+                "reciprocal_rank": r.reciprocal_rank,
+            }
+            for r in results
+        ],
+    }
+
+
+def check_gates(
+    report: dict,
+    *,
+    min_recall: Optional[float] = None,
+    min_mrr: Optional[float] = None,
+    max_p95_ms: Optional[float] = None,
+) -> List[str]:
+    """Return human-readable gate failures (empty when all gates pass)."""
+    failures: List[str] = []
+    recall = report["quality"][f"recall@{report['config']['k']}"]
+    if min_recall is not None and recall < min_recall:
+        failures.append(f"recall {recall} < {min_recall}")
+    if min_mrr is not None and report["quality"]["mrr"] < min_mrr:
+        failures.append(f"mrr {report['quality']['mrr']} < {min_mrr}")
+    p95 = report["latency_ms"]["total"]["p95"]
+    if max_p95_ms is not None and p95 > max_p95_ms:
+        failures.append(f"p95 {p95}ms > {max_p95_ms}ms")
+    return failures
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark.")
+    parser.add_argument("--corpus", default=os.path.join(BENCH_DIR, "faq.jsonl"))
+    parser.add_argument("--queries", default=os.path.join(BENCH_DIR, "queries.jsonl"))
+    parser.add_argument("--mode", choices=("hybrid", "dense", "lexical"), default="hybrid")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--out", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--min-recall", type=float)
+    parser.add_argument("--min-mrr", type=float)
+    parser.add_argument("--max-p95-ms", type=float)
+    args = parser.parse_args(argv)
+
+    settings.embedding_backend = "hashing"
+    settings.retrieval_mode = args.mode
+    embedder.set_embed_cache(None)  # measure the embed stage, not cache hits
+    build_local_corpus(args.corpus)
+    report = run(list(iter_source(args.queries)), k=args.k, repeats=args.repeats)
+
+    payload = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            fh.write(payload + "\n")
+    else:
+        print(payload)
+
+    failures = check_gates(report, min_recall=args.min_recall, min_mrr=args.min_mrr, max_p95_ms=args.max_p95_ms)
+    for f in failures:
+        print(f"GATE FAILED: {f}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
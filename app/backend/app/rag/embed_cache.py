@@ -0,0 +1,167 @@
+"""Two-tier cache for query embeddings.
+
+Keys are `<model>:<normalized text>` so trivially different phrasings of the
+same clause ("Reset password?" / "reset password") share an entry.
+
+- Tier 1: in-process LRU with TTL, bounded by `EMBED_CACHE_SIZE` entries.
+- Tier 2 (optional): a SQLite file at `EMBED_CACHE_PATH`. Warm entries survive
+  restarts and are shared by every worker process on the host.
+
+Set `EMBED_CACHE_SIZE=0` to disable caching entirely.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from ..core.config import settings
+from .text import normalize
+
+
+logger = logging.getLogger("rag.embed_cache")
+
+
+def cache_key(model: str, text: str) -> str:
+    return f"{model}:{normalize(text)}"
+
+
+class SqliteEmbeddingStore:
+    """Persistent tier: float32 vectors stored as blobs keyed by cache key."""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vec BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys: Sequence[str], min_created: float) -> Dict[str, np.ndarray]:
+        if not keys:
+            return {}
+        marks = ",".join("?" for _ in keys)
+        rows = self._conn().execute(
+            f"SELECT key, vec FROM embeddings WHERE key IN ({marks}) AND created_at >= ?",
+            (*keys, min_created),
+        ).fetchall()
+        return {k: np.frombuffer(blob, dtype=np.float32) for k, blob in rows}
+
+    def put_many(self, items: Sequence[Tuple[str, np.ndarray]], created_at: float) -> None:
+        if not items:
+            return
+        conn = self._conn()
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vec, created_at) VALUES (?, ?, ?)",
+            [(k, v.astype(np.float32).tobytes(), created_at) for k, v in items],
+        )
+        conn.commit()
+
+
+class EmbeddingCache:
+    """Thread-safe LRU + TTL cache with an optional persistent second tier."""
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_s: float,
+        store: Optional[SqliteEmbeddingStore] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._store = store
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_settings(cls) -> Optional["EmbeddingCache"]:
+        if settings.embed_cache_size <= 0:
+            return None
+        store = SqliteEmbeddingStore(settings.embed_cache_path) if settings.embed_cache_path else None
+        return cls(settings.embed_cache_size, settings.embed_cache_ttl_s, store)
+
+    def _put_local(self, key: str, vec: np.ndarray, expires_at: float) -> None:
+        self._entries[key] = (expires_at, vec)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """Return cached vectors for the keys that are present and fresh."""
+        now = time.time()
+        found: Dict[str, np.ndarray] = {}
+        missing: List[str] = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[1]
+                else:
+                    if entry is not None:
+                        del self._entries[key]
+                    missing.append(key)
+            self.hits += len(found)
+
+        if missing and self._store is not None:
+            try:
+                stored = self._store.get_many(missing, min_created=now - self.ttl_s)
+            except sqlite3.Error:
+                logger.exception("embed_cache: persistent tier read failed")
+                stored = {}
+            with self._lock:
+                for key, vec in stored.items():
+                    self._put_local(key, vec, now + self.ttl_s)
+                self.persistent_hits += len(stored)
+            found.update(stored)
+
+        with self._lock:
+            self.misses += sum(1 for k in set(keys) if k not in found)
+        return {k: v.tolist() for k, v in found.items()}
+
+    def put_many(self, items: Sequence[Tuple[str, Sequence[float]]]) -> None:
+        now = time.time()
+        arrays = [(k, np.asarray(v, dtype=np.float32)) for k, v in items]
+        with self._lock:
+            for key, vec in arrays:
+                self._put_local(key, vec, now + self.ttl_s)
+        if self._store is not None:
+            try:
+                self._store.put_many(arrays, created_at=now)
+            except sqlite3.Error:
+                logger.exception("embed_cache: persistent tier write failed")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -1,31 +1,138 @@
 """Query embedding via Pinecone Inference API.
 
 `embed_query(text)` returns a normalized float vector for use with Pinecone
-query. Requires `PINECONE_API_KEY` and a valid `EMBEDDING_MODEL` (defaults to
+query; `embed_queries(texts)` embeds a batch in one inference call. Both go
+through the query-embedding cache in `embed_cache.py`. Requires
+`PINECONE_API_KEY` and a valid `EMBEDDING_MODEL` (defaults to
 `llama-text-embed-v2`).
 """
 from __future__ import annotations
 
 
+import hashlib
 import logging
+import math
 from pinecone import Pinecone
 from ..core.config import settings
+from ..utils import metrics
+from .embed_cache import EmbeddingCache, cache_key
+from .text import normalize
 
 
-_pc = Pinecone(api_key=settings.pinecone_api_key)
+_pc: Pinecone | None = None
+_cache: EmbeddingCache | None = None
+_cache_ready = False
 MODEL = settings.embedding_model or "llama-text-embed-v2"
 logger = logging.getLogger("rag.embedder")
 
 
-def embed_query(text: str) -> list[float]:
-    if not settings.pinecone_api_key:
-        raise RuntimeError("PINECONE_API_KEY missing")
-    out = _pc.inference.embed(
+def _get_client() -> Pinecone:
+    # Created lazily so importing the RAG package never requires Pinecone
+    global _pc
+    if _pc is None:
+        if not settings.pinecone_api_key:
+            raise RuntimeError("PINECONE_API_KEY missing")
+        _pc = Pinecone(api_key=settings.pinecone_api_key)
+    return _pc
+
+
+def get_embed_cache() -> EmbeddingCache | None:
+    """Return the process-wide query-embedding cache (None when disabled)."""
+    global _cache, _cache_ready
+    if not _cache_ready:
+        _cache = EmbeddingCache.from_settings()
+        _cache_ready = True
+        if _cache is not None:
+            metrics.register_gauge("embed_cache", _cache.stats)
+    return _cache
+
+
+def set_embed_cache(cache: EmbeddingCache | None) -> None:
+    """Override the process-wide cache (None disables caching)."""
+    global _cache, _cache_ready
+    _cache = cache
+    _cache_ready = True
+
+
+HASHING_DIM = 384
+
+
+def hash_embed(texts: list[str], dim: int = HASHING_DIM) -> list[list[float]]:
+    """Deterministic feature-hashing embeddings (unigrams + bigrams).
+
+    A stand-in for offline development, tests and benchmarks; enable with
+    `EMBEDDING_BACKEND=hashing` and index the corpus with the same backend.
+    """
+    out: list[list[float]] = []
+    for text in texts:
+        toks = normalize(text).split()
+        vec = [0.0] * dim
+        for feat in toks + [f"{a} {b}" for a, b in zip(toks, toks[1:])]:
+            h = int.from_bytes(hashlib.blake2b(feat.encode("utf-8"), digest_size=8).digest(), "little")
+            vec[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        out.append([v / norm for v in vec])
+    return out
+
+
+def _embed_uncached(texts: list[str]) -> list[list[float]]:
+    if settings.embedding_backend == "hashing":
+        return hash_embed(texts)
+    out = _get_client().inference.embed(
         model=MODEL,
-        inputs=[text],
+        inputs=list(texts),
         parameters={"input_type": "query", "truncate": "END"},
     )
-    vec = list(out.data[0].values)
+    vecs = [list(item.values) for item in out.data]
+    logger.debug(
+        "embed_queries: model=%s batch=%d dim=%d text_preview=%s",
+        MODEL,
+        len(vecs),
+        len(vecs[0]) if vecs else 0,
+        [t[:40] for t in texts],
+    )
+    return vecs
+
+
+def embed_queries(texts: list[str]) -> list[list[float]]:
+    """Embed several query texts, calling inference once for all cache misses."""
+    if not texts:
+        return []
+    cache = get_embed_cache()
+    if cache is None:
+        return _embed_uncached(list(texts))
+
+    keys = [cache_key(MODEL, t) for t in texts]
+    found = cache.get_many(keys)
+    todo: dict[str, str] = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in todo:
+            todo[key] = text
+    if todo:
+        fresh = _embed_uncached(list(todo.values()))
+        computed = list(zip(todo.keys(), fresh))
+        cache.put_many(computed)
+        found.update(computed)
+    logger.debug("embed_queries: cached=%d embedded=%d", len(texts) - len(todo), len(todo))
+    return [found[k] for k in keys]
+
+
+def embed_documents(texts: list[str]) -> list[list[float]]:
+    """Embed FAQ passages for indexing (uncached, `input_type=passage`)."""
+    if not texts:
+        return []
+    if settings.embedding_backend == "hashing":
+        return hash_embed(texts)
+    out = _get_client().inference.embed(
+        model=MODEL,
+        inputs=list(texts),
+        parameters={"input_type": "passage", "truncate": "END"},
+    )
+    return [list(item.values) for item in out.data]
+
+
+def embed_query(text: str) -> list[float]:
+    vec = embed_queries([text])[0]
     try:
         l2 = sum(v * v for v in vec) ** 0.5
     except Exception:
@@ -38,5 +145,3 @@ def embed_query(text: str) -> list[float]:
         text[:80],
     )
     return vec
-
-
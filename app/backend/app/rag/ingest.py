@@ -0,0 +1,301 @@
+"""Incremental FAQ ingestion: chunk, hash, embed what changed, upsert, prune.
+
+Usage (from `app/backend`):
+
+    python -m app.rag.ingest faqs.jsonl --target local
+    python -m app.rag.ingest faqs.csv --target pinecone --concurrency 8
+
+Source rows (JSONL or CSV) carry `question`/`answer` or `text`, plus optional
+`id` and `category`. Each row is split into chunks of at most `--max-chars`;
+every chunk gets a stable id and a content hash. A manifest (`id -> hash`)
+from the previous run against the same destination decides which chunks
+are new or changed: only those are embedded (in large batches) and upserted
+(in bounded batches, several in flight). Ids in the manifest that no longer
+appear in the source are deleted. The default manifest is keyed on the
+destination (`<out>.manifest.json`, or `pinecone-<index>.manifest.json` next
+to the source), so switching target or `--out` starts from a full index.
+
+`--target local` rewrites the JSONL at `LOCAL_INDEX_PATH` (or `--out`);
+running servers pick it up on restart. `--target pinecone` writes to the
+index at `PINECONE_HOST`; bump `FAQ_CORPUS_VERSION` afterwards to invalidate
+cached answers.
+"""
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Protocol, Sequence
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+from ..core.config import settings
+
+
+logger = logging.getLogger("rag.ingest")
+
+EMBED_BATCH = 96
+UPSERT_BATCH = 100
+DELETE_BATCH = 1000
+
+
+@dataclass
+class Chunk:
+    id: str
+    text: str
+    category: Optional[str]
+    hash: str
+
+
+@dataclass
+class IngestStats:
+    seen: int = 0
+    unchanged: int = 0
+    embedded: int = 0
+    embed_calls: int = 0
+    upserted: int = 0
+    deleted: int = 0
+
+
+class Sink(Protocol):
+    def upsert(self, records: Sequence[dict]) -> None:
+        ...
+
+    def delete(self, ids: Sequence[str]) -> None:
+        ...
+
+
+class JsonlSink:
+    """Maintains the local-store JSONL file; written atomically on `close`."""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._records: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fh:
+                for line in fh:
+                    if line.strip():
+                        rec = json.loads(line)
+                        self._records[str(rec["id"])] = rec
+
+    def upsert(self, records: Sequence[dict]) -> None:
+        with self._lock:
+            for r in records:
+                self._records[r["id"]] = {
+                    "id": r["id"],
+                    "text": r["text"],
+                    "category": r.get("category"),
+                    "values": list(r["values"]),
+                }
+
+    def delete(self, ids: Sequence[str]) -> None:
+        with self._lock:
+            for i in ids:
+                self._records.pop(i, None)
+
+    def close(self) -> None:
+        tmp = f"{self._path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            for rec in self._records.values():
+                fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        os.replace(tmp, self._path)
+
+
+def iter_source(path: str) -> Iterator[dict]:
+    """Stream rows from a JSONL or CSV source file."""
+    with open(path, "r", encoding="utf-8", newline="") as fh:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(fh)
+        else:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def split_text(text: str, max_chars: int) -> List[str]:
+    """Pack paragraphs (then sentences, then hard cuts) into chunks <= max_chars."""
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
+    pieces: List[str] = []
+    for para in re.split(r"\n\s*\n", text):
+        if len(para) <= max_chars:
+            pieces.append(para.strip())
+            continue
+        for sent in re.split(r"(?<=[.!?])\s+", para):
+            while len(sent) > max_chars:
+                pieces.append(sent[:max_chars])
+                sent = sent[max_chars:]
+            pieces.append(sent.strip())
+    chunks: List[str] = []
+    current = ""
+    for piece in filter(None, pieces):
+        candidate = f"{current}\n\n{piece}" if current else piece
+        if len(candidate) <= max_chars:
+            current = candidate
+        else:
+            chunks.append(current)
+            current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def content_hash(text: str, category: Optional[str]) -> str:
+    return hashlib.sha256(f"{category or ''}\x1f{text}".encode("utf-8")).hexdigest()
+
+
+def iter_chunks(rows: Iterable[dict], max_chars: int = 1500) -> Iterator[Chunk]:
+    for n, row in enumerate(rows, start=1):
+        base_id = str(row.get("id") or f"faq-{n}")
+        category = row.get("category") or None
+        question = (row.get("question") or "").strip()
+        body = row.get("answer") if question else row.get("text") or row.get("chunk_text")
+        # Budget for the question prefix so every chunk stays self-contained
+        parts = split_text(body or "", max(1, max_chars - len(question) - 1))
+        for i, part in enumerate(parts):
+            text = f"{question}\n{part}" if question else part
+            chunk_id = base_id if len(parts) == 1 else f"{base_id}#{i + 1}"
+            yield Chunk(id=chunk_id, text=text, category=category, hash=content_hash(text, category))
+
+
+def ingest(
+    chunks: Iterable[Chunk],
+    sink: Sink,
+    manifest: Dict[str, str],
+    *,
+    embed_fn: Callable[[List[str]], List[List[float]]],
+    embed_batch: int = EMBED_BATCH,
+    upsert_batch: int = UPSERT_BATCH,
+    concurrency: int = 4,
+) -> tuple[IngestStats, Dict[str, str]]:
+    """Embed and upsert new/changed chunks, delete stale ids.
+
+    Returns the stats and the manifest describing the sink after the run.
+    Exceptions from embedding or upserts propagate; the caller must then keep
+    the previous manifest so the next run retries.
+    """
+    stats = IngestStats()
+    new_manifest: Dict[str, str] = {}
+    pending: List[Chunk] = []
+    in_flight: List[Future] = []
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="ingest") as pool:
+
+        def drain(limit: int) -> None:
+            while len(in_flight) > limit:
+                in_flight.pop(0).result()
+
+        def flush() -> None:
+            if not pending:
+                return
+            vectors = embed_fn([c.text for c in pending])
+            stats.embed_calls += 1
+            stats.embedded += len(pending)
+            records = [
+                {"id": c.id, "text": c.text, "category": c.category, "values": v}
+                for c, v in zip(pending, vectors)
+            ]
+            for start in range(0, len(records), upsert_batch):
+                batch = records[start:start + upsert_batch]
+                in_flight.append(pool.submit(sink.upsert, batch))
+                stats.upserted += len(batch)
+                # bound memory: at most ~2x concurrency batches queued
+                drain(2 * concurrency)
+            pending.clear()
+
+        for chunk in chunks:
+            if chunk.id in new_manifest:
+                logger.warning("ingest: duplicate chunk id %s; keeping the first", chunk.id)
+                continue
+            stats.seen += 1
+            new_manifest[chunk.id] = chunk.hash
+            if manifest.get(chunk.id) == chunk.hash:
+                stats.unchanged += 1
+                continue
+            pending.append(chunk)
+            if len(pending) >= embed_batch:
+                flush()
+        flush()
+        drain(0)
+
+    stale = [i for i in manifest if i not in new_manifest]
+    for start in range(0, len(stale), DELETE_BATCH):
+        sink.delete(stale[start:start + DELETE_BATCH])
+    stats.deleted = len(stale)
+    return stats, new_manifest
+
+
+def _load_manifest(path: str) -> Dict[str, str]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _save_manifest(path: str, manifest: Dict[str, str]) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=0, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def default_manifest_path(target: str, source: str, out: Optional[str] = None) -> str:
+    """Manifest path for a destination: the local index file or the Pinecone index."""
+    if target == "local":
+        return f"{out}.manifest.json"
+    index = settings.pinecone_index or settings.pinecone_host or "default"
+    index = re.sub(r"[^A-Za-z0-9_.-]+", "_", index)
+    return os.path.join(os.path.dirname(os.path.abspath(source)), f"pinecone-{index}.manifest.json")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Incrementally index a FAQ source file.")
+    parser.add_argument("source", help="JSONL or CSV file of FAQ rows")
+    parser.add_argument("--target", choices=("local", "pinecone"), default=settings.vector_store)
+    parser.add_argument("--out", help="local JSONL index path (defaults to LOCAL_INDEX_PATH)")
+    parser.add_argument("--manifest", help="id->hash manifest path (defaults to one per destination)")
+    parser.add_argument("--max-chars", type=int, default=1500)
+    parser.add_argument("--embed-batch", type=int, default=EMBED_BATCH)
+    parser.add_argument("--upsert-batch", type=int, default=UPSERT_BATCH)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    from .embedder import embed_documents
+
+    out = None
+    if args.target == "local":
+        out = args.out or settings.local_index_path
+        if not out:
+            parser.error("--out or LOCAL_INDEX_PATH is required for --target local")
+        sink = JsonlSink(out)
+    else:
+        from .vector_store import PineconeVectorStore
+
+        sink = PineconeVectorStore()
+    manifest_path = args.manifest or default_manifest_path(args.target, args.source, out)
+
+    stats, manifest = ingest(
+        iter_chunks(iter_source(args.source), max_chars=args.max_chars),
+        sink,
+        _load_manifest(manifest_path),
+        embed_fn=embed_documents,
+        embed_batch=args.embed_batch,
+        upsert_batch=args.upsert_batch,
+        concurrency=args.concurrency,
+    )
+    if isinstance(sink, JsonlSink):
+        sink.close()
+    _save_manifest(manifest_path, manifest)
+    print(json.dumps(asdict(stats)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,156 @@
+"""In-memory BM25 index over the FAQ texts.
+
+Exact terms users type ("ACH", "FDIC", "2FA") are matched lexically and the
+result is fused with dense retrieval in `retriever.py`. Each posting stores
+its precomputed BM25 weight, so a query is a handful of NumPy scatter-adds.
+The index also serves as a degraded retrieval mode when dense retrieval is
+unavailable.
+
+The corpus is read from `LEXICAL_INDEX_PATH` (falling back to
+`LOCAL_INDEX_PATH`): JSONL records with `id`, `text` and `category`.
+"""
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import json
+import logging
+import math
+import threading
+
+import numpy as np
+
+from ..core.config import settings
+from .text import normalize
+from .types import Doc
+from .vector_store import filter_categories
+
+
+logger = logging.getLogger("rag.lexical")
+
+STOPWORDS = frozenset(
+    "a an and are can do does for from how i in is it my of on or the to what when "
+    "where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in normalize(text).split() if t not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a small, static document set."""
+
+    def __init__(
+        self,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        categories: Sequence[Optional[str]],
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self._ids = list(ids)
+        self._texts = list(texts)
+        self._categories = list(categories)
+        n = len(self._ids)
+        docs_tokens = [tokenize(t) for t in self._texts]
+        lengths = np.asarray([len(toks) for toks in docs_tokens], dtype=np.float32)
+        avgdl = float(lengths.mean()) if n else 0.0
+
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for i, toks in enumerate(docs_tokens):
+            for term, tf in Counter(toks).items():
+                postings[term].append((i, tf))
+
+        # term -> (doc rows, BM25 weight of the term in each of those docs)
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, plist in postings.items():
+            rows = np.asarray([p[0] for p in plist], dtype=np.intp)
+            tf = np.asarray([p[1] for p in plist], dtype=np.float32)
+            df = len(plist)
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            norm = k1 * (1.0 - b + b * lengths[rows] / (avgdl or 1.0))
+            self._postings[term] = (rows, (idf * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32))
+
+        self._rows_by_category: Dict[str, np.ndarray] = {}
+        for cat in set(c for c in self._categories if c is not None):
+            self._rows_by_category[cat] = np.asarray(
+                [i for i, c in enumerate(self._categories) if c == cat], dtype=np.intp
+            )
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "BM25Index":
+        ids: List[str] = []
+        texts: List[str] = []
+        cats: List[Optional[str]] = []
+        for r in records:
+            ids.append(str(r["id"]))
+            texts.append(r.get("text") or r.get("chunk_text") or "")
+            cats.append(r.get("category"))
+        return cls(ids, texts, cats)
+
+    @classmethod
+    def from_jsonl(cls, path: str) -> "BM25Index":
+        with open(path, "r", encoding="utf-8") as fh:
+            index = cls.from_records(json.loads(line) for line in fh if line.strip())
+        logger.debug("lexical: built path=%s docs=%d terms=%d", path, len(index), len(index._postings))
+        return index
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def search(self, query: str, top_k: int, filt: Optional[dict] = None) -> List[Doc]:
+        scores = np.zeros(len(self._ids), dtype=np.float32)
+        matched = False
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            rows, weights = posting
+            scores[rows] += weights
+            matched = True
+        if not matched or top_k <= 0:
+            return []
+
+        cats = filter_categories(filt)
+        if cats is not None:
+            allowed = np.zeros(len(self._ids), dtype=bool)
+            for c in cats:
+                if c in self._rows_by_category:
+                    allowed[self._rows_by_category[c]] = True
+            scores[~allowed] = 0.0
+
+        hits = np.flatnonzero(scores > 0)
+        if hits.size == 0:
+            return []
+        order = hits[np.argsort(-scores[hits], kind="stable")][:top_k]
+        return [
+            Doc(id=self._ids[i], text=self._texts[i], score=float(scores[i]), category=self._categories[i])
+            for i in order.tolist()
+        ]
+
+
+_index: Optional[BM25Index] = None
+_index_ready = False
+_index_lock = threading.Lock()
+
+
+def get_lexical_index() -> Optional[BM25Index]:
+    """Return the process-wide BM25 index, or None when no corpus is configured."""
+    global _index, _index_ready
+    if _index_ready:
+        return _index
+    with _index_lock:
+        if not _index_ready:
+            path = settings.lexical_index_path or settings.local_index_path
+            _index = BM25Index.from_jsonl(path) if path else None
+            _index_ready = True
+    return _index
+
+
+def set_lexical_index(index: Optional[BM25Index]) -> None:
+    """Override the process-wide BM25 index (None disables lexical retrieval)."""
+    global _index, _index_ready
+    with _index_lock:
+        _index = index
+        _index_ready = True
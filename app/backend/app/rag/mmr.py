@@ -0,0 +1,71 @@
+"""Maximal Marginal Relevance selection over candidate embeddings.
+
+`mmr_select` greedily picks documents maximizing
+
+    lambda * relevance - (1 - lambda) * max_similarity_to_already_selected
+
+with the pairwise similarity matrix computed once up front, so each pick is a
+few vector operations. Per-group quotas (one group per query clause) are
+satisfied first so multi-intent questions still cover every clause.
+"""
+from __future__ import annotations
+
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+def _unit_rows(vectors: Sequence[Optional[Sequence[float]]]) -> np.ndarray:
+    """Stack vectors into unit rows; missing vectors become zero rows."""
+    dim = next((len(v) for v in vectors if v is not None), 0)
+    out = np.zeros((len(vectors), dim), dtype=np.float32)
+    for i, v in enumerate(vectors):
+        if v is not None:
+            out[i] = v
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return out / norms
+
+
+def mmr_select(
+    relevance: Sequence[float],
+    vectors: Sequence[Optional[Sequence[float]]],
+    groups: Sequence[int],
+    k: int,
+    lam: float = 0.7,
+    quota: int = 1,
+) -> List[int]:
+    """Return candidate indices in selection order.
+
+    Candidates without a vector are treated as dissimilar to everything, which
+    degrades to plain relevance ordering for them.
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+    rel = np.asarray(relevance, dtype=np.float32)
+    unit = _unit_rows(vectors)
+    sim = unit @ unit.T
+    grp = np.asarray(groups)
+
+    available = np.ones(n, dtype=bool)
+    max_sim = np.zeros(n, dtype=np.float32)
+    picked: List[int] = []
+
+    def pick(mask: np.ndarray) -> bool:
+        if not mask.any():
+            return False
+        scores = np.where(mask, lam * rel - (1.0 - lam) * max_sim, -np.inf)
+        j = int(np.argmax(scores))
+        picked.append(j)
+        available[j] = False
+        np.maximum(max_sim, sim[j], out=max_sim)
+        return True
+
+    for g in np.unique(grp):
+        for _ in range(quota):
+            if len(picked) >= k or not pick(available & (grp == g)):
+                break
+    while len(picked) < k and pick(available):
+        pass
+    return picked
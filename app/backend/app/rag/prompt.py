@@ -1,13 +1,27 @@
 """Prompt utilities for assembling system/user messages with citations.
 
 `build_messages(history, user_question, docs)` constructs a strict system
-prompt, injects formatted context documents (with `[FAQ n]` markers), appends
-recent history, and the user's latest question.
+prompt, injects formatted context documents (with `[FAQ n]` markers), the
+running summary of older turns if any, recent history, and the user's latest
+question.
+
+`assemble_context(docs, ...)` decides which retrieved docs go into the prompt:
+it cuts the list at the first large score gap, drops near-duplicates,
+truncates over-long texts and stops at a token budget. The first `min_docs`
+docs in the given (MMR selection) order are the per-clause picks: they are
+exempt from all three cuts, so every query clause keeps its doc.
+Rendered blocks and their token counts are cached per doc id and rank.
 """
 from __future__ import annotations
 
-from typing import List
+from collections import OrderedDict
+from typing import List, Optional, Tuple
 import re
+import threading
+
+import numpy as np
+
+from ..utils.tokens import count_tokens, truncate_to_tokens
 from .types import Doc
 
 
@@ -27,22 +41,129 @@ def _extract_faq_num(doc_id: str) -> str:
     return m.group(1) if m else (doc_id or "n/a")
 
 
+def _render_block(d: Doc, rank: int, text: str) -> str:
+    head = f"[FAQ {_extract_faq_num(d.id)}] [{rank}] (category: {d.category or 'n/a'}, id: {d.id})"
+    return f"{head}\n{text}"
+
+
 def format_context(docs: List[Doc]) -> str:
-    lines = []
-    for i, d in enumerate(docs, start=1):
-        faq_num = _extract_faq_num(d.id)
-        head = f"[FAQ {faq_num}] [{i}] (category: {d.category or 'n/a'}, id: {d.id})"
-        lines.append(f"{head}\n{d.text}")
-    return "\n\n".join(lines)
+    return "\n\n".join(_render_block(d, i, d.text) for i, d in enumerate(docs, start=1))
+
+
+BLOCK_CACHE_SIZE = 4096
+_block_cache: "OrderedDict[Tuple[str, int, int], Tuple[str, Optional[str], str, int]]" = OrderedDict()
+_block_lock = threading.Lock()
+
+
+def _cached_block(d: Doc, rank: int, max_tokens: int) -> Tuple[str, int]:
+    """Rendered block and its token count, truncated to `max_tokens` of text."""
+    key = (d.id, rank, max_tokens)
+    with _block_lock:
+        hit = _block_cache.get(key)
+        if hit is not None and hit[0] == d.text and hit[1] == d.category:
+            _block_cache.move_to_end(key)
+            return hit[2], hit[3]
+    block = _render_block(d, rank, truncate_to_tokens(d.text, max_tokens))
+    tokens = count_tokens(block) + 1  # + the blank-line separator
+    with _block_lock:
+        _block_cache[key] = (d.text, d.category, block, tokens)
+        while len(_block_cache) > BLOCK_CACHE_SIZE:
+            _block_cache.popitem(last=False)
+    return block, tokens
+
+
+def _adaptive_keep(docs: List[Doc], min_docs: int, max_gap: float) -> List[Doc]:
+    """Keep docs ranked above the first score drop larger than `max_gap` x top.
+
+    The first `min_docs` docs (in list order) are kept regardless of score.
+    """
+    if len(docs) <= min_docs:
+        return list(docs)
+    order = sorted(range(len(docs)), key=lambda i: docs[i].score, reverse=True)
+    top = docs[order[0]].score
+    k = len(docs)
+    for j in range(1, len(order)):
+        if docs[order[j - 1]].score - docs[order[j]].score > max_gap * abs(top):
+            k = j
+            break
+    keep = set(order[:k]) | set(range(min_docs))
+    return [d for i, d in enumerate(docs) if i in keep]
+
+
+def _is_near_duplicate(d: Doc, kept: List[Doc], threshold: float) -> bool:
+    if d.vector is not None:
+        v = np.asarray(d.vector, dtype=np.float32)
+        vn = float(np.linalg.norm(v)) or 1.0
+        for k in kept:
+            if k.vector is None:
+                continue
+            u = np.asarray(k.vector, dtype=np.float32)
+            if float(v @ u) / (vn * (float(np.linalg.norm(u)) or 1.0)) >= threshold:
+                return True
+    text = " ".join(d.text.lower().split())
+    return any(" ".join(k.text.lower().split()) == text for k in kept)
+
+
+def assemble_context(
+    docs: List[Doc],
+    *,
+    budget_tokens: int,
+    max_doc_tokens: int,
+    min_docs: int = 1,
+    max_gap: float = 0.35,
+    dup_threshold: float = 0.97,
+    min_block_tokens: int = 48,
+) -> Tuple[List[Doc], str, int]:
+    """Select, truncate and render context docs within a token budget.
+
+    `docs` is in selection order with one doc per query clause first; those
+    `min_docs` are always included (truncated to at least `min_block_tokens`
+    of text if the budget runs out). Returns the docs actually included (cite
+    these, in order), the rendered context and its token count.
+    """
+    pinned = {d.id for d in docs[:min_docs]}
+    kept: List[Doc] = []
+    for d in _adaptive_keep(docs, min_docs, max_gap):
+        if d.id in pinned or not _is_near_duplicate(d, kept, dup_threshold):
+            kept.append(d)
+
+    included: List[Doc] = []
+    blocks: List[str] = []
+    used = 0
+    for d in kept:
+        rank = len(included) + 1
+        block, tokens = _cached_block(d, rank, max_doc_tokens)
+        remaining = budget_tokens - used
+        if tokens > remaining:
+            is_pinned = d.id in pinned
+            if remaining < min_block_tokens and not is_pinned:
+                break
+            # Truncate its text to the remaining budget (clause docs keep a floor)
+            overhead = count_tokens(_render_block(d, rank, "")) + 1
+            floor = min_block_tokens if is_pinned else 1
+            block, tokens = _cached_block(d, rank, max(floor, remaining - overhead))
+        included.append(d)
+        blocks.append(block)
+        used += tokens
+    return included, "\n\n".join(blocks), used
 
 
-def build_messages(history: list[dict], user_question: str, docs: List[Doc]) -> list[dict]:
+def build_messages(
+    history: list[dict],
+    user_question: str,
+    docs: List[Doc],
+    context: Optional[str] = None,
+    summary: Optional[str] = None,
+) -> list[dict]:
     messages: list[dict] = [{"role": "system", "content": SYSTEM_PROMPT}]
-    ctx = format_context(docs)
+    ctx = format_context(docs) if context is None else context
     messages.append({
         "role": "user",
         "content": f"Context documents:\n{ctx}",
     })
+    if summary:
+        # Stands in for the turns older than `history`
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
     for m in history:
         if m.get("role") in ("user", "assistant"):
             messages.append(m)
@@ -0,0 +1,120 @@
+"""Optional reranking stage between candidate gathering and selection.
+
+`RERANK_MODEL` selects the scorer:
+- unset: reranking disabled
+- `local`: `LexicalOverlapReranker`, a CPU stand-in (tests, offline dev)
+- anything else: a Pinecone Inference rerank model, e.g. `bge-reranker-v2-m3`,
+  authenticated with `RERANK_API_KEY` (falls back to `PINECONE_API_KEY`)
+
+All (query, document) pairs are scored in one call. `rerank_scores` enforces
+a hard deadline (`RERANK_TIMEOUT_MS`); on timeout or error it returns None and
+the caller keeps the dense ordering.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import List, Optional, Protocol, Sequence
+import logging
+import threading
+
+from ..core.config import settings
+from ..utils import metrics
+from .lexical import tokenize
+
+
+logger = logging.getLogger("rag.reranker")
+
+
+class Reranker(Protocol):
+    def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        ...
+
+
+class LexicalOverlapReranker:
+    """Scores each text by the share of query terms it contains."""
+
+    def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        q = set(tokenize(query))
+        if not q:
+            return [0.0 for _ in texts]
+        return [len(q & set(tokenize(t))) / len(q) for t in texts]
+
+
+class PineconeReranker:
+    """Cross-encoder reranking through Pinecone Inference."""
+
+    def __init__(self, model: str, api_key: str):
+        from pinecone import Pinecone
+
+        self._model = model
+        self._pc = Pinecone(api_key=api_key)
+
+    def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        res = self._pc.inference.rerank(
+            model=self._model,
+            query=query,
+            documents=list(texts),
+            top_n=len(texts),
+            return_documents=False,
+        )
+        scores = [0.0] * len(texts)
+        for row in res.data:
+            scores[row.index] = float(row.score)
+        return scores
+
+
+_reranker: Optional[Reranker] = None
+_reranker_ready = False
+_lock = threading.Lock()
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rerank")
+
+
+def get_reranker() -> Optional[Reranker]:
+    """Return the configured reranker, or None when reranking is disabled."""
+    global _reranker, _reranker_ready
+    if _reranker_ready:
+        return _reranker
+    with _lock:
+        if not _reranker_ready:
+            model = settings.rerank_model
+            if not model:
+                _reranker = None
+            elif model == "local":
+                _reranker = LexicalOverlapReranker()
+            else:
+                api_key = settings.rerank_api_key or settings.pinecone_api_key
+                if not api_key:
+                    raise RuntimeError("RERANK_API_KEY missing")
+                _reranker = PineconeReranker(model, api_key)
+            _reranker_ready = True
+    return _reranker
+
+
+def set_reranker(reranker: Optional[Reranker]) -> None:
+    """Override the process-wide reranker (None disables reranking)."""
+    global _reranker, _reranker_ready
+    with _lock:
+        _reranker = reranker
+        _reranker_ready = True
+
+
+def rerank_scores(
+    reranker: Reranker, query: str, texts: Sequence[str], timeout_s: float
+) -> Optional[List[float]]:
+    """Score all texts in one call, or return None past the deadline or on error."""
+    if not texts:
+        return []
+    future = _pool.submit(reranker.score, query, list(texts))
+    try:
+        scores = future.result(timeout=timeout_s)
+    except FutureTimeout:
+        future.cancel()
+        metrics.incr("reranker.timeout")
+        logger.debug("reranker: deadline %.0fms exceeded; keeping dense order", timeout_s * 1000)
+        return None
+    except Exception:
+        metrics.incr("reranker.error")
+        logger.exception("reranker: scoring failed; keeping dense order")
+        return None
+    metrics.incr("reranker.ok")
+    return scores
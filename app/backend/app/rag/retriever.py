@@ -1,26 +1,50 @@
-"""Retriever: category-aware dense retrieval over Pinecone.
+"""Retriever: category-aware hybrid retrieval over a pluggable vector store.
 
 Heuristics:
 - Decompose multi-intent queries into clauses.
-- Guess categories via synonyms and apply a soft filter (retry unfiltered if empty).
-- Diversify results by clause, then fill by global score.
+- Guess categories via synonyms and apply a soft filter (retry unfiltered if
+  empty, or speculatively query both and keep the confident one).
+- Fuse dense and BM25 results per clause with reciprocal-rank fusion.
+- Optionally rerank the top candidates (bounded by a latency budget).
+- Select with Maximal Marginal Relevance: one slot per clause, then fill.
+
+`RETRIEVAL_MODE` selects `hybrid` (default; dense only when no lexical corpus
+is configured), `dense` or `lexical`. Hybrid degrades to lexical-only when the
+dense path fails.
+
+`aretrieve` is the event-loop entry point: it runs one retrieval on a bounded
+pool (`RETRIEVAL_WORKERS`), so a thread is held only for the short, batched
+embed/query round trips and never for the life of a stream.
 """
 from __future__ import annotations
 
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import replace
 from typing import List, Optional, Set, Dict, Tuple
+import asyncio
+import functools
 import logging
 import re
-from pinecone.grpc import PineconeGRPC as Pinecone
+import threading
+import time
 from ..core.config import settings
-from .types import Doc
-from .embedder import embed_query
+from ..utils import metrics
+from .text import normalize as _normalize
+from .types import Doc, Retrieval
+from .embedder import embed_queries
+from .lexical import BM25Index, get_lexical_index
+from .mmr import mmr_select
+from .reranker import get_reranker, rerank_scores
+from .vector_store import get_vector_store
 
 
-_pc = Pinecone(api_key=settings.pinecone_api_key)
-_index = _pc.Index(host=str(settings.pinecone_host))
 logger = logging.getLogger("rag.retriever")
 
 DEFAULT_TOP_K = 10
+CANDIDATES_PER_CLAUSE = 5
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
 
 # Expanded synonyms per category for robust matching (login/log in/sign in, fees, etc.)
 CATEGORY_SYNONYMS: Dict[str, List[str]] = {
@@ -48,13 +72,6 @@ CATEGORY_SYNONYMS: Dict[str, List[str]] = {
 }
 
 
-def _normalize(s: str) -> str:
-    s = s.lower()
-    s = re.sub(r"[^\w\s']", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
-
 def _decompose_query(q: str) -> List[str]:
     """Split multi-intent queries into short clauses.
 
@@ -84,107 +101,251 @@ def _guess_categories_synonyms(q: str) -> Set[str]:
     return cats
 
 
- 
+def _clause_filter(idx: int, clause: str) -> Optional[dict]:
+    cats = _guess_categories_synonyms(clause)
+    filt: Optional[dict] = None
+    if len(cats) == 1:
+        only = next(iter(cats))
+        filt = {"category": {"$eq": only}}
+    logger.debug("retriever.clause: i=%d text=%s cats=%s filt=%s", idx, clause[:120], list(cats), filt)
+    return filt
+
+
+def _vector_query_many(
+    vectors: List[List[float]], top_k: int, filts: List[Optional[dict]]
+) -> List[List[Doc]]:
+    results = get_vector_store().query_many(vectors, top_k=top_k, filts=filts)
+    for filt, docs in zip(filts, results):
+        logger.debug(
+            "retriever.query: filt=%s returned=%d top_id_scores=%s",
+            filt,
+            len(docs),
+            [(d.id, round(d.score, 4)) for d in docs[:3]],
+        )
+    return results
+
+
+def _lap(timings: Dict[str, float], stage: str, since: float) -> float:
+    now = time.perf_counter()
+    timings[stage] = timings.get(stage, 0.0) + (now - since) * 1000.0
+    return now
+
+
+def _dense_query(embs: List[List[float]], filts: List[Optional[dict]]) -> List[List[Doc]]:
+    if settings.speculative_filter and any(f is not None for f in filts):
+        return _dense_query_speculative(embs, filts)
+    results = _vector_query_many(embs, top_k=DEFAULT_TOP_K, filts=filts)
+    # fallback to unfiltered if filter was too strict
+    retry = [i for i, docs in enumerate(results) if not docs and filts[i] is not None]
+    if retry:
+        retried = _vector_query_many([embs[i] for i in retry], top_k=DEFAULT_TOP_K, filts=[None] * len(retry))
+        for i, docs in zip(retry, retried):
+            results[i] = docs
+    return results
 
 
+def _dense_query_speculative(embs: List[List[float]], filts: List[Optional[dict]]) -> List[List[Doc]]:
+    """Issue each filtered clause's unfiltered fallback in the same batch.
 
-def _pinecone_query(vector: List[float], top_k: int, filt: Optional[dict]) -> List[Doc]:
-    res = _index.query(
-        vector=vector,
-        top_k=top_k,
-        include_metadata=True,
-        filter=filt,
-        namespace="",
+    The filtered results win when non-empty and their best score clears
+    `FILTER_SCORE_FLOOR`; otherwise the unfiltered ones are used. This trades
+    extra queries for removing the serial retry from the tail.
+    """
+    spec = [i for i, f in enumerate(filts) if f is not None]
+    results = _vector_query_many(
+        embs + [embs[i] for i in spec],
+        top_k=DEFAULT_TOP_K,
+        filts=filts + [None] * len(spec),
     )
-    docs: List[Doc] = []
-    for match in getattr(res, "matches", []) or []:
-        md = getattr(match, "metadata", {}) or {}
-        text = md.get("text") or md.get("chunk_text") or ""
-        docs.append(Doc(
-            id=str(match.id),
-            text=text,
-            score=float(match.score or 0.0),
-            category=md.get("category"),
-        ))
+    out = results[: len(embs)]
+    for i, unfiltered in zip(spec, results[len(embs):]):
+        filtered = out[i]
+        if filtered and filtered[0].score >= settings.filter_score_floor:
+            metrics.incr("retriever.speculative.filtered")
+        else:
+            metrics.incr("retriever.speculative.fallback")
+            logger.debug(
+                "retriever.speculative: clause=%d fallback (filtered=%d top=%s)",
+                i,
+                len(filtered),
+                round(filtered[0].score, 4) if filtered else None,
+            )
+            out[i] = unfiltered
+    return out
+
+
+def _lexical_query(index: BM25Index, clauses: List[str], filts: List[Optional[dict]]) -> List[List[Doc]]:
+    results: List[List[Doc]] = []
+    for clause, filt in zip(clauses, filts):
+        docs = index.search(clause, top_k=DEFAULT_TOP_K, filt=filt)
+        if not docs and filt is not None:
+            docs = index.search(clause, top_k=DEFAULT_TOP_K, filt=None)
+        results.append(docs)
+    return results
+
+
+def _rrf_fuse(ranked_lists: List[List[Doc]], k: int) -> List[Doc]:
+    """Reciprocal-rank fusion; scores are rescaled so rank 1 in every list is 1.0."""
+    fused: Dict[str, float] = {}
+    first_seen: Dict[str, Doc] = {}
+    for ranked in ranked_lists:
+        for rank, d in enumerate(ranked, start=1):
+            fused[d.id] = fused.get(d.id, 0.0) + 1.0 / (k + rank)
+            first_seen.setdefault(d.id, d)
+    best = len(ranked_lists) / (k + 1.0)
+    out = [replace(first_seen[doc_id], score=score / best) for doc_id, score in fused.items()]
+    out.sort(key=lambda d: d.score, reverse=True)
+    return out
+
+
+def _rerank(query_text: str, results: List[List[Doc]]) -> List[List[Doc]]:
+    """Rescore the top-N candidates with the reranker, within the latency budget.
+
+    Candidates outside the top-N are dropped; on deadline or error the dense
+    ordering is kept unchanged.
+    """
+    reranker = get_reranker()
+    if reranker is None:
+        return results
+    best: Dict[str, Doc] = {}
+    for docs in results:
+        for d in docs[:CANDIDATES_PER_CLAUSE]:
+            if d.id not in best or d.score > best[d.id].score:
+                best[d.id] = d
+    pool = sorted(best.values(), key=lambda d: d.score, reverse=True)[: settings.rerank_top_n]
+    scores = rerank_scores(reranker, query_text, [d.text for d in pool], settings.rerank_timeout_ms / 1000.0)
+    if scores is None:
+        return results
+    new_scores = {d.id: s for d, s in zip(pool, scores)}
     logger.debug(
-        "retriever.query: filt=%s returned=%d top_id_scores=%s",
-        filt,
-        len(docs),
-        [(d.id, round(d.score, 4)) for d in docs[:3]],
+        "retriever.rerank: candidates=%d top=%s",
+        len(pool),
+        sorted(new_scores.items(), key=lambda x: -x[1])[:3],
     )
-    return docs
+    return [
+        sorted(
+            (replace(d, score=new_scores[d.id]) for d in docs if d.id in new_scores),
+            key=lambda d: d.score,
+            reverse=True,
+        )
+        for docs in results
+    ]
 
 
-def retrieve_optimal(query_text: str, final_k: int = 4) -> List[Doc]:
-    """Multi-intent retrieval with soft category filtering and diversification.
+def _select_diverse(results: List[List[Doc]], final_k: int) -> List[Doc]:
+    """Union per-clause candidates and pick `final_k` with clause-aware MMR.
 
-    Steps per clause:
-      - Guess categories using expanded synonyms.
-      - If exactly one category: run filtered dense query; otherwise unfiltered.
-      - If filtered results are empty, retry unfiltered.
-    Union results across clauses, prefer one per clause first, then fill by score.
+    Each clause first gets one slot (its best marginal candidate), then the
+    remaining slots go to the best marginal candidates overall.
     """
-    clauses = _decompose_query(query_text)
-    bucketed: List[Tuple[int, Doc]] = []
+    # Deduplicate while keeping highest score (and its clause) per id
+    by_id: Dict[str, Tuple[int, Doc]] = {}
+    for idx, docs in enumerate(results):
+        # keep a small set per clause to allow diversification downstream
+        for d in docs[:CANDIDATES_PER_CLAUSE]:
+            existing = by_id.get(d.id)
+            if not existing or d.score > existing[1].score:
+                by_id[d.id] = (idx, d)
+    if not by_id:
+        return []
 
-    for idx, clause in enumerate(clauses):
-        emb = embed_query(clause)
-        cats_syn = _guess_categories_synonyms(clause)
-        cats = set(cats_syn)
+    pool = list(by_id.values())
+    order = mmr_select(
+        relevance=[d.score for _, d in pool],
+        vectors=[d.vector for _, d in pool],
+        groups=[idx for idx, _ in pool],
+        k=final_k,
+        lam=settings.mmr_lambda,
+    )
+    return [pool[i][1] for i in order]
 
-        filt: Optional[dict] = None
-        if len(cats) == 1:
-            only = next(iter(cats))
-            filt = {"category": {"$eq": only}}
-        logger.debug("retriever.clause: i=%d text=%s cats=%s filt=%s", idx, clause[:120], list(cats), filt)
 
-        docs = _pinecone_query(emb, top_k=DEFAULT_TOP_K, filt=filt)
-        if not docs:
-            # fallback to unfiltered if filter was too strict
-            docs = _pinecone_query(emb, top_k=DEFAULT_TOP_K, filt=None)
+def retrieve(query_text: str, final_k: int = 4) -> Retrieval:
+    """Multi-intent retrieval with soft category filtering and diversification.
 
-        # keep a small set per clause to allow diversification downstream
-        for d in docs[: min(5, len(docs))]:
-            bucketed.append((idx, d))
+    Steps:
+      - Embed every clause in one batched inference call.
+      - Guess categories per clause using expanded synonyms; exactly one
+        category means a filtered query, otherwise unfiltered.
+      - Issue all clause queries together; retry unfiltered (again batched)
+        for clauses whose filtered query came back empty, or with
+        `SPECULATIVE_FILTER` issue the unfiltered queries in the same batch.
+      - Score each clause against the BM25 index and fuse with the dense
+        ranking (RRF), or use BM25 alone if the dense path is unavailable.
+      - Optionally rerank the top candidates within a hard deadline.
+    Union results across clauses and select with MMR, one per clause first.
+    The clause embeddings are returned alongside the docs for reuse by callers.
+    """
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    clauses = _decompose_query(query_text)
+    filts = [_clause_filter(idx, clause) for idx, clause in enumerate(clauses)]
+    mode = (settings.retrieval_mode or "hybrid").lower()
+    lexical = get_lexical_index() if mode in ("hybrid", "lexical") else None
+    if mode == "lexical" and lexical is None:
+        raise RuntimeError("RETRIEVAL_MODE=lexical requires a lexical corpus")
+    t1 = time.perf_counter()
+    timings["decompose"] = (t1 - t0) * 1000.0
 
-    if not bucketed:
-        return []
+    embs: List[List[float]] = []
+    dense: Optional[List[List[Doc]]] = None
+    if mode != "lexical":
+        try:
+            embs = embed_queries(clauses)
+            t1 = _lap(timings, "embed", t1)
+            dense = _dense_query(embs, filts)
+        except Exception:
+            if lexical is None:
+                raise
+            metrics.incr("retriever.dense_failed")
+            logger.exception("retriever: dense retrieval failed; degrading to lexical only")
+            embs = []
 
-    # Deduplicate while keeping highest score per id
-    by_id: Dict[str, Tuple[int, Doc]] = {}
-    for idx, d in bucketed:
-        existing = by_id.get(d.id)
-        if not existing or d.score > existing[1].score:
-            by_id[d.id] = (idx, d)
-
-    # Fair-share: one best per clause
-    selected: List[Doc] = []
-    seen_ids: Set[str] = set()
-    for i in range(len(clauses)):
-        best_for_clause: Optional[Doc] = None
-        for idx, d in sorted(by_id.values(), key=lambda x: x[1].score, reverse=True):
-            if idx == i and d.id not in seen_ids:
-                best_for_clause = d
-                break
-        if best_for_clause is not None:
-            selected.append(best_for_clause)
-            seen_ids.add(best_for_clause.id)
-
-    # Fill remaining slots by global score
-    if len(selected) < final_k:
-        pool = [d for _, d in sorted(by_id.values(), key=lambda x: x[1].score, reverse=True)]
-        for d in pool:
-            if d.id in seen_ids:
-                continue
-            selected.append(d)
-            seen_ids.add(d.id)
-            if len(selected) >= final_k:
-                break
+    if lexical is None:
+        results = dense or []
+    else:
+        sparse = _lexical_query(lexical, clauses, filts)
+        if dense is None:
+            results = sparse
+        else:
+            results = [_rrf_fuse([d, l], settings.rrf_k) for d, l in zip(dense, sparse)]
+    t1 = _lap(timings, "query", t1)
 
+    results = _rerank(query_text, results)
+    t1 = _lap(timings, "rerank", t1)
+    selected = _select_diverse(results, final_k)
+    _lap(timings, "select", t1)
     logger.debug(
-        "retriever.selected: query_preview=%s selected=%s",
+        "retriever.selected: query_preview=%s selected=%s timings_ms=%s",
         query_text[:120],
         [(d.id, round(d.score, 4), d.category) for d in selected],
+        {k: round(v, 3) for k, v in timings.items()},
     )
-    return selected[:final_k]
+    return Retrieval(docs=selected, clauses=clauses, clause_vectors=embs, timings=timings)
+
+
+def retrieve_optimal(query_text: str, final_k: int = 4) -> List[Doc]:
+    """Return only the selected docs from `retrieve`."""
+    return retrieve(query_text, final_k=final_k).docs
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=max(1, settings.retrieval_workers), thread_name_prefix="retrieve"
+                )
+    return _pool
+
+
+def submit_retrieve(query_text: str, final_k: int = 4) -> "Future[Retrieval]":
+    """Run `retrieve` on the retrieval pool; the future is usable from any loop."""
+    return _get_pool().submit(retrieve, query_text, final_k)
+
 
+async def aretrieve(query_text: str, final_k: int = 4) -> Retrieval:
+    """Await `retrieve` without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), functools.partial(retrieve, query_text, final_k))
@@ -0,0 +1,242 @@
+"""Memory-mapped, quantized corpus snapshots for fast multi-worker startup.
+
+File layout (little-endian), `<path>`:
+
+    header   64 bytes: magic b"ERAGSNP1", version u16, dtype u8 (1=float16,
+             2=int8), flags u8 (bit 0: float32 block present), n u32, dim u32,
+             then u64 offsets of the vector, scale and float32 blocks
+    vectors  n x dim float16, or n x dim int8 (rows L2-normalized first)
+    scales   n float32 per-row dequantization scales (int8 only)
+    float32  optional n x dim full-precision rows for re-scoring
+
+Sidecar `<path>.meta.json`: `{"ids", "categories", "texts", "fingerprint"}`.
+
+Workers open the file with `mmap`, so every uvicorn worker shares the same
+page-cache pages and startup costs a header read. Search scores the
+quantized block directly, dequantizing a bounded slab of rows at a time.
+With `SNAPSHOT_RESCORE` the top `k * RESCORE_FACTOR` candidates are then
+re-scored against the float32 block.
+
+Build one from a local-store JSONL:
+
+    python -m app.rag.snapshot faq_index.jsonl faq.snap --dtype int8
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from .types import Doc
+from .vector_store import filter_categories
+
+
+logger = logging.getLogger("rag.snapshot")
+
+MAGIC = b"ERAGSNP1"
+VERSION = 1
+HEADER = struct.Struct("<8sHBBIIQQQ")
+HEADER_SIZE = 64
+DTYPE_CODES = {"float16": 1, "int8": 2}
+FLAG_FULL = 1
+RESCORE_FACTOR = 4
+SLAB_ROWS = 8192
+
+
+def _align(offset: int, to: int = 64) -> int:
+    return (offset + to - 1) // to * to
+
+
+def write_snapshot(
+    path: str,
+    ids: Sequence[str],
+    texts: Sequence[str],
+    categories: Sequence[Optional[str]],
+    vectors: np.ndarray,
+    dtype: str = "int8",
+    include_full: bool = True,
+) -> None:
+    """Quantize `vectors` and write the snapshot plus its metadata sidecar."""
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"unsupported snapshot dtype: {dtype}")
+    full = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = full.shape
+    norms = np.linalg.norm(full, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    full = full / norms
+
+    scales: Optional[np.ndarray] = None
+    if dtype == "float16":
+        block = full.astype(np.float16)
+    else:
+        scales = (np.abs(full).max(axis=1) / 127.0).astype(np.float32)
+        scales[scales == 0] = 1.0
+        block = np.clip(np.rint(full / scales[:, None]), -127, 127).astype(np.int8)
+
+    vec_off = HEADER_SIZE
+    scale_off = _align(vec_off + block.nbytes) if scales is not None else 0
+    full_off = _align((scale_off + scales.nbytes) if scales is not None else vec_off + block.nbytes) if include_full else 0
+    header = HEADER.pack(
+        MAGIC, VERSION, DTYPE_CODES[dtype], FLAG_FULL if include_full else 0,
+        n, dim, vec_off, scale_off, full_off,
+    )
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(header.ljust(HEADER_SIZE, b"\0"))
+        fh.write(block.tobytes())
+        if scales is not None:
+            fh.seek(scale_off)
+            fh.write(scales.tobytes())
+        if include_full:
+            fh.seek(full_off)
+            fh.write(full.tobytes())
+    os.replace(tmp, path)
+
+    h = hashlib.sha1()
+    for i, t, c in zip(ids, texts, categories):
+        h.update(f"{i}\x1f{c or ''}\x1f{t}\x1e".encode("utf-8"))
+    meta = {"ids": list(ids), "categories": list(categories), "texts": list(texts), "fingerprint": h.hexdigest()}
+    with open(f"{path}.meta.json.tmp", "w", encoding="utf-8") as fh:
+        json.dump(meta, fh, ensure_ascii=False)
+    os.replace(f"{path}.meta.json.tmp", f"{path}.meta.json")
+
+
+class SnapshotVectorStore:
+    """Read-only vector store over a memory-mapped snapshot."""
+
+    def __init__(self, path: str, rescore: bool = True):
+        self._fh = open(path, "rb")
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, dtype_code, flags, n, dim, vec_off, scale_off, full_off = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a v{VERSION} retriever snapshot")
+        self._n, self._dim = n, dim
+        if dtype_code == DTYPE_CODES["float16"]:
+            self._block = np.frombuffer(self._mm, dtype=np.float16, count=n * dim, offset=vec_off).reshape(n, dim)
+            self._scales = None
+        else:
+            self._block = np.frombuffer(self._mm, dtype=np.int8, count=n * dim, offset=vec_off).reshape(n, dim)
+            self._scales = np.frombuffer(self._mm, dtype=np.float32, count=n, offset=scale_off)
+        self._full = (
+            np.frombuffer(self._mm, dtype=np.float32, count=n * dim, offset=full_off).reshape(n, dim)
+            if flags & FLAG_FULL else None
+        )
+        self._rescore = rescore and self._full is not None
+
+        with open(f"{path}.meta.json", "r", encoding="utf-8") as fh:
+            meta = json.load(fh)
+        self._ids: List[str] = meta["ids"]
+        self._texts: List[str] = meta["texts"]
+        self._categories: List[Optional[str]] = meta["categories"]
+        self.fingerprint: str = meta.get("fingerprint", "")
+        self._rows_by_category: Dict[str, np.ndarray] = {}
+        for cat in set(c for c in self._categories if c is not None):
+            self._rows_by_category[cat] = np.asarray(
+                [i for i, c in enumerate(self._categories) if c == cat], dtype=np.intp
+            )
+        logger.debug("snapshot: opened path=%s docs=%d dim=%d dtype=%d rescore=%s", path, n, dim, dtype_code, self._rescore)
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    def _row(self, i: int) -> np.ndarray:
+        if self._full is not None:
+            return self._full[i]
+        row = self._block[i].astype(np.float32)
+        return row * self._scales[i] if self._scales is not None else row
+
+    def _approx_scores(self, q: np.ndarray) -> np.ndarray:
+        """Score (n, n_queries) against the quantized block, one slab at a time."""
+        out = np.empty((self._n, q.shape[0]), dtype=np.float32)
+        for start in range(0, self._n, SLAB_ROWS):
+            stop = min(start + SLAB_ROWS, self._n)
+            out[start:stop] = self._block[start:stop].astype(np.float32) @ q.T
+        if self._scales is not None:
+            out *= self._scales[:, None]
+        return out
+
+    def _top_k(self, scores: np.ndarray, q: np.ndarray, filt: Optional[dict], top_k: int) -> List[Doc]:
+        cats = filter_categories(filt)
+        if cats is None:
+            rows = np.arange(self._n)
+        else:
+            parts = [self._rows_by_category[c] for c in cats if c in self._rows_by_category]
+            rows = np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.intp)
+        if rows.size == 0 or top_k <= 0:
+            return []
+        sub = scores[rows]
+        k = min(top_k * RESCORE_FACTOR if self._rescore else top_k, rows.size)
+        cand = rows[np.argpartition(-sub, k - 1)[:k]]
+        cand_scores = self._full[cand] @ q if self._rescore else scores[cand]
+        order = np.argsort(-cand_scores, kind="stable")[:top_k]
+        return [
+            Doc(
+                id=self._ids[i],
+                text=self._texts[i],
+                score=float(s),
+                category=self._categories[i],
+                vector=self._row(i),
+            )
+            for i, s in zip(cand[order].tolist(), cand_scores[order].tolist())
+        ]
+
+    def query(self, vector: Sequence[float], top_k: int, filt: Optional[dict]) -> List[Doc]:
+        return self.query_many([vector], top_k, [filt])[0]
+
+    def query_many(
+        self,
+        vectors: Sequence[Sequence[float]],
+        top_k: int,
+        filts: Sequence[Optional[dict]],
+    ) -> List[List[Doc]]:
+        if not len(vectors):
+            return []
+        q = np.asarray(vectors, dtype=np.float32)
+        if q.ndim != 2 or q.shape[1] != self._dim:
+            raise ValueError(f"query dim mismatch: expected {self._dim}, got {q.shape[-1]}")
+        norms = np.linalg.norm(q, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        q = q / norms
+        scores = self._approx_scores(q)
+        return [self._top_k(scores[:, j], q[j], f, top_k) for j, f in enumerate(filts)]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build a retriever snapshot from a local-store JSONL.")
+    parser.add_argument("source", help="JSONL of {id, text, category, values}")
+    parser.add_argument("out", help="snapshot path; the sidecar is written to <out>.meta.json")
+    parser.add_argument("--dtype", choices=tuple(DTYPE_CODES), default="int8")
+    parser.add_argument("--no-full", action="store_true", help="omit the float32 re-scoring block")
+    args = parser.parse_args(argv)
+
+    ids: List[str] = []
+    texts: List[str] = []
+    cats: List[Optional[str]] = []
+    vecs: List[List[float]] = []
+    with open(args.source, "r", encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                r = json.loads(line)
+                ids.append(str(r["id"]))
+                texts.append(r.get("text") or r.get("chunk_text") or "")
+                cats.append(r.get("category"))
+                vecs.append(r["values"])
+    write_snapshot(args.out, ids, texts, cats, np.asarray(vecs, dtype=np.float32), args.dtype, not args.no_full)
+    print(json.dumps({"docs": len(ids), "dtype": args.dtype, "bytes": os.path.getsize(args.out)}))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,12 @@
+"""Text normalization shared by the retriever and its caches."""
+from __future__ import annotations
+
+import re
+
+
+def normalize(s: str) -> str:
+    """Lowercase, strip punctuation (keeping apostrophes) and collapse whitespace."""
+    s = s.lower()
+    s = re.sub(r"[^\w\s']", " ", s)
+    s = re.sub(r"\s+", " ", s).strip()
+    return s
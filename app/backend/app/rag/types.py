@@ -1,5 +1,8 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Sequence
+
+import numpy as np
 
 
 @dataclass
@@ -8,8 +11,29 @@ class Doc:
     text: str
     score: float
     category: str | None = None
+    # Embedding carried from the vector store for diversity-aware selection
+    vector: Sequence[float] | None = field(default=None, repr=False, compare=False)
 
     def to_citation(self, rank: int) -> dict:
         return {"id": self.id, "rank": rank, "category": self.category}
 
 
+@dataclass
+class Retrieval:
+    docs: list[Doc]
+    clauses: list[str] = field(default_factory=list)
+    clause_vectors: list[list[float]] = field(default_factory=list, repr=False)
+    # Per-stage wall time in milliseconds (decompose/embed/query/rerank/select)
+    timings: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def doc_ids(self) -> frozenset[str]:
+        return frozenset(d.id for d in self.docs)
+
+    def query_vector(self) -> np.ndarray | None:
+        """Unit-length mean of the clause embeddings (None if none were computed)."""
+        if not self.clause_vectors:
+            return None
+        vec = np.asarray(self.clause_vectors, dtype=np.float32).mean(axis=0)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm > 0 else None
@@ -0,0 +1,325 @@
+"""Vector-store backends behind the retriever.
+
+`VectorStore` is the small query interface `retriever.py` talks to. Two
+backends ship:
+- `PineconeVectorStore`: the hosted Pinecone index. The client is created
+  lazily on first use; `query_many` fans clause queries out on a bounded
+  thread pool so a batch costs roughly one round trip.
+- `LocalVectorStore`: in-process exact search over a contiguous float32
+  matrix. Category filters (`{"category": {"$eq": ...}}` / `$in`) become
+  precomputed row masks, so a FAQ-sized corpus answers in well under a
+  millisecond.
+
+`get_vector_store()` returns the process-wide backend selected by
+`VECTOR_STORE` (`pinecone` | `local`). The local backend loads
+`LOCAL_INDEX_PATH`, a JSONL file of `{id, text, category, values}` records.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Protocol, Sequence
+import hashlib
+import json
+import logging
+import threading
+
+import numpy as np
+
+from ..core.config import settings
+from .types import Doc
+
+
+logger = logging.getLogger("rag.vector_store")
+
+
+class VectorStore(Protocol):
+    def query(self, vector: Sequence[float], top_k: int, filt: Optional[dict]) -> List[Doc]:
+        ...
+
+    def query_many(
+        self,
+        vectors: Sequence[Sequence[float]],
+        top_k: int,
+        filts: Sequence[Optional[dict]],
+    ) -> List[List[Doc]]:
+        ...
+
+
+def filter_categories(filt: Optional[dict]) -> Optional[List[str]]:
+    """Translate a Pinecone-style category filter into a list of categories.
+
+    Returns None when the filter does not constrain categories.
+    """
+    if not filt:
+        return None
+    cond = filt.get("category")
+    if cond is None:
+        return None
+    if isinstance(cond, str):
+        return [cond]
+    if "$eq" in cond:
+        return [cond["$eq"]]
+    if "$in" in cond:
+        return list(cond["$in"])
+    raise ValueError(f"Unsupported category filter: {filt}")
+
+
+class PineconeVectorStore:
+    """Queries the hosted Pinecone index over gRPC."""
+
+    def __init__(
+        self,
+        host: str | None = None,
+        api_key: str | None = None,
+        namespace: str = "",
+        include_values: bool = True,
+    ):
+        self._host = host or settings.pinecone_host
+        self._api_key = api_key or settings.pinecone_api_key
+        self._namespace = namespace
+        self._include_values = include_values
+        self._index = None
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, settings.vector_query_concurrency),
+            thread_name_prefix="pinecone-query",
+        )
+
+    def _get_index(self):
+        if self._index is not None:
+            return self._index
+        with self._lock:
+            if self._index is None:
+                if not self._api_key:
+                    raise RuntimeError("PINECONE_API_KEY missing")
+                from pinecone.grpc import PineconeGRPC as Pinecone
+
+                pc = Pinecone(api_key=self._api_key)
+                self._index = pc.Index(host=str(self._host))
+        return self._index
+
+    def query(self, vector: Sequence[float], top_k: int, filt: Optional[dict]) -> List[Doc]:
+        res = self._get_index().query(
+            vector=list(vector),
+            top_k=top_k,
+            include_metadata=True,
+            include_values=self._include_values,
+            filter=filt,
+            namespace=self._namespace,
+        )
+        docs: List[Doc] = []
+        for match in getattr(res, "matches", []) or []:
+            md = getattr(match, "metadata", {}) or {}
+            text = md.get("text") or md.get("chunk_text") or ""
+            docs.append(Doc(
+                id=str(match.id),
+                text=text,
+                score=float(match.score or 0.0),
+                category=md.get("category"),
+                vector=list(match.values) if getattr(match, "values", None) else None,
+            ))
+        return docs
+
+    def query_many(
+        self,
+        vectors: Sequence[Sequence[float]],
+        top_k: int,
+        filts: Sequence[Optional[dict]],
+    ) -> List[List[Doc]]:
+        if len(vectors) <= 1:
+            return [self.query(v, top_k, f) for v, f in zip(vectors, filts)]
+        self._get_index()  # resolve once before fanning out
+        futures = [self._pool.submit(self.query, v, top_k, f) for v, f in zip(vectors, filts)]
+        return [fut.result() for fut in futures]
+
+    def upsert(self, records: Sequence[dict]) -> None:
+        """Upsert `{id, values, text, category}` records (one request)."""
+        self._get_index().upsert(
+            vectors=[
+                {
+                    "id": r["id"],
+                    "values": list(r["values"]),
+                    "metadata": {"text": r["text"], "category": r.get("category") or ""},
+                }
+                for r in records
+            ],
+            namespace=self._namespace,
+        )
+
+    def delete(self, ids: Sequence[str]) -> None:
+        if ids:
+            self._get_index().delete(ids=list(ids), namespace=self._namespace)
+
+
+class LocalVectorStore:
+    """Exact cosine search over an in-memory float32 matrix.
+
+    Rows are L2-normalized once at load time so scoring is a single
+    matrix-vector (or matrix-matrix for batches) product. Category filters
+    are resolved to precomputed row-index arrays instead of per-row checks.
+    """
+
+    def __init__(
+        self,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        categories: Sequence[Optional[str]],
+        vectors: np.ndarray,
+    ):
+        matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[0] != len(ids):
+            raise ValueError("vectors must be a (n_docs, dim) matrix aligned with ids")
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self._matrix = matrix / norms
+        self._ids = list(ids)
+        self._texts = list(texts)
+        self._categories = list(categories)
+        self._fingerprint: Optional[str] = None
+        self._rows_by_category: Dict[str, np.ndarray] = {}
+        for cat in set(c for c in self._categories if c is not None):
+            rows = [i for i, c in enumerate(self._categories) if c == cat]
+            self._rows_by_category[cat] = np.asarray(rows, dtype=np.intp)
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "LocalVectorStore":
+        ids: List[str] = []
+        texts: List[str] = []
+        cats: List[Optional[str]] = []
+        vecs: List[Sequence[float]] = []
+        for r in records:
+            ids.append(str(r["id"]))
+            texts.append(r.get("text") or r.get("chunk_text") or "")
+            cats.append(r.get("category"))
+            vecs.append(r["values"])
+        matrix = np.asarray(vecs, dtype=np.float32) if vecs else np.zeros((0, 0), dtype=np.float32)
+        return cls(ids, texts, cats, matrix)
+
+    @classmethod
+    def from_jsonl(cls, path: str) -> "LocalVectorStore":
+        with open(path, "r", encoding="utf-8") as fh:
+            store = cls.from_records(json.loads(line) for line in fh if line.strip())
+        logger.debug("vector_store.local: loaded path=%s docs=%d dim=%d", path, len(store), store.dim)
+        return store
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def fingerprint(self) -> str:
+        """Stable hash of ids, texts and categories; changes when the corpus does."""
+        if self._fingerprint is None:
+            h = hashlib.sha1()
+            for i, t, c in zip(self._ids, self._texts, self._categories):
+                h.update(f"{i}\x1f{c or ''}\x1f{t}\x1e".encode("utf-8"))
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    @property
+    def dim(self) -> int:
+        return int(self._matrix.shape[1]) if self._matrix.size else 0
+
+    def _candidate_rows(self, filt: Optional[dict]) -> Optional[np.ndarray]:
+        cats = filter_categories(filt)
+        if cats is None:
+            return None
+        parts = [self._rows_by_category[c] for c in cats if c in self._rows_by_category]
+        if not parts:
+            return np.zeros(0, dtype=np.intp)
+        return parts[0] if len(parts) == 1 else np.unique(np.concatenate(parts))
+
+    def _top_k(self, scores: np.ndarray, rows: Optional[np.ndarray], top_k: int) -> List[Doc]:
+        if rows is not None:
+            scores = scores[rows]
+        n = scores.shape[0]
+        if n == 0 or top_k <= 0:
+            return []
+        k = min(top_k, n)
+        part = np.argpartition(-scores, k - 1)[:k]
+        order = part[np.argsort(-scores[part], kind="stable")]
+        idx = rows[order] if rows is not None else order
+        return [
+            Doc(
+                id=self._ids[i],
+                text=self._texts[i],
+                score=float(s),
+                category=self._categories[i],
+                vector=self._matrix[i],
+            )
+            for i, s in zip(idx.tolist(), scores[order].tolist())
+        ]
+
+    def _as_queries(self, vectors: Sequence[Sequence[float]]) -> np.ndarray:
+        q = np.asarray(vectors, dtype=np.float32)
+        if q.ndim != 2 or q.shape[1] != self.dim:
+            raise ValueError(f"query dim mismatch: expected {self.dim}, got {q.shape[-1]}")
+        norms = np.linalg.norm(q, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return q / norms
+
+    def query(self, vector: Sequence[float], top_k: int, filt: Optional[dict]) -> List[Doc]:
+        return self.query_many([vector], top_k, [filt])[0]
+
+    def query_many(
+        self,
+        vectors: Sequence[Sequence[float]],
+        top_k: int,
+        filts: Sequence[Optional[dict]],
+    ) -> List[List[Doc]]:
+        if not len(vectors):
+            return []
+        if not len(self):
+            return [[] for _ in vectors]
+        q = self._as_queries(vectors)
+        # One (n_docs, n_queries) product scores every clause at once
+        scores = self._matrix @ q.T
+        return [
+            self._top_k(scores[:, j], self._candidate_rows(f), top_k)
+            for j, f in enumerate(filts)
+        ]
+
+
+_store: VectorStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_vector_store() -> VectorStore:
+    """Return the process-wide vector store selected by settings."""
+    global _store
+    if _store is not None:
+        return _store
+    with _store_lock:
+        if _store is None:
+            backend = (settings.vector_store or "pinecone").lower()
+            if backend == "local":
+                if not settings.local_index_path:
+                    raise RuntimeError("LOCAL_INDEX_PATH not configured")
+                _store = LocalVectorStore.from_jsonl(settings.local_index_path)
+            elif backend == "snapshot":
+                if not settings.snapshot_path:
+                    raise RuntimeError("SNAPSHOT_PATH not configured")
+                from .snapshot import SnapshotVectorStore
+
+                _store = SnapshotVectorStore(settings.snapshot_path, rescore=settings.snapshot_rescore)
+            elif backend == "pinecone":
+                _store = PineconeVectorStore()
+            else:
+                raise RuntimeError(f"Unknown VECTOR_STORE backend: {backend}")
+    return _store
+
+
+def corpus_version() -> str:
+    """Identify the current FAQ corpus, for invalidating derived caches.
+
+    Local stores hash their contents; for Pinecone the operator bumps
+    `FAQ_CORPUS_VERSION` after re-indexing.
+    """
+    fp = getattr(get_vector_store(), "fingerprint", None)
+    return f"{settings.faq_corpus_version}:{fp or ''}"
+
+
+def set_vector_store(store: VectorStore | None) -> None:
+    """Override (or reset with None) the process-wide vector store."""
+    global _store
+    with _store_lock:
+        _store = store
@@ -0,0 +1,135 @@
+"""Semantic answer cache for near-duplicate FAQ questions.
+
+An entry stores the query embedding, the retrieved doc-id set and the final
+answer with its citations. A new question hits when its embedding is within
+`ANSWER_CACHE_THRESHOLD` cosine similarity of a cached one *and* retrieval
+selected exactly the same docs, so the cached answer is grounded in the same
+context. Entries are LRU-bounded, expire after `ANSWER_CACHE_TTL_S`, and are
+dropped wholesale when the corpus version changes.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+import itertools
+import logging
+import threading
+import time
+
+import numpy as np
+
+from ..core.config import settings
+from ..utils import metrics
+
+
+logger = logging.getLogger("services.answer_cache")
+
+
+@dataclass
+class CachedAnswer:
+    vector: np.ndarray = field(repr=False)
+    doc_ids: frozenset[str]
+    answer: str
+    citations: list[dict]
+    expires_at: float
+
+
+class AnswerCache:
+    """LRU of cached answers with vectorized nearest-neighbour lookup."""
+
+    def __init__(self, max_entries: int, threshold: float, ttl_s: float):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._ids = itertools.count()
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        # Stacked vectors of the current entries, rebuilt lazily after writes
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: list[int] = []
+
+    def _check_version(self, version: str) -> None:
+        if self._version != version:
+            if self._entries:
+                metrics.incr("answer_cache.invalidated", len(self._entries))
+                logger.debug("answer_cache: corpus version changed; dropping %d entries", len(self._entries))
+            self._entries.clear()
+            self._matrix = None
+            self._version = version
+
+    def _stacked(self) -> tuple[np.ndarray, list[int]]:
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries.keys())
+            self._matrix = np.stack([self._entries[k].vector for k in self._matrix_keys])
+        return self._matrix, self._matrix_keys
+
+    def lookup(self, vector: np.ndarray, doc_ids: frozenset[str], version: str) -> Optional[CachedAnswer]:
+        with self._lock:
+            self._check_version(version)
+            if not self._entries or not doc_ids:
+                metrics.incr("answer_cache.miss")
+                return None
+            matrix, keys = self._stacked()
+            sims = matrix @ vector.astype(np.float32)
+            now = time.time()
+            for pos in np.argsort(-sims):
+                if sims[pos] < self.threshold:
+                    break
+                key = keys[int(pos)]
+                entry = self._entries.get(key)
+                if entry is None or entry.expires_at <= now or entry.doc_ids != doc_ids:
+                    continue
+                self._entries.move_to_end(key)
+                metrics.incr("answer_cache.hit")
+                return entry
+            metrics.incr("answer_cache.miss")
+            return None
+
+    def store(self, vector: np.ndarray, doc_ids: frozenset[str], answer: str, citations: list[dict], version: str) -> None:
+        if not answer or not doc_ids:
+            return
+        with self._lock:
+            self._check_version(version)
+            self._entries[next(self._ids)] = CachedAnswer(
+                vector=vector.astype(np.float32),
+                doc_ids=doc_ids,
+                answer=answer,
+                citations=citations,
+                expires_at=time.time() + self.ttl_s,
+            )
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.incr("answer_cache.evicted")
+            self._matrix = None
+            metrics.incr("answer_cache.stored")
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache: Optional[AnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Return the process-wide answer cache (None when disabled)."""
+    global _cache
+    if settings.answer_cache_size <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache(
+                    settings.answer_cache_size,
+                    settings.answer_cache_threshold,
+                    settings.answer_cache_ttl_s,
+                )
+                metrics.register_gauge("answer_cache.entries", lambda: len(_cache or ()))
+    return _cache
@@ -2,47 +2,152 @@
 
 This module provides a thin orchestration layer that:
 - builds the dialogue context window
-- retrieves relevant documents
+- retrieves relevant documents (or takes the typing-time prefetch)
+- replays cached answers for near-duplicate first questions
 - constructs the final LLM messages
-- streams completion tokens while tracking usage
+- routes simple turns to a fast model and the rest to the strong one
+- streams completion tokens while tracking usage, sharing one upstream
+  stream between identical concurrent first questions
+
+`stream_for_session` is a coroutine: short DB reads run on the threadpool,
+retrieval on the retriever's pool, and the completion is streamed with the
+async OpenAI client, so a waiting stream holds no thread.
 """
 from __future__ import annotations
 
-from collections.abc import Iterator
-from typing import Iterable, List, Tuple
+from collections.abc import AsyncIterator, Iterator
+from typing import AsyncIterable, Callable, Iterable, List, NamedTuple, Optional, Tuple, Union
+import asyncio
 import logging
+import re
 
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from ..core.config import settings
 from ..db import crud
-from ..db.models import Role
-from ..rag.retriever import retrieve_optimal
-from ..rag.prompt import build_messages
-from ..rag.types import Doc
-from ..llm.client import get_openai
-from ..utils.tokens import count_tokens
+from ..db.models import MessageState, Role
+from ..rag.retriever import aretrieve
+from ..rag.prompt import SYSTEM_PROMPT, assemble_context, build_messages
+from ..rag.types import Retrieval
+from ..rag.vector_store import corpus_version
+from ..utils import metrics
+from ..llm.admission import get_admission, is_rate_limited
+from ..llm.client import get_async_openai
+from ..llm.router import Route, RouteSignals, choose_route, escalation
+from ..utils.tokens import count_tokens, count_tokens_batch
+from .answer_cache import get_answer_cache
+from .generation_hub import generation_key, get_generation_hub
+from .prefetch import get_prefetch_cache
+from .summaries import schedule_compaction
 
 
 logger = logging.getLogger("services.chat")
 
 
 class StreamResult:
-    """Adapter that buffers streamed tokens and tracks usage and citations."""
+    """Adapter that buffers streamed tokens and tracks usage and citations.
+
+    Wraps either a sync or an async token source; both `for` and `async for`
+    work over either. Usage comes from the provider's final usage chunk
+    (`report_usage`) when it arrives; otherwise output tokens are counted
+    incrementally per delta and the prompt via the optional `count_prompt`.
+    """
 
-    def __init__(self, tokens: Iterable[str], *, citations: list[dict], tokens_in: int = 0):
-        self._tokens = iter(tokens)
+    def __init__(
+        self,
+        tokens: Union[Iterable[str], AsyncIterable[str]],
+        *,
+        citations: list[dict],
+        tokens_in: int = 0,
+        on_complete: Optional[Callable[["StreamResult"], None]] = None,
+        count_prompt: Optional[Callable[[], int]] = None,
+        queued: Optional[AsyncIterable[int]] = None,
+    ):
+        self._tokens = tokens
+        # Queue positions while waiting for an LLM slot (empty once admitted)
+        self.queued = queued
+        self.route: Optional[str] = None  # model route ("fast"/"strong") that served it
         self.buffer: List[str] = []
         self.citations = citations
         self.usage = {"tokens_in": tokens_in, "tokens_out": 0}
+        self._on_complete = on_complete
+        self._count_prompt = count_prompt
+        self._counted_out = 0
+        self._exact = False
+
+    def report_usage(self, prompt_tokens: int, completion_tokens: int) -> None:
+        """Record exact counts reported by the provider."""
+        self.usage["tokens_in"] = prompt_tokens
+        self.usage["tokens_out"] = completion_tokens
+        self._exact = True
+
+    def _append(self, tok: str) -> None:
+        self.buffer.append(tok)
+        if not self._exact:
+            self._counted_out += count_tokens(tok)
 
     def __iter__(self) -> Iterator[str]:
-        for tok in self._tokens:
-            self.buffer.append(tok)
+        for tok in self._tokens:  # type: ignore[union-attr]
+            self._append(tok)
             yield tok
-        # Post-hoc approximate token count for output using model tokenizer
-        text = "".join(self.buffer)
-        self.usage["tokens_out"] = count_tokens(text)
+        self._finish()
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        if hasattr(self._tokens, "__aiter__"):
+            async for tok in self._tokens:  # type: ignore[union-attr]
+                self._append(tok)
+                yield tok
+        else:
+            for tok in self._tokens:  # type: ignore[union-attr]
+                self._append(tok)
+                yield tok
+        self._finish()
+
+    def abort(self) -> None:
+        """Settle usage for a stream that stopped early; `on_complete` is not run."""
+        if not self._exact:
+            self.usage["tokens_out"] = self._counted_out
+            if self._count_prompt is not None:
+                self.usage["tokens_in"] = self._count_prompt()
+
+    def _finish(self) -> None:
+        if not self._exact:
+            self.usage["tokens_out"] = self._counted_out
+            if self._count_prompt is not None:
+                metrics.incr("llm.usage_missing")
+                self.usage["tokens_in"] = self._count_prompt()
+        if self._on_complete is not None:
+            self._on_complete(self)
+
+
+class ContextWindow(NamedTuple):
+    history: list[dict]
+    question: str
+    counts: list[Optional[int]]  # persisted token count per history message
+    first_turn: bool  # no messages before the question
+    summary: Optional[str] = None  # running summary of turns older than `history`
+    summary_tokens: int = 0
+    overflow: bool = False  # unsummarized turns did not fit the budget
+    question_tokens: int = 0  # persisted count for `question` (0 if unknown)
+
+
+class InflightRetrieval(NamedTuple):
+    query: str
+    task: "asyncio.Future[Retrieval]"
+
+
+def _chain(*hooks: Optional[Callable[[StreamResult], None]]) -> Callable[[StreamResult], None]:
+    def _run(result: StreamResult) -> None:
+        for hook in hooks:
+            if hook is not None:
+                hook(result)
+    return _run
+
+
+def _replay_chunks(text: str) -> Iterator[str]:
+    """Split a stored answer into word-sized chunks for token-style replay."""
+    yield from re.findall(r"\S+\s*|\s+", text)
 
 
 class ChatService:
@@ -51,70 +156,313 @@ class ChatService:
     Stateless static methods keep API routing thin while allowing future
     evolution to dependency-injected instances if needed.
     """
-    MAX_CONTEXT_MESSAGES = 12
+    MAX_CONTEXT_MESSAGES = 40
+    HISTORY_PAGE_SIZE = 16
     FINAL_CONTEXT_K = 4
 
     @staticmethod
-    def _build_context_window(db: Session, session_id) -> Tuple[list[dict], str]:
-        rows = crud.list_messages(db, session_id=session_id, limit=ChatService.MAX_CONTEXT_MESSAGES)
-        history: list[dict] = []
+    def _build_context_window(db: Session, session_id) -> ContextWindow:
+        """Return history messages, the latest user text and per-message token counts.
+
+        Walks the session newest-first in keyset pages and packs the most
+        recent messages whose persisted counts (`tokens_in` for user rows,
+        `tokens_out` for assistant rows) fit `HISTORY_TOKEN_BUDGET`; rows
+        stored without a count are tokenized once here. The newest user
+        message is the question and is not repeated in the history; answers
+        still being streamed are skipped.
+        Messages covered by the session's running summary are not read.
+        """
+        summary = crud.get_session_summary(db, session_id)
+        after = (summary.through_created_at, summary.through_message_id) if summary else None
+        budget = settings.history_token_budget
+        picked: list[Tuple[str, str, int]] = []  # newest-first (role, content, tokens)
         latest_user = ""
-        for r in rows:
-            if r.role == Role.user:
-                latest_user = r.content
-                history.append({"role": "user", "content": r.content})
-            elif r.role == Role.assistant:
-                history.append({"role": "assistant", "content": r.content})
-        if not latest_user and rows:
-            latest_user = rows[-1].content
+        latest_tokens = 0
+        earlier = False
+        used = 0
+        cursor = None
+        full = False
+        while not full:
+            rows = crud.list_recent_messages(
+                db, session_id=session_id, limit=ChatService.HISTORY_PAGE_SIZE, before=cursor, after=after
+            )
+            for r in rows:
+                if r.role not in (Role.user, Role.assistant) or r.state == MessageState.streaming:
+                    continue
+                if not latest_user and not picked and r.role == Role.user:
+                    latest_user = r.content
+                    latest_tokens = r.tokens_in or 0
+                    continue
+                earlier = True
+                tokens = (r.tokens_in if r.role == Role.user else r.tokens_out) or count_tokens(r.content)
+                if used + tokens > budget or len(picked) >= ChatService.MAX_CONTEXT_MESSAGES:
+                    full = True
+                    break
+                picked.append((r.role.value, r.content, tokens))
+                used += tokens
+            if len(rows) < ChatService.HISTORY_PAGE_SIZE:
+                break
+            cursor = (rows[-1].created_at, rows[-1].id)
+
+        picked.reverse()
+        # Don't open the window on an answer whose question was cut off
+        if picked and picked[0][0] == "assistant":
+            used -= picked.pop(0)[2]
+        history = [{"role": role, "content": content} for role, content, _ in picked]
+        counts: list[Optional[int]] = [tokens for _, _, tokens in picked]
         logger.debug(
-            "build_context_window: messages=%d latest_user_preview=%s",
-            len(rows),
+            "build_context_window: messages=%d tokens=%d summary_tokens=%d overflow=%s latest_user_preview=%s",
+            len(history),
+            used,
+            summary.tokens if summary else 0,
+            full,
             latest_user[:80] if latest_user else "",
         )
-        return history, latest_user
+        return ContextWindow(
+            history,
+            latest_user,
+            counts,
+            first_turn=not earlier and summary is None,
+            summary=summary.content if summary else None,
+            summary_tokens=summary.tokens if summary else 0,
+            overflow=full,
+            question_tokens=latest_tokens,
+        )
 
     @staticmethod
-    def _select_context(query: str) -> List[Doc]:
-        docs = retrieve_optimal(query_text=query, final_k=ChatService.FINAL_CONTEXT_K)
+    def _load_context_window(db: Session, session_id) -> ContextWindow:
+        try:
+            return ChatService._build_context_window(db, session_id)
+        finally:
+            # End the read transaction so the pooled connection goes back to
+            # the pool instead of idling for the whole generation.
+            db.commit()
+
+    @staticmethod
+    async def _select_context(query: str, owner: Optional[str] = None) -> Retrieval:
+        """Retrieve context for `query`, reusing the owner's typing-time prefetch."""
+        retrieval = None
+        cache = get_prefetch_cache() if owner is not None else None
+        prefetched = cache.take(owner, query) if cache is not None else None
+        if prefetched is not None:
+            try:
+                retrieval = await asyncio.wrap_future(prefetched.future)
+            except Exception:
+                logger.exception("select_context: prefetched retrieval failed; retrieving again")
+            if retrieval is not None and not prefetched.exact:
+                # The draft's embeddings describe a possibly different question:
+                # keep its docs, but without a query vector the answer cache
+                # neither replays nor stores under the draft's key
+                retrieval = Retrieval(docs=retrieval.docs, clauses=retrieval.clauses, timings=retrieval.timings)
+        if retrieval is None:
+            retrieval = await aretrieve(query_text=query, final_k=ChatService.FINAL_CONTEXT_K)
         logger.debug(
             "select_context: query_preview=%s selected=%s",
             query[:80],
-            [(d.id, round(d.score, 4), d.category) for d in docs],
+            [(d.id, round(d.score, 4), d.category) for d in retrieval.docs],
         )
-        return docs
+        return retrieval
+
+    @staticmethod
+    def _cached_answer(
+        first_turn: bool, retrieval: Retrieval
+    ) -> Tuple[Optional[StreamResult], Optional[Callable[[StreamResult], None]]]:
+        """Replay a cached answer, or return a hook that caches the new one.
+
+        Only first turns are eligible: later answers also depend on history.
+        """
+        cache = get_answer_cache()
+        query_vec = retrieval.query_vector()
+        if cache is None or query_vec is None or not first_turn:
+            return None, None
+        try:
+            version = corpus_version()
+        except Exception:
+            logger.exception("answer_cache: corpus version unavailable; skipping cache")
+            return None, None
+        doc_ids = retrieval.doc_ids
+        hit = cache.lookup(query_vec, doc_ids, version)
+        if hit is not None:
+            logger.debug("answer_cache: hit doc_ids=%s", sorted(doc_ids))
+            result = StreamResult(_replay_chunks(hit.answer), citations=hit.citations)
+            result.usage["cached"] = True
+            return result, None
+
+        def _store(result: StreamResult) -> None:
+            cache.store(query_vec, doc_ids, "".join(result.buffer).strip(), result.citations, version)
+
+        return None, _store
+
+    @staticmethod
+    def start_retrieval(query: str, owner: Optional[str] = None) -> InflightRetrieval:
+        """Start retrieval for `query` now, to overlap it with DB work."""
+        return InflightRetrieval(query, asyncio.ensure_future(ChatService._select_context(query, owner)))
 
     @staticmethod
-    def stream_for_session(db: Session, session_id: str) -> StreamResult:
-        history, user_q = ChatService._build_context_window(db, session_id)
+    async def stream_for_session(
+        db: Session, session_id: str, inflight: Optional[InflightRetrieval] = None
+    ) -> StreamResult:
+        """Prepare the turn's prompt and start streaming the answer.
+
+        `inflight` is retrieval the caller started for the new message
+        before its DB work (`start_retrieval`); it is used when that message
+        is the loaded question, so retrieval overlaps the history load.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            window = await run_in_threadpool(ChatService._load_context_window, db, session_id)
+        except BaseException:
+            if inflight is not None:
+                inflight.task.cancel()
+            raise
+        history, user_q, history_counts = window.history, window.question, window.counts
         if not user_q:
             user_q = "Respond helpfully based on the context."
-        docs = ChatService._select_context(user_q)
+        if inflight is not None and inflight.query == window.question:
+            loaded = loop.time()
+            retrieval = await inflight.task
+            logger.debug(
+                "pipeline: history_ms=%.1f retrieval_wait_ms=%.1f",
+                (loaded - started) * 1000.0,
+                (loop.time() - loaded) * 1000.0,
+            )
+        else:
+            if inflight is not None:
+                inflight.task.cancel()
+            retrieval = await ChatService._select_context(user_q)
+        replay, on_complete = ChatService._cached_answer(window.first_turn, retrieval)
+        if replay is not None:
+            return replay
+        docs, context, context_tokens = assemble_context(
+            retrieval.docs,
+            budget_tokens=settings.context_token_budget,
+            max_doc_tokens=settings.context_max_doc_tokens,
+            min_docs=len(retrieval.clauses) or 1,  # MMR puts each clause's pick first
+            max_gap=settings.context_score_gap,
+        )
         citations = [d.to_citation(i + 1) for i, d in enumerate(docs)]
-        messages = build_messages(history, user_q, docs)
+        question_tokens = window.question_tokens if user_q == window.question else 0
+        messages = build_messages(history, user_q, docs, context=context, summary=window.summary)
+        if window.overflow:
+            # Compact after this answer so the next turn starts from the summary
+            on_complete = _chain(on_complete, lambda _r: schedule_compaction(session_id))
         logger.debug("generate_stream: user_q_preview=%s citations=%s", user_q[:80], citations)
 
-        client = get_openai()
-        model = settings.llm_model or "gpt-4o-mini"
-        stream = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=0.2,
-            stream=True,
-        )
+        def _count_prompt() -> int:
+            # Only used when the provider omits the usage chunk. History and
+            # the question reuse persisted counts and the context its cached
+            # block counts; only the system prompt is tokenized.
+            fresh = [SYSTEM_PROMPT] if question_tokens else [SYSTEM_PROMPT, user_q]
+            fresh += [h["content"] for h, c in zip(history, history_counts) if c is None]
+            known = context_tokens + window.summary_tokens + sum(c for c in history_counts if c is not None)
+            return known + question_tokens + sum(count_tokens_batch(fresh))
+
+        route, reason = choose_route(RouteSignals(
+            clauses=len(retrieval.clauses) or 1,
+            top_score=max((d.score for d in docs), default=0.0),
+            history_messages=len(history),
+            prompt_tokens=context_tokens
+            + window.summary_tokens
+            + sum(c or 0 for c in history_counts)
+            + (question_tokens or len(user_q) // 4),  # rough estimate if never counted
+        ))
+        logger.debug("router: route=%s model=%s reason=%s", route.name, route.model, reason)
+
+        async def _first_chunk(client, r: Route):
+            stream = await client.chat.completions.create(
+                model=r.model,
+                messages=messages,
+                temperature=0.2,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            try:
+                return stream, await stream.__anext__()
+            except StopAsyncIteration:
+                return stream, None
+            except BaseException:
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    await close()
+                raise
+
+        async def _open_stream(report_usage: Callable[[int, int], None]):
+            client = get_async_openai()
+            routes = escalation(route)
+            for i, r in enumerate(routes):
+                try:
+                    stream, first = await asyncio.wait_for(_first_chunk(client, r), r.timeout_s)
+                except Exception as e:
+                    if i == len(routes) - 1:
+                        metrics.incr("router.failed")
+                        raise
+                    if is_rate_limited(e):
+                        # Still a provider 429: admission control must back off
+                        generation.report_rate_limited()
+                    metrics.incr("router.escalated")
+                    logger.warning("router: %s route (%s) failed before its first chunk: %r; escalating",
+                                   r.name, r.model, e)
+                    continue
+                result.route = r.name
+                break
+
+            def _content(chunk) -> Optional[str]:
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    report_usage(usage.prompt_tokens, usage.completion_tokens)
+                # The final usage chunk carries no choices
+                if not chunk.choices:
+                    return None
+                delta = getattr(chunk.choices[0], "delta", None)
+                return getattr(delta, "content", None) if delta else None
 
-        # Precompute prompt token usage across system/context/history/user
-        prompt_tokens = 0
-        for m in messages:
-            prompt_tokens += count_tokens(str(m.get("content", "")))
+            async def _token_iter():
+                try:
+                    if first is not None:
+                        text = _content(first)
+                        if text:
+                            yield text
+                    async for chunk in stream:
+                        text = _content(chunk)
+                        if text:
+                            yield text
+                finally:
+                    # Release the HTTP stream right away when cancelled mid-answer
+                    close = getattr(stream, "close", None)
+                    if close is not None:
+                        await close()
 
-        def _token_iter():
-            for chunk in stream:
-                choice = chunk.choices[0]
-                delta = getattr(choice, "delta", None)
-                if delta and getattr(delta, "content", None):
-                    yield delta.content
+            return _token_iter()
 
-        return StreamResult(_token_iter(), citations=citations, tokens_in=prompt_tokens)
+        # Identical fresh first questions over the same docs share one stream
+        fresh = window.first_turn and not history and not window.summary
+        key = generation_key(user_q, [d.id for d in docs], fresh) if settings.coalesce_generations and fresh else None
+        admission = get_admission()
+        generation, leader = get_generation_hub().join(
+            key, _open_stream, admit=admission.reserve if admission is not None else None
+        )
+
+        async def _tokens():
+            async for tok in generation.subscribe():
+                yield tok
+            if generation.usage is not None:
+                result.report_usage(*generation.usage)
+
+        result = StreamResult(
+            _tokens(),
+            citations=citations,
+            on_complete=on_complete if leader else None,
+            count_prompt=_count_prompt,
+            queued=generation.queue_updates(),
+        )
+        result.route = route.name
+        if leader:
+            # Open the LLM request now; the caller's remaining setup (the
+            # assistant row insert) overlaps its time-to-first-token
+            generation.start()
+        else:
+            result.usage["coalesced"] = True
+        return result
 
 
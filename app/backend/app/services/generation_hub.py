@@ -0,0 +1,249 @@
+"""Single-flight fan-out of streamed LLM generations.
+
+Bursts of the same first question (an outage, a fee announcement) would each
+open their own completion stream. `GenerationHub.join` keys a generation on
+the normalized question, the ids of the context docs and whether the session
+has any history; the first caller starts one upstream stream and later
+callers with the same key subscribe to it. Every subscriber reads from the
+shared token buffer, so a late joiner first gets the prefix already produced
+and then follows the live stream.
+
+The upstream is pumped by a task started on first subscription (or
+`start()`), independent of any one reader. A leader's generation holds an admission ticket
+(`llm/admission.py`): the pump waits for its slot before opening the
+upstream and releases it, with the observed time-to-first-token, when the
+stream ends; followers take no slot. A generation leaves the hub when its
+stream ends, so a request arriving after that starts fresh (or hits the
+answer cache).
+
+Hub generations are cancelled once every request that joined has stopped
+reading, which closes the upstream HTTP stream and frees its slot.
+"""
+from __future__ import annotations
+
+from collections.abc import AsyncIterator
+from typing import AsyncIterable, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import threading
+
+from ..llm.admission import Ticket, is_rate_limited
+from ..utils import metrics
+
+
+logger = logging.getLogger("services.generation_hub")
+
+# Returns the upstream token source; `report_usage(prompt, completion)` is
+# called by the source if the provider sends exact counts.
+SourceFactory = Callable[[Callable[[int, int], None]], Awaitable[AsyncIterable[str]]]
+
+
+def generation_key(question: str, doc_ids, fresh_history: bool) -> str:
+    """Stable key for generations that must produce the same answer."""
+    norm = " ".join((question or "").lower().split())
+    raw = "\x1f".join([norm, ",".join(sorted(doc_ids)), "fresh" if fresh_history else "ctx"])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class Generation:
+    """One upstream stream and the buffer every subscriber replays from."""
+
+    def __init__(
+        self,
+        key: Optional[str],
+        factory: SourceFactory,
+        on_done: Callable[["Generation"], None],
+        ticket: Optional[Ticket] = None,
+        cancel_when_idle: bool = False,
+    ):
+        self.key = key
+        self.chunks: List[str] = []
+        self.usage: Optional[Tuple[int, int]] = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.cancelled = False
+        self.rate_limited = False  # the provider answered 429, even if a fallback then served it
+        self.subscribers = 0
+        self.pending_joins = 0  # joined but not yet subscribed
+        self.cancel_when_idle = cancel_when_idle
+        self.queue_position = 0
+        self.admitted = ticket is None or ticket.granted
+        self._ticket = ticket
+        self._factory = factory
+        self._on_done = on_done
+        self._task: Optional[asyncio.Task] = None
+        self._changed: Optional[asyncio.Event] = None
+
+    def _notify(self) -> None:
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = asyncio.Event()
+
+    def _report_usage(self, prompt_tokens: int, completion_tokens: int) -> None:
+        self.usage = (prompt_tokens, completion_tokens)
+
+    def report_rate_limited(self) -> None:
+        """Record a provider 429 the source recovered from (e.g. by escalating)."""
+        self.rate_limited = True
+
+    def _set_position(self, position: int) -> None:
+        self.queue_position = position
+        self._notify()
+
+    async def _pump(self) -> None:
+        loop = asyncio.get_running_loop()
+        ttft: Optional[float] = None
+        try:
+            if self._ticket is not None:
+                await self._ticket.wait(on_position=self._set_position)
+                self.admitted = True
+                self._notify()
+            start = loop.time()
+            source = await self._factory(self._report_usage)
+            async for tok in source:
+                if ttft is None:
+                    ttft = loop.time() - start
+                self.chunks.append(tok)
+                self._notify()
+        except BaseException as e:  # includes cancellation; readers re-raise it
+            self.error = e
+            if is_rate_limited(e):
+                self.rate_limited = True
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            if self._ticket is not None:
+                # A cancelled stream says nothing about provider health
+                self._ticket.release(ttft_s=None if self.cancelled else ttft, rate_limited=self.rate_limited)
+            self.done = True
+            self._notify()
+            self._on_done(self)
+
+    def cancel(self) -> None:
+        """Stop the upstream; subscribers still reading get `CancelledError`."""
+        if self.done or self.cancelled:
+            return
+        self.cancelled = True
+        if self._task is not None:
+            self._task.cancel()
+        else:
+            self.done = True
+            self._on_done(self)
+
+    def start(self) -> None:
+        """Open the upstream now rather than on first subscription."""
+        self._ensure_started()
+
+    def _ensure_started(self) -> None:
+        if self._task is None:
+            self._changed = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._pump())
+
+    async def queue_updates(self) -> AsyncIterator[int]:
+        """Yield the queue position whenever it changes, until admitted."""
+        self._ensure_started()
+        last = 0
+        while not self.admitted and not self.done:
+            if self.queue_position and self.queue_position != last:
+                last = self.queue_position
+                yield last
+                continue
+            assert self._changed is not None
+            await self._changed.wait()
+
+    async def subscribe(self, offset: int = 0) -> AsyncIterator[str]:
+        """Yield buffered text from character `offset`, then follow the live stream."""
+        self._ensure_started()
+        self.subscribers += 1
+        self.pending_joins = max(0, self.pending_joins - 1)
+        i = 0
+        skip = offset
+        try:
+            while True:
+                if i < len(self.chunks):
+                    chunk = self.chunks[i]
+                    i += 1
+                    if skip >= len(chunk):
+                        skip -= len(chunk)
+                        continue
+                    chunk, skip = chunk[skip:], 0
+                    yield chunk
+                    continue
+                if self.done:
+                    break
+                assert self._changed is not None
+                await self._changed.wait()
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.subscribers -= 1
+            if self.cancel_when_idle and not self.done and not self.subscribers and not self.pending_joins:
+                metrics.incr("generation_hub.cancelled")
+                logger.debug("generation_hub: no readers left; cancelling key=%s", (self.key or "-")[:12])
+                self.cancel()
+
+
+class GenerationHub:
+    """Registry of in-flight generations, keyed for single-flight."""
+
+    def __init__(self) -> None:
+        self._inflight: Dict[str, Generation] = {}
+        self._lock = threading.Lock()
+
+    def _release(self, gen: Generation) -> None:
+        if gen.key is None:
+            return
+        with self._lock:
+            if self._inflight.get(gen.key) is gen:
+                del self._inflight[gen.key]
+
+    def join(
+        self,
+        key: Optional[str],
+        factory: SourceFactory,
+        admit: Optional[Callable[[], Ticket]] = None,
+    ) -> Tuple[Generation, bool]:
+        """Return the generation for `key` and whether the caller leads it.
+
+        `key=None` always starts a private generation. `admit` is called only
+        when a new generation starts; `Overloaded` from it propagates.
+        """
+        with self._lock:
+            gen = self._inflight.get(key) if key is not None else None
+            if gen is not None and not gen.done and not gen.cancelled:
+                gen.pending_joins += 1
+                metrics.incr("generation_hub.joined")
+                logger.debug("generation_hub: joined key=%s buffered=%d", key[:12], len(gen.chunks))
+                return gen, False
+            gen = Generation(
+                key, factory, self._release, admit() if admit is not None else None, cancel_when_idle=True
+            )
+            gen.pending_joins = 1
+            if key is not None:
+                self._inflight[key] = gen
+        metrics.incr("generation_hub.started")
+        return gen, True
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._inflight)
+
+
+_hub: GenerationHub | None = None
+_hub_lock = threading.Lock()
+
+
+def get_generation_hub() -> GenerationHub:
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = GenerationHub()
+    return _hub
+
+
+def set_generation_hub(hub: GenerationHub | None) -> None:
+    global _hub
+    with _hub_lock:
+        _hub = hub
@@ -0,0 +1,205 @@
+"""Incrementally persisted, resumable assistant answers.
+
+`start_live_answer` creates the assistant row up front in the `streaming`
+state and fans the turn's `StreamResult` out through a private
+`Generation`. One subscriber persists the accumulated text at most every
+`STREAM_PERSIST_MS` (a single UPDATE per flush, never per token) and
+finalizes the row with usage counts as `complete`, or `interrupted` if the
+upstream failed. SSE readers are further subscribers, so a dropped tab
+neither stops the generation nor loses its text.
+
+While running, the answer is registered by message id: a reconnect with
+`Last-Event-ID: <message_id>:<offset>` replays from that character offset
+and keeps following the same upstream stream. Once finalized, resumes are
+served from the stored row. The registry is per process, so multi-worker
+deployments need the resume request routed to the same worker (otherwise
+the client gets the persisted prefix).
+
+The row is written through sessions of its own (`SessionLocal`, one per
+write), never the request's: the answer outlives the request that started it.
+
+SSE readers `attach`/`detach`. When the last one leaves (the tab closed) and
+none reattaches within `STREAM_RESUME_GRACE_S`, the answer is cancelled: the
+upstream stream is closed (shared streams only once all their requests are
+gone) and the partial text is stored as `interrupted`.
+
+If the generation is shed (`Overloaded`, e.g. its LLM queue wait timed
+out) before producing any text, both the empty answer and the question it
+was for are deleted, so the client's retry doesn't leave a duplicate.
+
+Stored content is exactly the streamed text (not stripped, no marker), so
+resume offsets index it the same way whether the answer is live or done;
+clients mark `interrupted` answers as truncated from `state`.
+"""
+from __future__ import annotations
+
+from typing import Callable, Dict, Optional
+from uuid import UUID
+import asyncio
+import logging
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db import crud
+from ..db.models import MessageState, Role
+from ..llm.admission import Overloaded
+from ..utils import metrics
+from .chat_service import StreamResult
+from .generation_hub import Generation
+
+
+logger = logging.getLogger("services.live_answers")
+
+_live: Dict[UUID, "LiveAnswer"] = {}
+_session_factory: Optional[Callable[[], Session]] = None
+
+
+class LiveAnswer:
+    """An assistant answer being generated, persisted and streamed."""
+
+    def __init__(
+        self, message_id: UUID, session_id: UUID, result: StreamResult, question_id: Optional[UUID] = None
+    ):
+        self.message_id = message_id
+        self.session_id = session_id
+        self.question_id = question_id
+        self.result = result
+        self.state = MessageState.streaming
+        self.readers = 0
+        self.cancelled = False
+        self._idle_timer: Optional[asyncio.TimerHandle] = None
+
+        async def _source(_report_usage):
+            return result.__aiter__()
+
+        self.generation = Generation(None, _source, lambda _gen: None)
+        self.persisted: Optional[asyncio.Task] = None
+
+    def text(self) -> str:
+        return "".join(self.result.buffer)
+
+    def attach(self) -> None:
+        self.readers += 1
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def detach(self) -> None:
+        """A reader left; cancel after the resume grace period if nobody is back."""
+        self.readers -= 1
+        if self.readers or self.generation.done:
+            return
+        grace = settings.stream_resume_grace_s
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+        if grace <= 0:
+            self._cancel_if_idle()
+        else:
+            self._idle_timer = asyncio.get_running_loop().call_later(grace, self._cancel_if_idle)
+
+    def _cancel_if_idle(self) -> None:
+        self._idle_timer = None
+        if self.readers or self.generation.done or self.cancelled:
+            return
+        self.cancelled = True
+        metrics.incr("live_answers.cancelled")
+        logger.debug("live_answers: no readers; cancelling message=%s at %d chars", self.message_id, len(self.text()))
+        self.generation.cancel()
+
+
+def get_live_answer(message_id: UUID) -> LiveAnswer | None:
+    return _live.get(message_id)
+
+
+def set_session_factory(factory: Optional[Callable[[], Session]]) -> None:
+    """Override where live answers open their DB sessions (None = `SessionLocal`)."""
+    global _session_factory
+    _session_factory = factory
+
+
+def _write(fn, *args, **kwargs):
+    # Short-lived session per write, so no connection is held between flushes
+    factory = _session_factory
+    if factory is None:
+        from ..db.base import SessionLocal
+
+        factory = SessionLocal
+    with factory() as db:
+        return fn(db, *args, **kwargs)
+
+
+async def _persist(live: LiveAnswer) -> None:
+    loop = asyncio.get_running_loop()
+    interval = settings.stream_persist_ms / 1000.0
+    flushed = 0
+    shed = False
+    last = loop.time()
+    try:
+        async for _ in live.generation.subscribe():
+            if interval > 0 and loop.time() - last >= interval:
+                text = live.text()
+                if len(text) > flushed:
+                    await run_in_threadpool(_write, crud.update_message, live.message_id, content=text)
+                    flushed = len(text)
+                    metrics.incr("live_answers.flushes")
+                last = loop.time()
+        live.state = MessageState.complete
+    except asyncio.CancelledError:
+        if not live.cancelled:
+            raise
+        live.state = MessageState.interrupted
+    except Overloaded:
+        live.state = MessageState.interrupted
+        shed = not live.text()
+        metrics.incr("live_answers.shed" if shed else "live_answers.interrupted")
+        logger.warning("live_answers: generation shed for message=%s", live.message_id)
+    except Exception:
+        live.state = MessageState.interrupted
+        metrics.incr("live_answers.interrupted")
+        logger.exception("live_answers: generation failed for message=%s", live.message_id)
+
+    text = live.text()
+    if live.state == MessageState.interrupted:
+        live.result.abort()
+    try:
+        if not text.strip():
+            await run_in_threadpool(_write, crud.delete_message, live.message_id)
+            if shed and live.question_id is not None:
+                await run_in_threadpool(_write, crud.delete_message, live.question_id)
+        else:
+            await run_in_threadpool(
+                _write,
+                crud.update_message,
+                live.message_id,
+                content=text,
+                tokens_in=live.result.usage.get("tokens_in", 0),
+                tokens_out=live.result.usage.get("tokens_out", 0),
+                state=live.state,
+            )
+    finally:
+        _live.pop(live.message_id, None)
+
+
+async def start_live_answer(
+    session_id: UUID, result: StreamResult, question_id: Optional[UUID] = None
+) -> LiveAnswer:
+    """Create the streaming assistant row and start persisting `result` into it.
+
+    `question_id` is the user message being answered; it is removed too if
+    the generation is shed before any output.
+    """
+    msg = await run_in_threadpool(
+        _write,
+        crud.append_message,
+        session_id=session_id,
+        role=Role.assistant,
+        content="",
+        state=MessageState.streaming,
+    )
+    live = LiveAnswer(msg.id, session_id, result, question_id)
+    _live[msg.id] = live
+    live.persisted = asyncio.get_running_loop().create_task(_persist(live))
+    return live
@@ -0,0 +1,196 @@
+"""Typing-time retrieval prefetch.
+
+While the user is still typing, the client posts the draft to
+`/chat/prefetch`; `PrefetchCache.prefetch` starts retrieval for it (query
+decomposition, clause embedding, vector/lexical search) on the retriever's
+pool and keeps the pending result for `PREFETCH_TTL_S`, one entry per owner
+(identity + session). When the message is sent, `take` hands that result to
+`ChatService._select_context` if the final text normalizes to the draft or
+is within `PREFETCH_MATCH_RATIO` of it, so retrieval on the send path is a
+lookup (or a wait on work already under way). Only an exact match stands in
+for the sent text wholesale: a near match ("card" vs "wire" transfers) may
+mean a different question, so only its docs are reused.
+
+Per identity (across all its sessions, which are client-chosen and so not a
+boundary), drafts arriving within `PREFETCH_DEBOUNCE_MS` of the last
+accepted one are dropped, and at most `PREFETCH_PER_MINUTE` are accepted;
+the rest are refused so prefetch never crowds out real retrievals. At most
+`MAX_OWNERS` owners are tracked; past that the oldest drafts go first. Results
+are held as `concurrent.futures.Future`s, usable from any event loop.
+"""
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import Future
+from difflib import SequenceMatcher
+from typing import Callable, Deque, Dict, NamedTuple, Optional
+import heapq
+import logging
+import threading
+import time
+
+from ..core.config import settings
+from ..rag.text import normalize
+from ..rag.types import Retrieval
+from ..utils import metrics
+
+
+logger = logging.getLogger("services.prefetch")
+
+# Drafts shorter than this (normalized chars) are not worth a retrieval
+MIN_DRAFT_CHARS = 8
+MAX_OWNERS = 10_000
+
+Submit = Callable[[str], "Future[Retrieval]"]
+
+
+class Prefetched(NamedTuple):
+    future: "Future[Retrieval]"
+    exact: bool  # draft normalizes to the sent text (not just a near match)
+
+
+class _Entry(NamedTuple):
+    text: str  # normalized draft
+    future: "Future[Retrieval]"
+    created: float
+
+
+def identity_key(identity: dict) -> str:
+    return identity.get("user_id") or f"anon:{identity.get('anon_id', '')}"
+
+
+def owner_key(identity: dict, session_id) -> str:
+    return f"{identity_key(identity)}:{session_id or ''}"
+
+
+def _matches(draft: str, final: str, ratio: float) -> bool:
+    if draft == final:
+        return True
+    if ratio >= 1.0 or not draft or not final:
+        return False
+    return SequenceMatcher(None, draft, final).ratio() >= ratio
+
+
+class PrefetchCache:
+    """Latest draft retrieval per owner, with a per-identity debounce and cap."""
+
+    def __init__(
+        self,
+        submit: Submit,
+        *,
+        ttl_s: float,
+        debounce_s: float,
+        per_minute: int,
+        match_ratio: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._submit = submit
+        self.ttl_s = ttl_s
+        self.debounce_s = debounce_s
+        self.per_minute = per_minute
+        self.match_ratio = match_ratio
+        self._clock = clock
+        self._entries: Dict[str, _Entry] = {}
+        self._accepted: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, owner: str, draft: str, who: Optional[str] = None) -> str:
+        """Start retrieval for `draft`; returns the outcome for the client.
+
+        `who` is the identity the debounce and rate cap apply to (defaults
+        to `owner`). One of "started", "cached" (same draft already
+        prefetched), "ignored" (too short), "debounced" or "limited".
+        """
+        text = normalize(draft)
+        if len(text) < MIN_DRAFT_CHARS:
+            return "ignored"
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(owner)
+            if entry is not None and entry.text == text and now - entry.created <= self.ttl_s:
+                return "cached"
+            times = self._accepted.setdefault(who or owner, deque())
+            while times and now - times[0] > 60.0:
+                times.popleft()
+            if times and now - times[-1] < self.debounce_s:
+                metrics.incr("prefetch.debounced")
+                return "debounced"
+            if len(times) >= self.per_minute:
+                metrics.incr("prefetch.limited")
+                return "limited"
+            times.append(now)
+            if len(self._entries) >= MAX_OWNERS or len(self._accepted) > MAX_OWNERS:
+                self._evict(now)
+        future = self._submit(draft)
+        with self._lock:
+            self._entries[owner] = _Entry(text, future, now)
+        metrics.incr("prefetch.started")
+        return "started"
+
+    def take(self, owner: str, query: str) -> Optional[Prefetched]:
+        """Pop the owner's prefetched retrieval if it was for (nearly) `query`."""
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.pop(owner, None)
+        if entry is None or now - entry.created > self.ttl_s:
+            return None
+        text = normalize(query)
+        if not _matches(entry.text, text, self.match_ratio):
+            metrics.incr("prefetch.miss")
+            return None
+        exact = entry.text == text
+        metrics.incr("prefetch.hit" if exact else "prefetch.near_hit")
+        return Prefetched(entry.future, exact)
+
+    def _evict(self, now: float) -> None:
+        # Called with the lock held: drop expired entries and idle owners,
+        # then the oldest entries if that didn't get back under the cap
+        for owner in [o for o, e in self._entries.items() if now - e.created > self.ttl_s]:
+            del self._entries[owner]
+        for owner in [o for o, t in self._accepted.items() if not t or now - t[-1] > 60.0]:
+            del self._accepted[owner]
+        excess = len(self._entries) - MAX_OWNERS + 1
+        if excess > 0:
+            for owner, _ in heapq.nsmallest(excess, self._entries.items(), key=lambda kv: kv[1].created):
+                del self._entries[owner]
+            metrics.incr("prefetch.evicted", excess)
+        excess = len(self._accepted) - MAX_OWNERS + 1
+        if excess > 0:
+            for owner, _ in heapq.nsmallest(excess, self._accepted.items(), key=lambda kv: kv[1][-1]):
+                del self._accepted[owner]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+_cache: PrefetchCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_prefetch_cache() -> PrefetchCache | None:
+    """Process-wide cache, or None when `PREFETCH_TTL_S` is 0."""
+    global _cache
+    if settings.prefetch_ttl_s <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from ..rag.retriever import submit_retrieve
+                from .chat_service import ChatService
+
+                _cache = PrefetchCache(
+                    lambda q: submit_retrieve(q, ChatService.FINAL_CONTEXT_K),
+                    ttl_s=settings.prefetch_ttl_s,
+                    debounce_s=settings.prefetch_debounce_ms / 1000.0,
+                    per_minute=settings.prefetch_per_minute,
+                    match_ratio=settings.prefetch_match_ratio,
+                )
+                metrics.register_gauge("prefetch.entries", lambda: len(_cache or ()))
+    return _cache
+
+
+def set_prefetch_cache(cache: PrefetchCache | None) -> None:
+    global _cache
+    with _cache_lock:
+        _cache = cache
@@ -0,0 +1,163 @@
+"""Rolling conversation summaries, compacted off the request path.
+
+When a turn's history window had to drop older messages (the session no
+longer fits `HISTORY_TOKEN_BUDGET`), `schedule_compaction` queues a
+background job. The job folds every message between the stored summary's
+cursor and the newest half-budget of turns into the running summary
+(`session_summaries`). Later turns send that summary plus only the messages
+after its cursor, so the prompt stays roughly constant however long the
+session runs.
+
+Answers still being streamed are never folded: their row holds only the
+text flushed so far.
+
+Jobs run on a small dedicated pool with their own DB sessions, at most one
+per session at a time; failures are logged and counted, never surfaced to
+the chat stream.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Set
+import logging
+import threading
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db import crud
+from ..db.models import MessageState, Role
+from ..llm.client import get_openai
+from ..utils import metrics
+from ..utils.tokens import count_tokens
+
+
+logger = logging.getLogger("services.summaries")
+
+# Upper bound on messages folded per job; a backlog is drained over later turns
+MAX_FOLD_MESSAGES = 200
+PAGE_SIZE = 32
+
+SUMMARY_PROMPT = """You maintain a running summary of a customer-support chat with a fintech assistant.
+Merge the new messages into the existing summary. Keep facts the user shared, their goals,
+open questions and what the assistant already answered (with [FAQ x] references).
+Write plain prose, third person, no more than {max_tokens} tokens."""
+
+Summarizer = Callable[[str, List[dict]], str]
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_in_flight: Set[str] = set()
+
+
+def llm_summarize(previous: str, turns: List[dict]) -> str:
+    """Fold `turns` into `previous` with the configured summary model."""
+    transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+    resp = get_openai().chat.completions.create(
+        model=settings.summary_model or settings.llm_model or "gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT.format(max_tokens=settings.summary_max_tokens)},
+            {"role": "user", "content": f"Existing summary:\n{previous or '(none)'}\n\nNew messages:\n{transcript}"},
+        ],
+        temperature=0.0,
+        max_tokens=settings.summary_max_tokens,
+    )
+    return (resp.choices[0].message.content or "").strip()
+
+
+def compact_session(db: Session, session_id, *, summarize: Summarizer = llm_summarize) -> bool:
+    """Fold older unsummarized messages into the session summary.
+
+    Keeps the newest half of the history budget verbatim so the next few
+    turns fit without compacting again. Returns True if the summary changed.
+    """
+    summary = crud.get_session_summary(db, session_id)
+    after = (summary.through_created_at, summary.through_message_id) if summary else None
+    keep = settings.history_token_budget // 2
+
+    boundary = None
+    newer = None
+    used = 0
+    cursor = None
+    while boundary is None:
+        rows = crud.list_recent_messages(db, session_id=session_id, limit=PAGE_SIZE, before=cursor, after=after)
+        for r in rows:
+            if r.state == MessageState.streaming:
+                continue
+            tokens = (r.tokens_in if r.role == Role.user else r.tokens_out) or count_tokens(r.content)
+            if used + tokens > keep:
+                # Fold whole turns: the verbatim tail must start with a question
+                last = newer if newer is not None and newer.role == Role.assistant else r
+                boundary = (last.created_at, last.id)
+                break
+            used += tokens
+            newer = r
+        if len(rows) < PAGE_SIZE:
+            break
+        cursor = (rows[-1].created_at, rows[-1].id)
+    if boundary is None:
+        return False
+
+    rows = crud.list_messages_range(
+        db, session_id=session_id, after=after, through=boundary, limit=MAX_FOLD_MESSAGES
+    )
+    if len(rows) == MAX_FOLD_MESSAGES and rows[-1].role == Role.user:
+        rows = rows[:-1]  # leave a split turn for the next pass
+    if not rows:
+        return False
+    turns = [
+        {"role": r.role.value, "content": r.content}
+        for r in rows
+        if r.role != Role.system and r.state != MessageState.streaming
+    ]
+    text = summarize(summary.content if summary else "", turns)
+    if not text:
+        return False
+    last = rows[-1]
+    crud.upsert_session_summary(
+        db,
+        session_id=session_id,
+        content=text,
+        tokens=count_tokens(text),
+        through=(last.created_at, last.id),
+    )
+    metrics.incr("summaries.compacted")
+    logger.debug("summaries: session=%s folded=%d summary_tokens=%d", session_id, len(rows), count_tokens(text))
+    return True
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summaries")
+    return _pool
+
+
+def _run(session_id, session_factory: Callable[[], Session]) -> None:
+    key = str(session_id)
+    try:
+        with session_factory() as db:
+            compact_session(db, session_id)
+    except Exception:
+        metrics.incr("summaries.failed")
+        logger.exception("summaries: compaction failed for session=%s", key)
+    finally:
+        with _pool_lock:
+            _in_flight.discard(key)
+
+
+def schedule_compaction(session_id, session_factory: Optional[Callable[[], Session]] = None) -> bool:
+    """Queue a background compaction unless one is already running for the session."""
+    key = str(session_id)
+    with _pool_lock:
+        if key in _in_flight:
+            return False
+        _in_flight.add(key)
+    if session_factory is None:
+        from ..db.base import SessionLocal
+
+        session_factory = SessionLocal
+    _get_pool().submit(_run, session_id, session_factory)
+    return True
@@ -0,0 +1,43 @@
+"""In-process counters and gauges exposed at GET `/metrics`.
+
+Counters are plain thread-safe integers keyed by dotted names
+(`answer_cache.hit`). Gauges are callables evaluated on read, used for
+components that already track their own stats.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Callable, Dict
+import threading
+
+_lock = threading.Lock()
+_counters: Dict[str, int] = defaultdict(int)
+_gauges: Dict[str, Callable[[], object]] = {}
+
+
+def incr(name: str, value: int = 1) -> None:
+    with _lock:
+        _counters[name] += value
+
+
+def get(name: str) -> int:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def register_gauge(name: str, fn: Callable[[], object]) -> None:
+    with _lock:
+        _gauges[name] = fn
+
+
+def snapshot() -> dict:
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+    out: dict = {"counters": counters, "gauges": {}}
+    for name, fn in gauges.items():
+        try:
+            out["gauges"][name] = fn()
+        except Exception as e:  # a broken gauge must not break the endpoint
+            out["gauges"][name] = {"error": str(e)}
+    return out
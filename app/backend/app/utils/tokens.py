@@ -1,9 +1,25 @@
+"""Token counting with cached tiktoken encoders.
+
+Encoders are resolved once per model and reused (including a failed
+resolution, so an offline host does not retry the BPE download on every
+call). `count_tokens_batch` counts many texts at once and hands large inputs
+to tiktoken's threaded `encode_batch`; `truncate_to_tokens` cuts text to a
+token limit. All fall back to a rough whitespace split when no encoder is
+available.
+"""
 from __future__ import annotations
+
+from functools import lru_cache
+from typing import List, Optional, Sequence
 import logging
 from ..core.config import settings
 
 logger = logging.getLogger("utils.tokens")
 
+# Inputs at least this large (total chars) are encoded on tiktoken's threads
+BATCH_MIN_CHARS = 32_000
+BATCH_THREADS = 4
+
 
 def _get_model_name() -> str:
     # Prefer the configured model; otherwise fallback to a common tokenizer
@@ -11,25 +27,52 @@ def _get_model_name() -> str:
     return settings.llm_model or "gpt-4o-mini"
 
 
-def count_tokens(text: str) -> int:
-    """Count tokens for the configured model using tiktoken.
-
-    Falls back to a rough whitespace split if tiktoken is unavailable.
-    """
+@lru_cache(maxsize=16)
+def get_encoder(model: str):
+    """Return the tiktoken encoding for `model`, or None if unavailable."""
     try:
         import tiktoken  # type: ignore
-
-        model = _get_model_name()
-        try:
-            enc = tiktoken.encoding_for_model(model)
-        except Exception:
-            # Fallback to a broadly compatible tokenizer
-            logger.debug("tokens: encoding_for_model failed for %s; using cl100k_base", model)
-            enc = tiktoken.get_encoding("cl100k_base")
-        return len(enc.encode(text or ""))
     except Exception:
-        # Very rough fallback when tiktoken is unavailable
         logger.debug("tokens: tiktoken unavailable; falling back to whitespace split")
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        # Fallback to a broadly compatible tokenizer
+        logger.debug("tokens: encoding_for_model failed for %s; using cl100k_base", model)
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        logger.warning("tokens: no tiktoken encoding available; falling back to whitespace split")
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count tokens for `model` (default: the configured model)."""
+    enc = get_encoder(model or _get_model_name())
+    if enc is None:
         return len((text or "").split())
+    return len(enc.encode(text or "", disallowed_special=()))
+
+
+def count_tokens_batch(texts: Sequence[str], model: Optional[str] = None) -> List[int]:
+    """Count tokens for each of `texts`, in order."""
+    if not texts:
+        return []
+    enc = get_encoder(model or _get_model_name())
+    if enc is None:
+        return [len((t or "").split()) for t in texts]
+    texts = [t or "" for t in texts]
+    if len(texts) > 1 and sum(len(t) for t in texts) >= BATCH_MIN_CHARS:
+        return [len(ids) for ids in enc.encode_batch(texts, num_threads=BATCH_THREADS, disallowed_special=())]
+    return [len(enc.encode(t, disallowed_special=())) for t in texts]
 
 
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Cut `text` to at most `max_tokens` tokens (whole words without tiktoken)."""
+    enc = get_encoder(model or _get_model_name())
+    if enc is None:
+        words = (text or "").split()
+        return text if len(words) <= max_tokens else " ".join(words[:max_tokens])
+    ids = enc.encode(text or "", disallowed_special=())
+    return text if len(ids) <= max_tokens else enc.decode(ids[:max_tokens])
@@ -1,4 +1,5 @@
 import pytest
+from contextlib import nullcontext
 from typing import Iterator
 from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy import event
@@ -56,17 +57,37 @@ def client(db_session: Session) -> Iterator[TestClient]:
         def retrieve_optimal(query_text: str, final_k: int = 4):  # type: ignore[unused-argument]
             return []
 
+        def retrieve(query_text: str, final_k: int = 4):  # type: ignore[unused-argument]
+            from app.rag.types import Retrieval
+            return Retrieval(docs=[])
+
+        async def aretrieve(query_text: str, final_k: int = 4):  # type: ignore[unused-argument]
+            return retrieve(query_text, final_k)
+
+        def submit_retrieve(query_text: str, final_k: int = 4):  # type: ignore[unused-argument]
+            from concurrent.futures import Future
+            fut: Future = Future()
+            fut.set_result(retrieve(query_text, final_k))
+            return fut
+
         stub.retrieve_optimal = retrieve_optimal  # type: ignore[attr-defined]
+        stub.retrieve = retrieve  # type: ignore[attr-defined]
+        stub.aretrieve = aretrieve  # type: ignore[attr-defined]
+        stub.submit_retrieve = submit_retrieve  # type: ignore[attr-defined]
         sys.modules["app.rag.retriever"] = stub
 
     from app.main import app  # import only after stubbing retriever
+    from app.services import live_answers
 
     def override_get_db() -> Iterator[Session]:
         yield db_session
 
     app.dependency_overrides[get_db] = override_get_db
+    # Live answers open their own sessions; keep them inside the SAVEPOINT too
+    live_answers.set_session_factory(lambda: nullcontext(db_session))
     c = TestClient(app)
     try:
         yield c
     finally:
+        live_answers.set_session_factory(None)
         app.dependency_overrides.pop(get_db, None)
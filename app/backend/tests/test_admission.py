@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from app.llm.admission import AdmissionController, Overloaded
+
+
+def test_grants_up_to_limit_then_queues_in_order():
+    async def _run():
+        ctl = AdmissionController(2, max_queue=2)
+        a, b = ctl.reserve(), ctl.reserve()
+        c, d = ctl.reserve(), ctl.reserve()
+        assert a.granted and b.granted and not c.granted and not d.granted
+        assert (c.position(), d.position()) == (1, 2)
+        with pytest.raises(Overloaded):
+            ctl.reserve()
+        assert ctl.saturated()
+
+        positions = []
+        waiter = asyncio.ensure_future(d.wait(on_position=positions.append, timeout_s=5))
+        await asyncio.sleep(0)
+        a.release(ttft_s=0.1)
+        await asyncio.sleep(0)
+        assert c.granted and not d.granted and d.position() == 1
+        b.release(ttft_s=0.1)
+        await waiter
+        assert d.granted and positions[0] == 2
+        return ctl.stats()
+
+    assert asyncio.run(_run()) == {"limit": 2, "in_flight": 2, "queued": 0}
+
+
+def test_queue_deadline_raises_and_frees_the_place():
+    async def _run():
+        ctl = AdmissionController(1, max_queue=1)
+        ctl.reserve()
+        waiting = ctl.reserve()
+        with pytest.raises(Overloaded):
+            await waiting.wait(timeout_s=0.01)
+        return ctl.stats()
+
+    assert asyncio.run(_run()) == {"limit": 1, "in_flight": 1, "queued": 0}
+
+
+def test_limit_adapts_to_rate_limits_and_latency():
+    async def _run():
+        ctl = AdmissionController(8, max_queue=0, min_limit=2, latency_target_s=1.0)
+        ctl.reserve().release(rate_limited=True)
+        assert int(ctl.limit) == 4
+        ctl.reserve().release(ttft_s=5.0)
+        assert ctl.limit == pytest.approx(3.6)
+        for _ in range(20):
+            ctl.reserve().release(ttft_s=0.2)
+        assert 4 <= ctl.limit <= 8
+        for _ in range(10):
+            ctl.reserve().release(rate_limited=True)
+        assert ctl.limit == 2
+
+    asyncio.run(_run())
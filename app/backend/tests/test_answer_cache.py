@@ -0,0 +1,31 @@
+import numpy as np
+
+from app.services.answer_cache import AnswerCache
+
+
+def _unit(*xs: float) -> np.ndarray:
+    v = np.asarray(xs, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_near_duplicate_hits_only_with_same_docs():
+    cache = AnswerCache(max_entries=8, threshold=0.95, ttl_s=60)
+    docs = frozenset({"faq-1", "faq-2"})
+    cache.store(_unit(1.0, 0.0), docs, "Go to Settings [FAQ 1].", [{"id": "faq-1", "rank": 1}], "v1")
+
+    hit = cache.lookup(_unit(1.0, 0.05), docs, "v1")
+    assert hit is not None and hit.answer == "Go to Settings [FAQ 1]."
+    assert cache.lookup(_unit(1.0, 0.05), frozenset({"faq-1"}), "v1") is None
+    assert cache.lookup(_unit(0.0, 1.0), docs, "v1") is None
+
+
+def test_eviction_and_corpus_invalidation():
+    cache = AnswerCache(max_entries=1, threshold=0.9, ttl_s=60)
+    docs = frozenset({"faq-1"})
+    cache.store(_unit(1.0, 0.0), docs, "first", [], "v1")
+    cache.store(_unit(0.0, 1.0), docs, "second", [], "v1")
+    assert len(cache) == 1
+    assert cache.lookup(_unit(1.0, 0.0), docs, "v1") is None
+
+    assert cache.lookup(_unit(0.0, 1.0), docs, "v2") is None
+    assert len(cache) == 0
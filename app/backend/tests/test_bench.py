@@ -0,0 +1,27 @@
+import os
+
+from app.rag import bench, embedder
+from app.rag.ingest import iter_source
+from app.rag.lexical import set_lexical_index
+from app.rag.vector_store import set_vector_store
+
+
+def test_bench_reports_quality_and_stage_latency(monkeypatch):
+    monkeypatch.setattr(bench.settings, "embedding_backend", "hashing")
+    monkeypatch.setattr(bench.settings, "retrieval_mode", "hybrid")
+    monkeypatch.setattr(embedder, "_cache", None)
+    monkeypatch.setattr(embedder, "_cache_ready", True)
+    bench.build_local_corpus(os.path.join(bench.BENCH_DIR, "faq.jsonl"))
+    try:
+        queries = list(iter_source(os.path.join(bench.BENCH_DIR, "queries.jsonl")))
+        report = bench.run(queries, k=4, repeats=2)
+    finally:
+        set_vector_store(None)
+        set_lexical_index(None)
+
+    assert report["config"]["queries"] == len(queries)
+    assert report["quality"]["recall@4"] >= 0.9
+    assert report["quality"]["multi_intent_recall@4"] >= 0.9
+    assert set(report["latency_ms"]) >= {"decompose", "embed", "query", "select", "total"}
+    assert bench.check_gates(report, min_recall=0.9, max_p95_ms=1e6) == []
+    assert bench.check_gates(report, min_mrr=1.01)
@@ -0,0 +1,239 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.rag.types import Retrieval
+from app.services import chat_service
+from app.services.chat_service import ChatService, ContextWindow
+
+
+def _chunk(content=None, usage=None):
+    choices = [] if content is None else [SimpleNamespace(delta=SimpleNamespace(content=content))]
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class _FakeCompletions:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.kwargs = None
+
+    async def create(self, **kwargs):
+        self.kwargs = kwargs
+
+        async def _stream():
+            for c in self.chunks:
+                yield c
+        return _stream()
+
+
+def _patch(monkeypatch, chunks):
+    completions = _FakeCompletions(chunks)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    async def fake_aretrieve(query_text, final_k=4):
+        return Retrieval(docs=[])
+
+    monkeypatch.setattr(chat_service, "get_async_openai", lambda: client)
+    monkeypatch.setattr(chat_service, "aretrieve", fake_aretrieve)
+    monkeypatch.setattr(chat_service, "get_answer_cache", lambda: None)
+    monkeypatch.setattr(
+        ChatService, "_load_context_window",
+        staticmethod(lambda db, sid: ContextWindow([{"role": "user", "content": "hi"}], "hi", [None], False)),
+    )
+    return completions
+
+
+def _stream(**kwargs):
+    """Run `stream_for_session` and drain it on one event loop."""
+    async def _run():
+        result = await ChatService.stream_for_session(None, "sid", **kwargs)
+        return result, [tok async for tok in result]
+    return asyncio.run(_run())
+
+
+def test_stream_takes_exact_usage_from_final_chunk(monkeypatch):
+    chunks = [_chunk("Hello"), _chunk(" there"), _chunk(usage=SimpleNamespace(prompt_tokens=321, completion_tokens=7))]
+    completions = _patch(monkeypatch, chunks)
+
+    result, tokens = _stream()
+    assert tokens == ["Hello", " there"]
+    assert completions.kwargs["stream_options"] == {"include_usage": True}
+    assert result.usage == {"tokens_in": 321, "tokens_out": 7}
+
+
+def test_stream_counts_incrementally_without_usage(monkeypatch):
+    _patch(monkeypatch, [_chunk("Hello"), _chunk(" there"), _chunk(" friend")])
+    counted = []
+
+    def counting(text):
+        counted.append(text)
+        return 1
+
+    monkeypatch.setattr(chat_service, "count_tokens", counting)
+    result, _ = _stream()
+    assert result.usage["tokens_out"] == 3
+    assert result.usage["tokens_in"] > 0
+    assert "Hello there friend" not in counted  # never re-tokenizes the whole answer
+
+
+def test_prompt_fallback_reuses_persisted_history_counts(monkeypatch):
+    _patch(monkeypatch, [_chunk("ok")])
+    history = [
+        {"role": "user", "content": "first question " * 50},
+        {"role": "assistant", "content": "long answer " * 200},
+        {"role": "user", "content": "follow up"},
+    ]
+    monkeypatch.setattr(
+        ChatService, "_load_context_window",
+        staticmethod(lambda db, sid: ContextWindow(history, "follow up", [100, 400, None], False)),
+    )
+    batches = []
+    real_batch = chat_service.count_tokens_batch
+
+    def spy(texts, model=None):
+        batches.append(list(texts))
+        return real_batch(texts, model)
+
+    monkeypatch.setattr(chat_service, "count_tokens_batch", spy)
+    result, _ = _stream()
+
+    counted = [t for batch in batches for t in batch]
+    assert history[0]["content"] not in counted and history[1]["content"] not in counted
+    assert result.usage["tokens_in"] > 500
+
+
+def test_identical_first_questions_share_one_completion(monkeypatch):
+    from app.services.generation_hub import GenerationHub, set_generation_hub
+
+    completions = _patch(monkeypatch, [_chunk("Same"), _chunk(" answer")])
+    calls = []
+    real_create = completions.create
+
+    async def counting_create(**kwargs):
+        calls.append(kwargs)
+        await asyncio.sleep(0.01)
+        return await real_create(**kwargs)
+
+    monkeypatch.setattr(completions, "create", counting_create)
+    monkeypatch.setattr(
+        ChatService, "_load_context_window",
+        staticmethod(lambda db, sid: ContextWindow([], "What is the fee?", [], True)),
+    )
+    set_generation_hub(GenerationHub())
+    try:
+        async def _run():
+            results = [await ChatService.stream_for_session(None, f"sid{i}") for i in range(3)]
+            outs = await asyncio.gather(*[_collect(r) for r in results])
+            return results, outs
+
+        async def _collect(result):
+            return [tok async for tok in result]
+
+        results, outs = asyncio.run(_run())
+    finally:
+        set_generation_hub(None)
+    assert len(calls) == 1
+    assert outs == [["Same", " answer"]] * 3
+    assert "coalesced" not in results[0].usage
+    assert results[1].usage["coalesced"] and results[2].usage["coalesced"]
+
+
+def test_inflight_retrieval_is_reused_for_the_loaded_question(monkeypatch):
+    _patch(monkeypatch, [_chunk("ok")])
+    queries = []
+
+    async def fake_aretrieve(query_text, final_k=4):
+        queries.append(query_text)
+        await asyncio.sleep(0.01)
+        return Retrieval(docs=[])
+
+    monkeypatch.setattr(chat_service, "aretrieve", fake_aretrieve)
+
+    async def _run(prefetch_query):
+        inflight = ChatService.start_retrieval(prefetch_query)
+        result = await ChatService.stream_for_session(None, "sid", inflight=inflight)
+        return [tok async for tok in result], inflight
+
+    tokens, inflight = asyncio.run(_run("hi"))
+    assert tokens == ["ok"] and queries == ["hi"] and inflight.task.done()
+
+    queries.clear()
+    _, stale = asyncio.run(_run("something else"))
+    assert queries[-1] == "hi" and stale.task.cancelled()
+
+
+def test_fast_route_escalates_to_strong_before_any_output(monkeypatch):
+    from app.core.config import settings
+    from app.rag.types import Doc
+
+    monkeypatch.setattr(settings, "llm_fast_model", "fast-model")
+    monkeypatch.setattr(settings, "llm_model", "strong-model")
+    monkeypatch.setattr(settings, "llm_fast_timeout_s", 0.05)
+    completions = _patch(monkeypatch, [_chunk("Strong"), _chunk(" answer")])
+    real_create = completions.create
+    models = []
+
+    async def create(**kwargs):
+        models.append(kwargs["model"])
+        if kwargs["model"] == "fast-model":
+            async def _stalled():
+                await asyncio.sleep(10)
+                yield _chunk("never")
+            return _stalled()
+        return await real_create(**kwargs)
+
+    async def confident_retrieve(query_text, final_k=4):
+        return Retrieval(docs=[Doc(id="faq_1", text="Reset it in settings.", score=0.95)], clauses=["hi"])
+
+    monkeypatch.setattr(completions, "create", create)
+    monkeypatch.setattr(chat_service, "aretrieve", confident_retrieve)
+    result, tokens = _stream()
+    assert models == ["fast-model", "strong-model"]
+    assert tokens == ["Strong", " answer"] and result.route == "strong"
+
+
+def test_fast_route_rate_limit_still_backs_off_admission(monkeypatch):
+    from app.core.config import settings
+    from app.llm.admission import AdmissionController
+    from app.rag.types import Doc
+
+    monkeypatch.setattr(settings, "llm_fast_model", "fast-model")
+    monkeypatch.setattr(settings, "llm_model", "strong-model")
+    completions = _patch(monkeypatch, [_chunk("Strong")])
+    real_create = completions.create
+    controller = AdmissionController(8, max_queue=4)
+
+    class _RateLimited(Exception):
+        status_code = 429
+
+    async def create(**kwargs):
+        if kwargs["model"] == "fast-model":
+            raise _RateLimited("slow down")
+        return await real_create(**kwargs)
+
+    async def confident_retrieve(query_text, final_k=4):
+        return Retrieval(docs=[Doc(id="faq_1", text="Reset it in settings.", score=0.95)], clauses=["hi"])
+
+    monkeypatch.setattr(completions, "create", create)
+    monkeypatch.setattr(chat_service, "aretrieve", confident_retrieve)
+    monkeypatch.setattr(chat_service, "get_admission", lambda: controller)
+    result, tokens = _stream()
+    assert tokens == ["Strong"] and result.route == "strong"
+    assert controller.stats() == {"limit": 4, "in_flight": 0, "queued": 0}
+
+
+def test_router_and_prompt_fallback_reuse_the_persisted_question_count(monkeypatch):
+    _patch(monkeypatch, [_chunk("ok")])
+    monkeypatch.setattr(
+        ChatService, "_load_context_window",
+        staticmethod(lambda db, sid: ContextWindow([], "what is the fee?", [], True, question_tokens=7)),
+    )
+    counted, signals = [], []
+    real_choose = chat_service.choose_route
+    monkeypatch.setattr(chat_service, "count_tokens", lambda text, model=None: counted.append(text) or 1)
+    monkeypatch.setattr(chat_service, "count_tokens_batch", lambda texts, model=None: [counted.extend(texts) or 1] * len(texts))
+    monkeypatch.setattr(chat_service, "choose_route", lambda s: signals.append(s) or real_choose(s))
+    result, _ = _stream()
+
+    assert signals[0].prompt_tokens == 7
+    assert "what is the fee?" not in counted
+    assert result.usage["tokens_in"] == 7 + 1  # question's stored count + system prompt
@@ -15,8 +15,8 @@ def test_chat_stream_monkeypatched(client, monkeypatch):
     # Monkeypatch ChatService.stream_for_session to avoid external calls
     from app.services.chat_service import ChatService, StreamResult
 
-    def fake_stream_for_session(db, sid):  # sid is UUID
-        def _iter():
+    async def fake_stream_for_session(db, sid, inflight=None):  # sid is UUID
+        async def _iter():
             yield "Hello, "
             yield "world!"
         # Minimal usage and no citations
@@ -36,3 +36,167 @@ def test_chat_stream_monkeypatched(client, monkeypatch):
     assert "world!" in body
     assert "event: done" in body
 
+
+
+def test_chat_stream_persists_assistant_after_async_stream(client, monkeypatch):
+    client.cookies.set("anon_id", "pytest_sse_async")
+    session_id = client.post("/sessions", json={"title": "async"}).json()["id"]
+
+    from fastapi.concurrency import run_in_threadpool
+    from app.services.chat_service import ChatService, StreamResult
+
+    completed = []
+
+    async def fake_stream_for_session(db, sid, inflight=None):
+        window = await run_in_threadpool(ChatService._load_context_window, db, sid)
+        assert window.question == "Hi there" and window.history == [] and window.first_turn
+
+        async def _iter():
+            yield "Async "
+            yield "answer."
+        return StreamResult(_iter(), citations=[], tokens_in=3, on_complete=completed.append)
+
+    monkeypatch.setattr(ChatService, "stream_for_session", staticmethod(fake_stream_for_session))
+    r = client.post("/chat", json={"session_id": session_id, "message": "Hi there"})
+    assert r.status_code == 200 and "event: done" in r.text
+    assert len(completed) == 1 and completed[0].usage["tokens_out"] > 0
+
+    messages = client.get(f"/sessions/{session_id}/messages").json()
+    assert sorted(m["content"] for m in messages) == ["Async answer.", "Hi there"]
+
+
+def test_chat_sheds_with_503_when_llm_queue_is_full(client, monkeypatch):
+    client.cookies.set("anon_id", "pytest_sse_shed")
+    from app.api import chat as chat_api
+
+    class _Full:
+        def saturated(self):
+            return True
+
+    monkeypatch.setattr(chat_api, "get_admission", lambda: _Full())
+    r = client.post("/chat", json={"message": "Hi"})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+
+
+def test_chat_stream_reports_queue_position(client, monkeypatch):
+    client.cookies.set("anon_id", "pytest_sse_queued")
+    from app.services.chat_service import ChatService, StreamResult
+
+    async def fake_stream_for_session(db, sid, inflight=None):
+        async def _queued():
+            yield 2
+            yield 1
+
+        async def _iter():
+            yield "Done waiting."
+        return StreamResult(_iter(), citations=[], queued=_queued())
+
+    monkeypatch.setattr(ChatService, "stream_for_session", staticmethod(fake_stream_for_session))
+    body = client.post("/chat", json={"message": "Hi"}).text
+    assert body.index('event: queued\ndata: {"position": 2}') < body.index("event: token")
+    assert '"position": 1' in body
+
+
+def test_chat_frames_carry_ids_and_finished_answer_resumes_from_db(client, monkeypatch):
+    client.cookies.set("anon_id", "pytest_sse_resume")
+    from app.services.chat_service import ChatService, StreamResult
+
+    async def fake_stream_for_session(db, sid, inflight=None):
+        async def _iter():
+            yield "Resumable "
+            yield "answer."
+        return StreamResult(_iter(), citations=[])
+
+    monkeypatch.setattr(ChatService, "stream_for_session", staticmethod(fake_stream_for_session))
+    body = client.post("/chat", json={"message": "Hi"}).text
+    ids = [line[4:] for line in body.splitlines() if line.startswith("id: ")]
+    message_id = ids[0].split(":")[0]
+    assert ids[0] == f"{message_id}:0" and ids[-1] == f"{message_id}:{len('Resumable answer.')}"
+
+    r = client.get(f"/chat/stream/{message_id}", headers={"Last-Event-ID": f"{message_id}:10"})
+    assert r.status_code == 200
+    assert '"token": "answer."' in r.text and "Resumable" not in r.text
+    assert '"state": "complete"' in r.text
+
+    client.cookies.set("anon_id", "someone_else")
+    assert client.get(f"/chat/stream/{message_id}").status_code == 403
+
+
+def test_chat_503_from_reserve_drops_the_stored_question(client, monkeypatch):
+    client.cookies.set("anon_id", "pytest_sse_shed_late")
+    from app.llm.admission import Overloaded
+    from app.services.chat_service import ChatService
+
+    async def overloaded_stream_for_session(db, sid, inflight=None):
+        raise Overloaded("LLM capacity busy; try again shortly", retry_after=2)
+
+    monkeypatch.setattr(ChatService, "stream_for_session", staticmethod(overloaded_stream_for_session))
+    session_id = client.post("/sessions", json={"title": "shed"}).json()["id"]
+    r = client.post("/chat", json={"session_id": session_id, "message": "Hi"})
+    assert r.status_code == 503 and r.headers["Retry-After"] == "2"
+    assert client.get(f"/sessions/{session_id}/messages").json() == []
+
+
+def test_resume_follows_live_answer_without_reading_the_row(client, monkeypatch):
+    client.cookies.set("anon_id", "pytest_sse_resume_live")
+    import uuid
+
+    from app.api import chat as chat_api
+    from app.services import live_answers
+    from app.services.chat_service import StreamResult
+
+    session_id = client.post("/sessions", json={"title": "live"}).json()["id"]
+    live = live_answers.LiveAnswer(uuid.uuid4(), uuid.UUID(session_id), StreamResult(["Live ", "answer."], citations=[]))
+
+    async def _finalized():
+        live.state = live_answers.MessageState.complete
+
+    live.persisted = _finalized()
+    monkeypatch.setitem(live_answers._live, live.message_id, live)
+
+    def stale_row(*args, **kwargs):
+        raise AssertionError("row read while the answer is live")
+
+    monkeypatch.setattr(chat_api.crud, "get_message", stale_row)
+    r = client.get(f"/chat/stream/{live.message_id}", headers={"Last-Event-ID": f"{live.message_id}:5"})
+    assert r.status_code == 200
+    assert '"token": "answer."' in r.text and '"state": "complete"' in r.text
+
+
+def test_resume_offsets_match_stored_text_with_leading_whitespace(client, monkeypatch):
+    client.cookies.set("anon_id", "pytest_sse_resume_ws")
+    from app.services.chat_service import ChatService, StreamResult
+
+    async def fake_stream_for_session(db, sid, inflight=None):
+        async def _iter():
+            yield "\n"
+            yield "Hello "
+            yield "world."
+        return StreamResult(_iter(), citations=[])
+
+    monkeypatch.setattr(ChatService, "stream_for_session", staticmethod(fake_stream_for_session))
+    body = client.post("/chat", json={"message": "Hi"}).text
+    message_id = next(line[4:] for line in body.splitlines() if line.startswith("id: ")).split(":")[0]
+
+    # The client saw "\nHello " (7 chars) before the drop
+    r = client.get(f"/chat/stream/{message_id}", headers={"Last-Event-ID": f"{message_id}:7"})
+    assert '"token": "world."' in r.text and f'id: {message_id}:13' in r.text
+
+
+def test_queue_timeout_before_any_token_drops_the_question(client, monkeypatch):
+    client.cookies.set("anon_id", "pytest_sse_queue_timeout")
+    from app.llm.admission import Overloaded
+    from app.services.chat_service import ChatService, StreamResult
+
+    async def timed_out_stream_for_session(db, sid, inflight=None):
+        async def _iter():
+            raise Overloaded("LLM capacity busy; timed out in queue", retry_after=30)
+            yield  # pragma: no cover
+        return StreamResult(_iter(), citations=[])
+
+    monkeypatch.setattr(ChatService, "stream_for_session", staticmethod(timed_out_stream_for_session))
+    session_id = client.post("/sessions", json={"title": "timeout"}).json()["id"]
+    body = client.post("/chat", json={"session_id": session_id, "message": "Hi"}).text
+    assert "event: error" in body and "timed out in queue" in body
+    assert client.get(f"/sessions/{session_id}/messages").json() == []
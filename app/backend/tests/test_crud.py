@@ -18,3 +18,47 @@ def test_get_or_create_anon_session_idempotent(db_session):
     first = crud.get_or_create_anon_session(db_session, anon_id="same_id")
     second = crud.get_or_create_anon_session(db_session, anon_id="same_id")
     assert first.id == second.id
+
+
+def _conversation(db_session, n_turns, answer_tokens):
+    from datetime import datetime, timedelta, timezone
+
+    sess = crud.get_or_create_anon_session(db_session, anon_id="pytest_history")
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    t = 0
+    for i in range(n_turns):
+        for role, content, tin, tout in (
+            (Role.user, f"question {i}", 5, 0),
+            (Role.assistant, f"answer {i}", 0, answer_tokens),
+        ):
+            msg = crud.append_message(db_session, sess.id, role, content, tokens_in=tin, tokens_out=tout)
+            msg.created_at = base + timedelta(seconds=t)  # one transaction in tests: now() is constant
+            t += 1
+    crud.append_message(db_session, sess.id, Role.user, "latest question", tokens_in=3).created_at = base + timedelta(seconds=t)
+    db_session.commit()
+    return sess
+
+
+def test_list_recent_messages_keyset_pages(db_session):
+    sess = _conversation(db_session, n_turns=5, answer_tokens=10)
+    first = crud.list_recent_messages(db_session, session_id=sess.id, limit=4)
+    second = crud.list_recent_messages(
+        db_session, session_id=sess.id, limit=4, before=(first[-1].created_at, first[-1].id)
+    )
+    contents = [r.content for r in first + second]
+    assert contents[:3] == ["latest question", "answer 4", "question 4"]
+    assert len(set(contents)) == 8 and contents[-1] == "answer 1"
+
+
+def test_history_window_packs_newest_turns_within_budget(db_session, monkeypatch):
+    from app.services.chat_service import ChatService
+
+    sess = _conversation(db_session, n_turns=30, answer_tokens=45)
+    monkeypatch.setattr(ChatService, "HISTORY_PAGE_SIZE", 7)
+    monkeypatch.setattr("app.services.chat_service.settings.history_token_budget", 200)
+    window = ChatService._build_context_window(db_session, sess.id)
+
+    assert window.question == "latest question" and not window.first_turn
+    assert window.history[0] == {"role": "user", "content": "question 26"}
+    assert window.history[-1] == {"role": "assistant", "content": "answer 29"}
+    assert sum(window.counts) <= 200 and len(window.history) == 8
@@ -0,0 +1,46 @@
+from app.rag import embedder
+from app.rag.embed_cache import EmbeddingCache, SqliteEmbeddingStore, cache_key
+
+
+def test_cache_key_uses_normalized_text():
+    assert cache_key("m", "Reset   Password?") == cache_key("m", "reset password")
+
+
+def test_lru_eviction_and_ttl():
+    cache = EmbeddingCache(max_entries=2, ttl_s=60)
+    cache.put_many([("a", [1.0]), ("b", [2.0])])
+    cache.get_many(["a"])  # touch "a" so "b" is least recently used
+    cache.put_many([("c", [3.0])])
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    assert cache.stats()["evictions"] == 1
+
+    expired = EmbeddingCache(max_entries=2, ttl_s=-1)
+    expired.put_many([("a", [1.0])])
+    assert expired.get_many(["a"]) == {}
+
+
+def test_persistent_tier_survives_new_cache(tmp_path):
+    path = str(tmp_path / "emb.sqlite")
+    EmbeddingCache(8, 60, SqliteEmbeddingStore(path)).put_many([("k", [0.5, 0.25])])
+    warm = EmbeddingCache(8, 60, SqliteEmbeddingStore(path))
+    assert warm.get_many(["k"]) == {"k": [0.5, 0.25]}
+    assert warm.stats()["persistent_hits"] == 1
+
+
+def test_embed_queries_only_embeds_misses(monkeypatch):
+    calls = []
+
+    def fake_uncached(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 0.0] for t in texts]
+
+    monkeypatch.setattr(embedder, "_embed_uncached", fake_uncached)
+    monkeypatch.setattr(embedder, "_cache", EmbeddingCache(16, 60))
+    monkeypatch.setattr(embedder, "_cache_ready", True)
+
+    first = embedder.embed_queries(["reset password", "ach fees"])
+    second = embedder.embed_queries(["Reset password!", "wire limits", "wire limits"])
+
+    assert calls == [["reset password", "ach fees"], ["wire limits"]]
+    assert second[0] == first[0]
+    assert second[1] == second[2]
@@ -0,0 +1,136 @@
+import asyncio
+
+from app.services.generation_hub import GenerationHub, generation_key
+
+
+def _factory(tokens, calls, delay=0.0, usage=None, error=None):
+    async def factory(report_usage):
+        calls.append(1)
+
+        async def _stream():
+            for tok in tokens:
+                await asyncio.sleep(delay)
+                yield tok
+            if error is not None:
+                raise error
+            if usage is not None:
+                report_usage(*usage)
+        return _stream()
+    return factory
+
+
+async def _read(gen):
+    return [tok async for tok in gen.subscribe()]
+
+
+def test_key_normalizes_question_and_doc_order():
+    assert generation_key("What  is the FEE?", ["b", "a"], True) == generation_key("what is the fee?", ["a", "b"], True)
+    assert generation_key("what is the fee?", ["a"], True) != generation_key("what is the fee?", ["a"], False)
+    assert generation_key("what is the fee?", ["a"], True) != generation_key("what is the fee?", ["c"], True)
+
+
+def test_identical_keys_share_one_upstream_and_late_joiner_gets_prefix():
+    hub = GenerationHub()
+    calls = []
+
+    async def _run():
+        factory = _factory(["a", "b", "c", "d"], calls, delay=0.01, usage=(10, 4))
+        first, lead = hub.join("k", factory)
+        task = asyncio.ensure_future(_read(first))
+        await asyncio.sleep(0.025)  # a couple of chunks are already buffered
+        second, lead2 = hub.join("k", factory)
+        assert second is first and lead and not lead2
+        return await task, await _read(second), first
+
+    out1, out2, gen = asyncio.run(_run())
+    assert out1 == out2 == ["a", "b", "c", "d"]
+    assert calls == [1]
+    assert gen.usage == (10, 4)
+    assert len(hub) == 0  # finished generations leave the hub
+
+
+def test_private_generations_are_never_shared():
+    hub = GenerationHub()
+    calls = []
+
+    async def _run():
+        a, _ = hub.join(None, _factory(["x"], calls))
+        b, _ = hub.join(None, _factory(["x"], calls))
+        assert a is not b
+        return await _read(a), await _read(b)
+
+    assert asyncio.run(_run()) == (["x"], ["x"])
+    assert calls == [1, 1]
+
+
+def test_upstream_error_reaches_every_subscriber():
+    hub = GenerationHub()
+
+    async def _run():
+        gen, _ = hub.join("k", _factory(["a"], [], delay=0.01, error=RuntimeError("boom")))
+        return await asyncio.gather(_read(gen), _read(gen), return_exceptions=True)
+
+    results = asyncio.run(_run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert len(hub) == 0
+
+
+def test_subscribe_from_character_offset():
+    hub = GenerationHub()
+
+    async def _run():
+        gen, _ = hub.join(None, _factory(["abc", "def", "g"], []))
+        return [tok async for tok in gen.subscribe(offset=4)]
+
+    assert asyncio.run(_run()) == ["ef", "g"]
+
+
+def test_shared_upstream_is_cancelled_only_when_every_joiner_left():
+    hub = GenerationHub()
+
+    async def _run():
+        factory = _factory([f"t{i}" for i in range(100)], [], delay=0.01)
+        gen, _ = hub.join("k", factory)
+        hub.join("k", factory)
+        a, b = gen.subscribe(), gen.subscribe()
+        await a.__anext__()
+        await b.__anext__()
+        await a.aclose()
+        await asyncio.sleep(0.02)
+        still_running = not gen.cancelled
+        await b.aclose()
+        await asyncio.sleep(0)
+        return still_running, gen
+
+    still_running, gen = asyncio.run(_run())
+    assert still_running and gen.cancelled and gen.done
+    assert len(hub) == 0
+
+
+class _RecordingTicket:
+    granted = True
+
+    def __init__(self):
+        self.released = []
+
+    async def wait(self, on_position=None):
+        return None
+
+    def release(self, **kw):
+        self.released.append(kw)
+
+
+def test_cancelled_generation_releases_its_slot_without_latency_signal():
+    ticket = _RecordingTicket()
+
+    async def _run():
+        gen, _ = GenerationHub().join("k", _factory(["a"] * 50, [], delay=0.01), admit=lambda: ticket)
+        reader = gen.subscribe()
+        assert await reader.__anext__() == "a"  # past the first token
+        await reader.aclose()  # last reader gone: cancelled
+        await asyncio.sleep(0)
+        return gen
+
+    gen = asyncio.run(_run())
+    assert gen.cancelled
+    assert ticket.released == [{"ttft_s": None, "rate_limited": False}]
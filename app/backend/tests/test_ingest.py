@@ -0,0 +1,63 @@
+import json
+
+from app.rag.ingest import JsonlSink, ingest, iter_chunks, split_text
+
+
+ROWS = [
+    {"id": f"faq-{i}", "question": f"Question {i}?", "answer": f"Answer number {i}.", "category": "General"}
+    for i in range(1, 11)
+]
+
+
+def _embed_counter(calls):
+    def embed(texts):
+        calls.append(len(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+    return embed
+
+
+def test_reindex_embeds_only_changed_and_prunes_stale(tmp_path):
+    path = str(tmp_path / "index.jsonl")
+    calls = []
+
+    sink = JsonlSink(path)
+    stats, manifest = ingest(iter_chunks(ROWS), sink, {}, embed_fn=_embed_counter(calls), embed_batch=4, upsert_batch=3)
+    sink.close()
+    assert stats.embedded == 10 and calls == [4, 4, 2]
+
+    changed = [dict(r) for r in ROWS[:9]]
+    changed[0]["answer"] = "A new answer."
+    calls.clear()
+    sink = JsonlSink(path)
+    stats, manifest = ingest(iter_chunks(changed), sink, manifest, embed_fn=_embed_counter(calls))
+    sink.close()
+
+    assert calls == [1]
+    assert (stats.unchanged, stats.deleted) == (8, 1)
+    with open(path) as fh:
+        records = {r["id"]: r for r in map(json.loads, fh)}
+    assert set(records) == set(manifest) and "faq-10" not in records
+    assert records["faq-1"]["text"] == "Question 1?\nA new answer."
+
+
+def test_split_text_respects_max_chars():
+    text = "First paragraph here.\n\nSecond one. It has two sentences." + " More." * 40
+    chunks = split_text(text, 60)
+    assert len(chunks) > 1
+    assert all(len(c) <= 60 for c in chunks)
+
+
+def test_default_manifest_is_per_destination(tmp_path, monkeypatch):
+    from app.rag import embedder, ingest as ingest_mod
+
+    monkeypatch.setattr(embedder, "embed_documents", _embed_counter([]))
+    source = tmp_path / "faqs.jsonl"
+    source.write_text("\n".join(json.dumps(r) for r in ROWS))
+    first, second = tmp_path / "a.jsonl", tmp_path / "b.jsonl"
+    assert ingest_mod.main([str(source), "--target", "local", "--out", str(first)]) == 0
+    assert ingest_mod.main([str(source), "--target", "local", "--out", str(second)]) == 0
+    assert len(second.read_text().splitlines()) == len(ROWS)
+    assert (tmp_path / "b.jsonl.manifest.json").exists()
+    assert ingest_mod.default_manifest_path("pinecone", str(source)) != ingest_mod.default_manifest_path(
+        "local", str(source), str(first)
+    )
@@ -0,0 +1,200 @@
+import asyncio
+from contextlib import nullcontext
+
+import pytest
+
+from app.core.config import settings
+from app.db import crud
+from app.db.models import MessageState, Role
+from app.services import live_answers
+from app.services.chat_service import StreamResult
+
+
+def _result(tokens, delay=0.0, error=None):
+    async def _iter():
+        for tok in tokens:
+            await asyncio.sleep(delay)
+            yield tok
+        if error is not None:
+            raise error
+    return StreamResult(_iter(), citations=[{"id": "faq_1", "rank": 1, "category": None}], tokens_in=5)
+
+
+@pytest.fixture(autouse=True)
+def _own_sessions(db_session):
+    # Live answers write through their own sessions; route them into the test's
+    live_answers.set_session_factory(lambda: nullcontext(db_session))
+    yield
+    live_answers.set_session_factory(None)
+
+
+def test_answer_is_flushed_while_streaming_and_resumable(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "stream_persist_ms", 1)
+    sess = crud.get_or_create_anon_session(db_session, anon_id="pytest_live")
+    seen = []
+
+    async def _run():
+        live = await live_answers.start_live_answer(sess.id, _result(["Hello", " there", ", friend."], delay=0.01))
+        assert live_answers.get_live_answer(live.message_id) is live
+        first = [tok async for tok in live.generation.subscribe()][:1]
+        # A reconnect mid-answer replays from its character offset
+        resumed = "".join([tok async for tok in live.generation.subscribe(offset=3)])
+        await live.persisted
+        seen.append(crud.get_message(db_session, live.message_id).state)
+        return live, first, resumed
+
+    flushes = []
+    real_update = crud.update_message
+
+    def spy(db, message_id, **kw):
+        flushes.append(kw)
+        return real_update(db, message_id, **kw)
+
+    monkeypatch.setattr(crud, "update_message", spy)
+    live, first, resumed = asyncio.run(_run())
+
+    assert first == ["Hello"] and resumed == "lo there, friend."
+    assert any("state" not in f for f in flushes)  # intermediate flushes carry only content
+    assert flushes[-1]["state"] == MessageState.complete
+    msg = crud.get_message(db_session, live.message_id)
+    assert msg.content == "Hello there, friend." and msg.state == MessageState.complete
+    assert msg.role == Role.assistant and msg.tokens_in == 5
+    assert live_answers.get_live_answer(live.message_id) is None
+
+
+def test_failed_generation_keeps_partial_text(db_session):
+    sess = crud.get_or_create_anon_session(db_session, anon_id="pytest_live_fail")
+
+    async def _run():
+        live = await live_answers.start_live_answer(sess.id, _result(["Partial"], error=RuntimeError("upstream")))
+        await live.persisted
+        return live
+
+    live = asyncio.run(_run())
+    msg = crud.get_message(db_session, live.message_id)
+    assert msg.content == "Partial"
+    assert msg.state == MessageState.interrupted
+
+
+def test_empty_answer_leaves_no_row(db_session):
+    sess = crud.get_or_create_anon_session(db_session, anon_id="pytest_live_empty")
+
+    async def _run():
+        live = await live_answers.start_live_answer(sess.id, _result([]))
+        await live.persisted
+        return live
+
+    assert crud.get_message(db_session, asyncio.run(_run()).message_id) is None
+
+
+def _hub_backed_result(closed, n=50):
+    """StreamResult over a shared hub generation whose upstream records being closed."""
+    from app.services.generation_hub import GenerationHub
+
+    async def factory(report_usage):
+        async def _stream():
+            try:
+                for i in range(n):
+                    await asyncio.sleep(0.01)
+                    yield f"tok{i} "
+            finally:
+                closed.append(True)
+        return _stream()
+
+    gen, _ = GenerationHub().join("k", factory)
+    return StreamResult(gen.subscribe(), citations=[]), gen
+
+
+def test_last_reader_leaving_cancels_upstream_and_keeps_partial(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "stream_resume_grace_s", 0)
+    sess = crud.get_or_create_anon_session(db_session, anon_id="pytest_live_cancel")
+    closed = []
+
+    async def _run():
+        result, upstream = _hub_backed_result(closed)
+        live = await live_answers.start_live_answer(sess.id, result)
+        live.attach()
+        reader = live.generation.subscribe()
+        assert (await reader.__anext__()).startswith("tok0")
+        await reader.aclose()
+        live.detach()  # tab closed
+        await live.persisted
+        return live, upstream
+
+    live, upstream = asyncio.run(_run())
+    assert closed == [True] and upstream.cancelled
+    msg = crud.get_message(db_session, live.message_id)
+    assert msg.state == MessageState.interrupted
+    assert msg.content.startswith("tok0") and msg.content.endswith(" ")  # exactly what was streamed
+    assert msg.tokens_out > 0
+
+
+def test_reader_returning_within_grace_keeps_generation(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "stream_resume_grace_s", 0.05)
+    sess = crud.get_or_create_anon_session(db_session, anon_id="pytest_live_grace")
+    closed = []
+
+    async def _run():
+        result, _ = _hub_backed_result(closed, n=10)
+        live = await live_answers.start_live_answer(sess.id, result)
+        live.attach()
+        live.detach()
+        await asyncio.sleep(0.01)
+        live.attach()  # reconnected
+        text = "".join([tok async for tok in live.generation.subscribe(offset=0)])
+        await live.persisted
+        return live, text
+
+    live, text = asyncio.run(_run())
+    assert not live.cancelled and text.count("tok") == 10
+    assert crud.get_message(db_session, live.message_id).state == MessageState.complete
+
+
+def test_writes_use_short_lived_sessions_of_their_own(db_session):
+    sess = crud.get_or_create_anon_session(db_session, anon_id="pytest_live_sessions")
+    opened = []
+
+    class _Tracked:
+        def __enter__(self):
+            opened.append("open")
+            return db_session
+
+        def __exit__(self, *exc):
+            opened.append("close")
+
+    live_answers.set_session_factory(_Tracked)
+
+    async def _run():
+        live = await live_answers.start_live_answer(sess.id, _result(["Own session."]))
+        await live.persisted
+        return live
+
+    live = asyncio.run(_run())
+    # Row insert and final update, each in a session closed right after
+    assert opened == ["open", "close", "open", "close"]
+    assert crud.get_message(db_session, live.message_id).content == "Own session."
+
+
+def test_reconnect_restarts_the_grace_period(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "stream_resume_grace_s", 0.05)
+    sess = crud.get_or_create_anon_session(db_session, anon_id="pytest_live_regrace")
+    closed = []
+
+    async def _run():
+        result, _ = _hub_backed_result(closed, n=10)
+        live = await live_answers.start_live_answer(sess.id, result)
+        live.attach()
+        live.detach()
+        await asyncio.sleep(0.03)
+        live.attach()  # reconnected, then dropped again
+        live.detach()
+        # Past the first drop's deadline but inside the second's
+        await asyncio.sleep(0.03)
+        cancelled_early = live.cancelled
+        live.attach()
+        await live.persisted
+        return live, cancelled_early
+
+    live, cancelled_early = asyncio.run(_run())
+    assert not cancelled_early and not live.cancelled
+    assert crud.get_message(db_session, live.message_id).state == MessageState.complete
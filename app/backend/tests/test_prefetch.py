@@ -0,0 +1,145 @@
+import asyncio
+import uuid
+from concurrent.futures import Future
+
+import numpy as np
+
+from app.rag.types import Doc, Retrieval
+from app.services import chat_service, prefetch
+from app.services.chat_service import ChatService
+from app.services.prefetch import PrefetchCache, owner_key
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(clock, submitted, **kw):
+    def submit(q):
+        submitted.append(q)
+        fut = Future()
+        fut.set_result(Retrieval(docs=[Doc(id="faq_1", text=q, score=0.9)]))
+        return fut
+
+    opts = dict(ttl_s=30.0, debounce_s=0.3, per_minute=3, match_ratio=0.9)
+    opts.update(kw)
+    return PrefetchCache(submit, clock=clock, **opts)
+
+
+def test_debounce_rate_limit_and_duplicates():
+    clock, submitted = _Clock(), []
+    cache = _cache(clock, submitted)
+    assert cache.prefetch("u:s", "hi") == "ignored"
+    assert cache.prefetch("u:s", "how do I reset my") == "started"
+    clock.now += 0.1
+    assert cache.prefetch("u:s", "how do I reset my pass") == "debounced"
+    assert cache.prefetch("other:s", "how do I reset my pass") == "started"  # per owner
+    clock.now += 1
+    assert cache.prefetch("u:s", "How do I reset my!") == "cached"
+    assert cache.prefetch("u:s", "how do I reset my password") == "started"
+    clock.now += 1
+    assert cache.prefetch("u:s", "how do I reset my password now") == "started"
+    clock.now += 1
+    assert cache.prefetch("u:s", "how do I reset my password today") == "limited"
+    clock.now += 61
+    assert cache.prefetch("u:s", "how do I reset my password today") == "started"
+    assert len(submitted) == 5
+
+
+def test_take_matches_near_identical_text_once_within_ttl():
+    clock, submitted = _Clock(), []
+    cache = _cache(clock, submitted)
+    cache.prefetch("u:s", "how do I reset my password")
+    assert cache.take("u:s", "How do I reset my password?") is not None
+    assert cache.take("u:s", "How do I reset my password?") is None  # consumed
+
+    cache.prefetch("u:s2", "how do I reset my passwor")
+    assert cache.take("u:s2", "how do I reset my password") is not None
+    clock.now += 1
+    cache.prefetch("u:s2", "what are the wire transfer fees")
+    assert cache.take("u:s2", "how do I close my account") is None
+
+    clock.now += 1
+    cache.prefetch("u:s3", "what are the wire transfer fees")
+    clock.now += 31
+    assert cache.take("u:s3", "what are the wire transfer fees") is None
+
+
+def test_select_context_uses_prefetched_retrieval(monkeypatch):
+    clock, submitted = _Clock(), []
+    cache = _cache(clock, submitted)
+    monkeypatch.setattr(chat_service, "get_prefetch_cache", lambda: cache)
+    called = []
+
+    async def fake_aretrieve(query_text, final_k=4):
+        called.append(query_text)
+        return Retrieval(docs=[])
+
+    monkeypatch.setattr(chat_service, "aretrieve", fake_aretrieve)
+    owner = owner_key({"anon_id": "a1"}, "sess")
+    cache.prefetch(owner, "how do I reset my password")
+
+    hit = asyncio.run(ChatService._select_context("How do I reset my password?", owner))
+    assert [d.id for d in hit.docs] == ["faq_1"] and called == []
+    miss = asyncio.run(ChatService._select_context("How do I reset my password?", owner))
+    assert miss.docs == [] and called == ["How do I reset my password?"]
+
+
+def test_near_match_draft_never_reaches_the_answer_cache(monkeypatch):
+    from app.services.answer_cache import AnswerCache
+
+    def submit(q):
+        fut = Future()
+        fut.set_result(Retrieval(docs=[Doc(id="faq_1", text="Wire fees", score=0.9)], clauses=[q], clause_vectors=[[1.0, 0.0]]))
+        return fut
+
+    cache = PrefetchCache(submit, ttl_s=30.0, debounce_s=0.0, per_minute=10, match_ratio=0.9, clock=_Clock())
+    answers = AnswerCache(max_entries=8, threshold=0.95, ttl_s=60)
+    answers.store(np.asarray([1.0, 0.0], dtype=np.float32), frozenset({"faq_1"}), "Wire transfers cost $25.", [], "v1")
+    monkeypatch.setattr(chat_service, "get_prefetch_cache", lambda: cache)
+    monkeypatch.setattr(chat_service, "get_answer_cache", lambda: answers)
+    monkeypatch.setattr(chat_service, "corpus_version", lambda: "v1")
+
+    # 0.91 similar, but a different question: docs are reused, the cache is not
+    cache.prefetch("u:s", "what is the fee for wire transfers")
+    near = asyncio.run(ChatService._select_context("what is the fee for card transfers", "u:s"))
+    assert [d.id for d in near.docs] == ["faq_1"] and near.query_vector() is None
+    assert ChatService._cached_answer(True, near) == (None, None)
+
+    cache.prefetch("u:s", "what is the fee for wire transfers")
+    exact = asyncio.run(ChatService._select_context("What is the fee for wire transfers?", "u:s"))
+    replay, _ = ChatService._cached_answer(True, exact)
+    assert replay is not None and list(replay) == ["Wire ", "transfers ", "cost ", "$25."]
+
+
+def test_prefetch_endpoint(client, monkeypatch):
+    clock, submitted = _Clock(), []
+    cache = _cache(clock, submitted, per_minute=1)
+    monkeypatch.setattr(prefetch, "_cache", cache)
+    client.cookies.set("anon_id", "pytest_prefetch")
+
+    r = client.post("/chat/prefetch", json={"draft": "how do I reset my password"})
+    assert r.status_code == 202 and r.json() == {"status": "started"}
+    clock.now += 1
+    r = client.post("/chat/prefetch", json={"draft": "how do I reset my password now"})
+    assert r.status_code == 429
+    # Rotating session ids doesn't buy more retrievals: the cap is per identity
+    r = client.post("/chat/prefetch", json={"session_id": str(uuid.uuid4()), "draft": "how do I reset my password now"})
+    assert r.status_code == 429
+    assert submitted == ["how do I reset my password"]
+
+
+def test_owner_cap_evicts_oldest_fresh_entries(monkeypatch):
+    monkeypatch.setattr(prefetch, "MAX_OWNERS", 3)
+    clock, submitted = _Clock(), []
+    cache = _cache(clock, submitted)
+    for i in range(6):
+        clock.now += 1.0  # all well inside the TTL
+        assert cache.prefetch(f"owner-{i}", "how do I reset my card pin") == "started"
+    assert len(cache) <= 3 and len(cache._accepted) <= 3
+    assert cache.take("owner-0", "how do I reset my card pin") is None
+    assert cache.take("owner-5", "how do I reset my card pin") is not None
@@ -0,0 +1,63 @@
+from app.rag import prompt
+from app.rag.prompt import assemble_context, build_messages
+from app.rag.types import Doc
+
+
+def _doc(i, score, text=None, vector=None):
+    return Doc(id=f"faq-{i}", text=text or f"Answer number {i}.", score=score, category="General", vector=vector)
+
+
+def test_cuts_at_score_gap_but_keeps_min_docs():
+    docs = [_doc(1, 0.95), _doc(2, 0.90), _doc(3, 0.30), _doc(4, 0.28)]
+    kept, ctx, _ = assemble_context(docs, budget_tokens=1000, max_doc_tokens=100)
+    assert [d.id for d in kept] == ["faq-1", "faq-2"]
+    assert "[FAQ 1] [1]" in ctx and "[FAQ 2] [2]" in ctx and "faq-3" not in ctx
+
+    kept, _, _ = assemble_context(docs, budget_tokens=1000, max_doc_tokens=100, min_docs=3)
+    assert len(kept) == 3
+
+
+def test_drops_near_duplicates_and_respects_budget():
+    docs = [
+        _doc(1, 0.9, vector=[1.0, 0.0]),
+        _doc(2, 0.89, vector=[0.999, 0.01]),
+        _doc(3, 0.88, text="word " * 500, vector=[0.0, 1.0]),
+    ]
+    kept, ctx, used = assemble_context(docs, budget_tokens=120, max_doc_tokens=400, min_block_tokens=10)
+    assert [d.id for d in kept] == ["faq-1", "faq-3"]
+    assert "[FAQ 3] [2]" in ctx  # ranks follow the included docs
+    assert used <= 125 and ctx.count("word") < 500
+
+
+def test_rendered_blocks_are_cached(monkeypatch):
+    prompt._block_cache.clear()
+    docs = [_doc(1, 0.9), _doc(2, 0.85)]
+    assemble_context(docs, budget_tokens=500, max_doc_tokens=100)
+    calls = []
+    monkeypatch.setattr(prompt, "count_tokens", lambda text: calls.append(text) or 1)
+    _, ctx, _ = assemble_context(docs, budget_tokens=500, max_doc_tokens=100)
+    assert calls == [] and "[FAQ 2] [2]" in ctx
+
+    messages = build_messages([], "q?", docs, context=ctx)
+    assert messages[1]["content"] == f"Context documents:\n{ctx}"
+
+
+def test_keeps_one_doc_per_clause_below_the_gap():
+    # MMR order: clause 1's pick, clause 2's pick, then clause 1's runner-up
+    docs = [
+        _doc(1, 0.95, vector=[1.0, 0.0]),
+        _doc(2, 0.30, vector=[0.999, 0.01]),
+        _doc(3, 0.90, text="word " * 500, vector=[0.0, 1.0]),
+    ]
+    kept, _, _ = assemble_context(docs, budget_tokens=1000, max_doc_tokens=100, min_docs=1)
+    assert [d.id for d in kept] == ["faq-1", "faq-3"]
+
+    # Survives the gap cut and the near-duplicate pass
+    kept, ctx, _ = assemble_context(docs, budget_tokens=1000, max_doc_tokens=100, min_docs=2)
+    assert [d.id for d in kept] == ["faq-1", "faq-2", "faq-3"]
+    assert "[FAQ 2] [2]" in ctx
+
+    # And the budget cutoff, ahead of clause 1's second doc
+    docs[0] = _doc(1, 0.95, text="word " * 500, vector=[1.0, 0.0])
+    kept, _, _ = assemble_context(docs, budget_tokens=120, max_doc_tokens=400, min_docs=2, min_block_tokens=10)
+    assert [d.id for d in kept] == ["faq-1", "faq-2"]
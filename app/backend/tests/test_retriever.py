@@ -0,0 +1,129 @@
+from app.rag import retriever
+from app.rag.vector_store import LocalVectorStore, set_vector_store
+
+
+VECTORS = {
+    "reset my password please": [1.0, 0.0, 0.0],
+    "what are the ach transfer fees": [0.0, 1.0, 0.0],
+}
+
+
+def _store() -> LocalVectorStore:
+    return LocalVectorStore.from_records([
+        {"id": "faq-1", "text": "Reset your password", "category": "Technical Support & Troubleshooting", "values": [1.0, 0.0, 0.0]},
+        {"id": "faq-2", "text": "ACH fees", "category": "Payments & Transactions", "values": [0.0, 1.0, 0.0]},
+        {"id": "faq-3", "text": "Enable 2FA", "category": "Security & Fraud Prevention", "values": [0.0, 0.0, 1.0]},
+    ])
+
+
+def test_retrieve_embeds_all_clauses_in_one_call(monkeypatch):
+    calls = []
+
+    def fake_embed_queries(texts):
+        calls.append(list(texts))
+        return [VECTORS.get(t, [0.0, 0.0, 1.0]) for t in texts]
+
+    monkeypatch.setattr(retriever, "embed_queries", fake_embed_queries)
+    set_vector_store(_store())
+    try:
+        docs = retriever.retrieve_optimal("Reset my password please and what are the ACH transfer fees?", final_k=2)
+    finally:
+        set_vector_store(None)
+
+    assert len(calls) == 1
+    assert len(calls[0]) == 2
+    assert {d.id for d in docs} == {"faq-1", "faq-2"}
+
+
+def test_hybrid_fuses_lexical_hits_and_degrades_without_dense(monkeypatch):
+    from app.rag.lexical import BM25Index, set_lexical_index
+
+    records = [
+        {"id": "faq-1", "text": "Reset your password from the login screen", "category": "Technical Support & Troubleshooting"},
+        {"id": "faq-2", "text": "Are deposits FDIC insured?", "category": "Regulations & Compliance"},
+        {"id": "faq-3", "text": "Enable 2FA in security settings", "category": "Security & Fraud Prevention"},
+    ]
+
+    def failing_embed(texts):
+        raise RuntimeError("inference unavailable")
+
+    monkeypatch.setattr(retriever, "embed_queries", failing_embed)
+    set_lexical_index(BM25Index.from_records(records))
+    try:
+        docs = retriever.retrieve_optimal("is my money fdic insured", final_k=1)
+    finally:
+        set_lexical_index(None)
+    assert [d.id for d in docs] == ["faq-2"]
+
+
+def test_rrf_fuse_rewards_agreement():
+    from app.rag.types import Doc
+
+    dense = [Doc("a", "", 0.9), Doc("b", "", 0.8)]
+    lexical = [Doc("b", "", 7.0), Doc("c", "", 3.0)]
+    fused = retriever._rrf_fuse([dense, lexical], k=60)
+    assert [d.id for d in fused] == ["b", "a", "c"]
+    assert fused[0].score <= 1.0
+
+
+def test_mmr_skips_near_duplicates_and_keeps_clause_quota():
+    from app.rag.mmr import mmr_select
+
+    relevance = [0.90, 0.89, 0.70, 0.50]
+    vectors = [[1.0, 0.0, 0.0], [0.99, 0.01, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]
+    groups = [0, 0, 0, 1]
+    order = mmr_select(relevance, vectors, groups, k=3, lam=0.5)
+    assert order == [0, 3, 2]
+    assert mmr_select(relevance, vectors, groups, k=2, lam=1.0) == [0, 3]
+
+
+def test_rerank_reorders_and_falls_back_past_deadline(monkeypatch):
+    import time
+    from app.rag.reranker import LexicalOverlapReranker, set_reranker
+    from app.rag.types import Doc
+
+    results = [[Doc("a", "open an account online", 0.9), Doc("b", "ach transfer fees and limits", 0.8)]]
+
+    set_reranker(LexicalOverlapReranker())
+    try:
+        reranked = retriever._rerank("ach fees", results)
+        assert [d.id for d in reranked[0]] == ["b", "a"]
+
+        class SlowReranker:
+            def score(self, query, texts):
+                time.sleep(0.2)
+                return [1.0] * len(texts)
+
+        monkeypatch.setattr(retriever.settings, "rerank_timeout_ms", 20)
+        set_reranker(SlowReranker())
+        assert retriever._rerank("ach fees", results) is results
+    finally:
+        set_reranker(None)
+
+
+def test_speculative_filter_falls_back_below_confidence_floor(monkeypatch):
+    from app.utils import metrics
+
+    calls = []
+    store = _store()
+    original = store.query_many
+
+    def counting_query_many(vectors, top_k, filts):
+        calls.append(list(filts))
+        return original(vectors, top_k, filts)
+
+    monkeypatch.setattr(store, "query_many", counting_query_many)
+    monkeypatch.setattr(retriever.settings, "speculative_filter", True)
+    monkeypatch.setattr(retriever.settings, "filter_score_floor", 0.5)
+    # "fees" guesses Payments, but the clause vector points at the 2FA doc
+    monkeypatch.setattr(retriever, "embed_queries", lambda texts: [[0.0, 0.1, 1.0] for _ in texts])
+    set_vector_store(store)
+    before = metrics.get("retriever.speculative.fallback")
+    try:
+        docs = retriever.retrieve_optimal("what are the wire fees", final_k=1)
+    finally:
+        set_vector_store(None)
+
+    assert len(calls) == 1 and calls[0][1] is None  # filtered + unfiltered in one batch
+    assert [d.id for d in docs] == ["faq-3"]
+    assert metrics.get("retriever.speculative.fallback") == before + 1
@@ -0,0 +1,32 @@
+from app.core.config import settings
+from app.llm.router import RouteSignals, choose_route, escalation
+
+
+def _signals(**kw):
+    base = dict(clauses=1, top_score=0.9, history_messages=2, prompt_tokens=800)
+    base.update(kw)
+    return RouteSignals(**base)
+
+
+def test_everything_is_strong_without_a_fast_model(monkeypatch):
+    monkeypatch.setattr(settings, "llm_fast_model", None)
+    route, reason = choose_route(_signals())
+    assert route.name == "strong" and reason == "no_fast_model"
+    assert escalation(route) == [route]
+
+
+def test_simple_turns_go_fast_and_any_hard_signal_goes_strong(monkeypatch):
+    monkeypatch.setattr(settings, "llm_fast_model", "fast-model")
+    monkeypatch.setattr(settings, "llm_model", "strong-model")
+    route, reason = choose_route(_signals())
+    assert (route.name, route.model, reason) == ("fast", "fast-model", "simple")
+    assert [r.model for r in escalation(route)] == ["fast-model", "strong-model"]
+
+    for kw, why in [
+        (dict(clauses=3), "multi_clause"),
+        (dict(top_score=0.2), "low_score"),
+        (dict(history_messages=30), "long_history"),
+        (dict(prompt_tokens=9000), "large_prompt"),
+    ]:
+        route, reason = choose_route(_signals(**kw))
+        assert (route.name, route.model, reason) == ("strong", "strong-model", why)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from app.rag.snapshot import SnapshotVectorStore, write_snapshot
+from app.rag.vector_store import LocalVectorStore
+
+
+def _corpus(n=200, dim=32, seed=7):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    ids = [f"faq-{i}" for i in range(n)]
+    texts = [f"text {i}" for i in range(n)]
+    cats = ["Payments & Transactions" if i % 3 == 0 else "General" for i in range(n)]
+    return ids, texts, cats, vectors
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_snapshot_matches_exact_search_after_rescoring(tmp_path, dtype):
+    ids, texts, cats, vectors = _corpus()
+    path = str(tmp_path / "faq.snap")
+    write_snapshot(path, ids, texts, cats, vectors, dtype=dtype)
+    snap = SnapshotVectorStore(path)
+    exact = LocalVectorStore(ids, texts, cats, vectors)
+
+    queries = vectors[:5] + 0.05
+    filts = [None, {"category": {"$eq": "Payments & Transactions"}}, None, {"category": "General"}, None]
+    got = snap.query_many(queries, top_k=5, filts=filts)
+    want = exact.query_many(queries, top_k=5, filts=filts)
+    assert [[d.id for d in r] for r in got] == [[d.id for d in r] for r in want]
+    assert got[0][0].text == "text 0" and got[0][0].score == pytest.approx(want[0][0].score, abs=1e-5)
+    assert all(d.category == "Payments & Transactions" for d in got[1])
+    assert snap.dim == 32 and len(snap) == 200 and snap.fingerprint
+
+
+def test_snapshot_quantized_only_search(tmp_path):
+    ids, texts, cats, vectors = _corpus(n=50)
+    path = str(tmp_path / "faq.snap")
+    write_snapshot(path, ids, texts, cats, vectors, dtype="int8", include_full=False)
+    snap = SnapshotVectorStore(path)
+
+    docs = snap.query(vectors[3], top_k=3, filt=None)
+    assert docs[0].id == "faq-3" and docs[0].score == pytest.approx(1.0, abs=0.02)
+    assert np.asarray(docs[0].vector).shape == (32,)
+    assert snap.query(vectors[3], top_k=3, filt={"category": {"$eq": "Unknown"}}) == []
@@ -0,0 +1,64 @@
+import asyncio
+
+from app.api.sse import coalesce
+
+
+async def _source(items):
+    for delay, tok in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield tok
+
+
+def _collect(items, max_bytes, max_delay_s):
+    async def _run():
+        return [c async for c in coalesce(_source(items), max_bytes, max_delay_s)]
+    return asyncio.run(_run())
+
+
+def test_first_token_alone_then_batched_by_bytes():
+    items = [(0, "H")] + [(0, c) for c in "ello world, this is long"]
+    chunks = _collect(items, max_bytes=8, max_delay_s=10.0)
+    assert chunks[0] == "H"
+    assert "".join(chunks) == "Hello world, this is long"
+    assert all(len(c) >= 8 for c in chunks[1:-1])
+    assert len(chunks) < len(items)
+
+
+def test_delay_budget_flushes_while_upstream_is_slow():
+    items = [(0, "A"), (0, "b"), (0, "c"), (0.2, "d")]
+    chunks = _collect(items, max_bytes=1024, max_delay_s=0.02)
+    assert chunks == ["A", "bc", "d"]
+
+
+def test_zero_delay_passes_every_delta_through():
+    items = [(0, "a"), (0, "b"), (0, "c")]
+    assert _collect(items, max_bytes=1024, max_delay_s=0) == ["a", "b", "c"]
+
+
+def test_stop_on_disconnect_closes_idle_stream():
+    from app.api.sse import stop_on_disconnect
+
+    closed = []
+
+    class _Request:
+        def __init__(self):
+            self.polls = 0
+
+        async def is_disconnected(self):
+            self.polls += 1
+            return self.polls >= 2
+
+    async def _frames():
+        try:
+            yield b"open"
+            await asyncio.sleep(10)  # waiting upstream, nothing to send
+            yield b"never"
+        finally:
+            closed.append(True)
+
+    async def _run():
+        return [f async for f in stop_on_disconnect(_Request(), _frames(), poll_s=0.01)]
+
+    assert asyncio.run(_run()) == [b"open"]
+    assert closed == [True]
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+from app.db import crud
+from app.db.models import Role
+from app.rag.prompt import build_messages
+from app.services import summaries
+from app.services.chat_service import ChatService
+
+
+def _long_session(db_session, n_turns):
+    sess = crud.get_or_create_anon_session(db_session, anon_id="pytest_summaries")
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    t = 0
+    for i in range(n_turns):
+        for role, content, tin, tout in (
+            (Role.user, f"question {i}", 10, 0),
+            (Role.assistant, f"answer {i}", 0, 40),
+        ):
+            msg = crud.append_message(db_session, sess.id, role, content, tokens_in=tin, tokens_out=tout)
+            msg.created_at = base + timedelta(seconds=t)  # one transaction in tests: now() is constant
+            t += 1
+    latest = crud.append_message(db_session, sess.id, Role.user, "latest question", tokens_in=3)
+    latest.created_at = base + timedelta(seconds=t)
+    db_session.commit()
+    return sess
+
+
+def test_compaction_folds_old_turns_and_window_uses_summary(db_session, monkeypatch):
+    monkeypatch.setattr(summaries.settings, "history_token_budget", 200)
+    sess = _long_session(db_session, n_turns=20)
+
+    before = ChatService._build_context_window(db_session, sess.id)
+    assert before.overflow and before.summary is None
+
+    folded = []
+
+    def fake_summarize(previous, turns):
+        folded.append([t["content"] for t in turns])
+        return f"{previous} user asked {len(turns) // 2} earlier questions".strip()
+
+    assert summaries.compact_session(db_session, sess.id, summarize=fake_summarize)
+    assert folded[0][0] == "question 0" and folded[0][-1] == "answer 18"
+
+    after = ChatService._build_context_window(db_session, sess.id)
+    assert after.summary == "user asked 19 earlier questions" and after.summary_tokens > 0
+    assert not after.first_turn and not after.overflow
+    assert after.history[0]["content"] == "question 19" and after.question == "latest question"
+    assert after.question_tokens == 3
+
+    # Nothing new to fold until the raw tail outgrows the budget again
+    assert not summaries.compact_session(db_session, sess.id, summarize=fake_summarize)
+
+    messages = build_messages(after.history, after.question, [], context="", summary=after.summary)
+    assert messages[2] == {"role": "system", "content": "Summary of the earlier conversation:\nuser asked 19 earlier questions"}
+
+
+def test_compaction_skips_answer_still_streaming(db_session, monkeypatch):
+    from app.db.models import MessageState
+
+    monkeypatch.setattr(summaries.settings, "history_token_budget", 200)
+    sess = _long_session(db_session, n_turns=20)
+    partial = crud.append_message(
+        db_session, sess.id, Role.assistant, "partial " * 300, state=MessageState.streaming
+    )
+    partial.created_at = datetime(2026, 1, 2, tzinfo=timezone.utc)
+    db_session.commit()
+
+    folded = []
+
+    def fake_summarize(previous, turns):
+        folded.extend(t["content"] for t in turns)
+        return "summary"
+
+    assert summaries.compact_session(db_session, sess.id, summarize=fake_summarize)
+    assert folded[-1] == "answer 18" and not any(c.startswith("partial") for c in folded)
@@ -0,0 +1,18 @@
+from app.utils import tokens
+
+
+def test_encoder_is_resolved_once_per_model():
+    tokens.get_encoder.cache_clear()
+    tokens.count_tokens("hello world", model="gpt-4o-mini")
+    tokens.count_tokens("again", model="gpt-4o-mini")
+    info = tokens.get_encoder.cache_info()
+    assert info.misses == 1 and info.hits == 1
+
+
+def test_batch_counts_match_single_counts(monkeypatch):
+    texts = ["short one", "", "a somewhat longer sentence with more words " * 20]
+    single = [tokens.count_tokens(t) for t in texts]
+    assert tokens.count_tokens_batch(texts) == single
+    monkeypatch.setattr(tokens, "BATCH_MIN_CHARS", 1)  # force the threaded path
+    assert tokens.count_tokens_batch(texts) == single
+    assert tokens.count_tokens_batch([]) == []
@@ -0,0 +1,37 @@
+import numpy as np
+
+from app.rag.vector_store import LocalVectorStore
+
+
+def _store() -> LocalVectorStore:
+    return LocalVectorStore.from_records([
+        {"id": "faq-1", "text": "Reset your password", "category": "Technical Support & Troubleshooting", "values": [1.0, 0.0, 0.0]},
+        {"id": "faq-2", "text": "ACH transfers", "category": "Payments & Transactions", "values": [0.9, 0.1, 0.0]},
+        {"id": "faq-3", "text": "Enable 2FA", "category": "Security & Fraud Prevention", "values": [0.0, 1.0, 0.0]},
+        {"id": "faq-4", "text": "Wire fees", "category": "Payments & Transactions", "values": [0.0, 0.0, 1.0]},
+    ])
+
+
+def test_local_query_orders_by_cosine():
+    docs = _store().query([1.0, 0.0, 0.0], top_k=2, filt=None)
+    assert [d.id for d in docs] == ["faq-1", "faq-2"]
+    assert docs[0].score > docs[1].score
+    assert docs[0].text == "Reset your password"
+
+
+def test_local_query_category_filter_matches_pinecone_eq():
+    filt = {"category": {"$eq": "Payments & Transactions"}}
+    docs = _store().query([1.0, 0.0, 0.0], top_k=10, filt=filt)
+    assert [d.id for d in docs] == ["faq-2", "faq-4"]
+    assert all(d.category == "Payments & Transactions" for d in docs)
+    assert _store().query([1.0, 0.0, 0.0], top_k=10, filt={"category": {"$eq": "Unknown"}}) == []
+
+
+def test_local_query_many_matches_single_queries():
+    store = _store()
+    vectors = np.array([[0.0, 1.0, 0.0], [0.2, 0.0, 1.0]], dtype=np.float32)
+    filts = [None, {"category": {"$in": ["Payments & Transactions"]}}]
+    batched = store.query_many(vectors, top_k=3, filts=filts)
+    single = [store.query(v, top_k=3, filt=f) for v, f in zip(vectors, filts)]
+    assert [[d.id for d in r] for r in batched] == [[d.id for d in r] for r in single]
+    assert batched[1][0].id == "faq-4"
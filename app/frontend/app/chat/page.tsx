@@ -1,8 +1,8 @@
 'use client';
 
-import { useEffect, useState } from 'react';
+import { useCallback, useEffect, useState } from 'react';
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
-import { ensureAnonCookie, listSessions, createSession, deleteSession, updateSessionTitle, getMessages, streamChat, type Message, type Session } from '@/lib/api';
+import { ensureAnonCookie, listSessions, createSession, deleteSession, updateSessionTitle, getMessages, prefetchDraft, streamChat, type Message, type Session } from '@/lib/api';
 import SessionSidebar from '@/components/SessionSidebar';
 import MessageList from '@/components/MessageList';
 import Composer from '@/components/Composer';
@@ -48,6 +48,10 @@ export default function ChatPage() {
   // Reset transient UI state when switching sessions
   useEffect(() => { setPendingText(''); }, [current]);
 
+  const handleDraft = useCallback((text: string) => {
+    if (current) prefetchDraft(current, text);
+  }, [current]);
+
   async function handleSend(text: string) {
     let sid = current;
     if (!sid) {
@@ -137,7 +141,7 @@ export default function ChatPage() {
       <div className="chat-area">
         <div className="chat-header"><strong>Eloquent AI Assistant</strong></div>
         <MessageList messages={messagesQ.data || []} isStreaming={isStreaming} pendingText={pendingText} />
-        <Composer onSend={handleSend} disabled={isStreaming} />
+        <Composer onSend={handleSend} onDraft={handleDraft} disabled={isStreaming} />
       </div>
     </div>
   );
@@ -1,10 +1,20 @@
 'use client';
 
-import { useState } from 'react';
+import { useEffect, useState } from 'react';
 
-export default function Composer({ onSend, disabled }: { onSend: (text: string) => void | Promise<void>; disabled?: boolean; }) {
+const DRAFT_DEBOUNCE_MS = 400;
+
+export default function Composer({ onSend, onDraft, disabled }: { onSend: (text: string) => void | Promise<void>; onDraft?: (text: string) => void; disabled?: boolean; }) {
   const [text, setText] = useState('');
 
+  // Report the draft once typing pauses
+  useEffect(() => {
+    const t = text.trim();
+    if (!onDraft || !t || disabled) return;
+    const timer = setTimeout(() => onDraft(t), DRAFT_DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+  }, [text, onDraft, disabled]);
+
   async function submit() {
     const t = text.trim();
     if (!t || disabled) return;
@@ -30,7 +30,7 @@ export default function MessageList({
             <div className={`bubble ${m.role === 'user' ? 'user' : 'assistant'}`}>
               {m.role === 'assistant' ? (
                 <ReactMarkdown remarkPlugins={[remarkGfm]}>
-                  {m.content}
+                  {m.state === 'interrupted' ? `${m.content.trimEnd()} […]` : m.content}
                 </ReactMarkdown>
               ) : (
                 m.content
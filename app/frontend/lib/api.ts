@@ -18,6 +18,7 @@ export type Session = {
 export type Message = {
   id: string; session_id: string; role: 'user'|'assistant'|'system';
   content: string; tokens_in: number; tokens_out: number; created_at: string;
+  state?: 'complete' | 'streaming' | 'interrupted';
 };
 
 export type Citation = {
@@ -110,22 +111,26 @@ export type DonePayload = {
     citations: Citation[];
     usage: { tokens_in: number; tokens_out: number };
     session_id: string;
+    message_id?: string;
+    state?: 'complete' | 'interrupted';
 };
 
-export async function* streamChat(sessionId: string, message: string): AsyncGenerator<
-  { event: 'token'; data: { token: string } } |
-  { event: 'done'; data: DonePayload } |
-  { event: 'error'; data: { message: string } }
-> {
-  const r = await fetch(`${API}/chat`, {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
-    credentials: 'include',
-    body: JSON.stringify({ session_id: sessionId, message }),
-  });
-  if (!r.ok || !r.body) throw new Error('stream failed to start');
+// Fire-and-forget: warms retrieval for a draft while the user is typing
+export async function prefetchDraft(sessionId: string, draft: string): Promise<void> {
+  try {
+    await fetch(`${API}/chat/prefetch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      credentials: 'include',
+      body: JSON.stringify({ session_id: sessionId, draft }),
+    });
+  } catch {}
+}
 
-  const reader = r.body.getReader(); // ReadableStream reader
+type SSEFrame = { event: string; data: unknown; id?: string };
+
+async function* readSSE(body: ReadableStream<Uint8Array>): AsyncGenerator<SSEFrame> {
+  const reader = body.getReader(); // ReadableStream reader
   const decoder = new TextDecoder();
   let buf = '';
 
@@ -135,29 +140,69 @@ export async function* streamChat(sessionId: string, message: string): AsyncGene
     buf += decoder.decode(value, { stream: true });
 
     // SSE frames are separated by a blank line (double newline)
-    // Each block contains lines like: "event: token" and "data: {...}"
+    // Each block contains lines like: "id: ...", "event: token" and "data: {...}"
     let idx: number;
     while ((idx = buf.indexOf('\n\n')) !== -1) {
       const raw = buf.slice(0, idx).trim();
       buf = buf.slice(idx + 2);
       // Parse block
       let event = 'message';
+      let id: string | undefined;
       const dataLines: string[] = [];
       for (const line of raw.split('\n')) {
         if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('id:')) id = line.slice(3).trim();
         else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
       }
       const dataStr = dataLines.join('\n');
       let data: unknown = dataStr;
       try { data = JSON.parse(dataStr); } catch {}
+      yield { event, data, id };
+    }
+  }
+}
+
+const MAX_RESUMES = 3;
+
+export async function* streamChat(sessionId: string, message: string): AsyncGenerator<
+  { event: 'token'; data: { token: string } } |
+  { event: 'done'; data: DonePayload } |
+  { event: 'error'; data: { message: string } }
+> {
+  let r = await fetch(`${API}/chat`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+    credentials: 'include',
+    body: JSON.stringify({ session_id: sessionId, message }),
+  });
+  if (!r.ok || !r.body) throw new Error('stream failed to start');
 
-      if (event === 'token') {
-        yield { event, data: data as { token: string } };
-      } else if (event === 'done') {
-        yield { event, data: data as DonePayload };
-      } else if (event === 'error') {
-        yield { event, data: data as { message: string } };
+  // Frame ids are "<message_id>:<offset>"; after a dropped connection we
+  // resume from the last one instead of asking again.
+  let lastId: string | undefined;
+  for (let attempt = 0; ; attempt++) {
+    try {
+      for await (const { event, data, id } of readSSE(r.body!)) {
+        if (id) lastId = id;
+        if (event === 'token') {
+          yield { event, data: data as { token: string } };
+        } else if (event === 'done') {
+          yield { event, data: data as DonePayload };
+          return;
+        } else if (event === 'error') {
+          yield { event, data: data as { message: string } };
+          return;
+        }
       }
+    } catch (e) {
+      if (!lastId || attempt >= MAX_RESUMES) throw e;
     }
+    if (!lastId || attempt >= MAX_RESUMES) return;
+    const messageId = lastId.split(':')[0];
+    r = await fetch(`${API}/chat/stream/${messageId}`, {
+      headers: { 'Accept': 'text/event-stream', 'Last-Event-ID': lastId },
+      credentials: 'include',
+    });
+    if (!r.ok || !r.body) throw new Error('stream failed to resume');
   }
 }